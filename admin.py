@@ -0,0 +1,309 @@
+"""管理后台：用户、卡密、运行统计与指标"""
+import io
+import csv
+import uuid
+from datetime import datetime, timedelta, date
+from flask import (
+    Blueprint, render_template, request, jsonify, session, url_for,
+    current_app, abort, stream_with_context
+)
+from sqlalchemy.exc import IntegrityError
+import services
+from extensions import db
+from models import User, APIKey, Setting, Usage
+from usage_meter import FIELDS as USAGE_FIELDS
+from password_hasher import HasherBusy
+from auth import admin_required
+from services import log, metrics, QUOTA_LIMITS
+
+bp = Blueprint('admin', __name__)
+
+# ------------------------------
+# 自定义模板过滤器
+# ------------------------------
+@bp.app_template_filter('datetimeformat')
+def datetimeformat(value, format='%Y-%m-%d %H:%M:%S'):
+    """格式化日期时间的模板过滤器"""
+    if isinstance(value, datetime):
+        return value.strftime(format)
+    return "未知时间"
+
+@bp.app_template_global()
+def page_url(page):
+    """保留当前筛选条件的分页链接"""
+    args = request.args.to_dict()
+    args['page'] = page
+    return url_for(request.endpoint, **args)
+
+# ------------------------------
+# 管理后台：分页、筛选与导出
+# ------------------------------
+KEY_CSV_HEADER = ["卡密", "状态", "使用者", "生成时间", "使用时间"]
+KEY_EXPORT_BATCH = 1000
+
+def create_api_keys(count):
+    """批量生成卡密：一条INSERT语句executemany写入，与已有卡密冲突时整批重试"""
+    for attempt in range(3):
+        new_keys = set()
+        while len(new_keys) < count:
+            new_keys.add(uuid.uuid4().hex[:16])
+        now = datetime.utcnow()
+        try:
+            db.session.execute(db.insert(APIKey), [
+                {"key": key, "is_used": False, "created_at": now} for key in new_keys
+            ])
+            db.session.commit()
+            return list(new_keys)
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 2:
+                raise
+
+def parse_date(value, end=False):
+    """解析YYYY-MM-DD，end为True时返回次日零点（用作不含的上界），无效时返回None"""
+    try:
+        day = datetime.strptime(value or '', '%Y-%m-%d')
+    except ValueError:
+        return None
+    return day + timedelta(days=1) if end else day
+
+def filter_dates(query, column, args):
+    start = parse_date(args.get('start'))
+    end = parse_date(args.get('end'), end=True)
+    if start:
+        query = query.where(column >= start)
+    if end:
+        query = query.where(column < end)
+    return query
+
+def key_query(args):
+    """卡密列表查询：status=used/unused，start/end为生成日期"""
+    query = db.select(APIKey)
+    status = args.get('status')
+    if status in ('used', 'unused'):
+        query = query.where(APIKey.is_used == (status == 'used'))
+    query = filter_dates(query, APIKey.created_at, args)
+    return query.order_by(APIKey.created_at.desc(), APIKey.id.desc())
+
+def user_query(args):
+    """用户列表查询：q为用户名关键字，role=admin/user，start/end为注册日期"""
+    query = db.select(User)
+    keyword = (args.get('q') or '').strip()
+    if keyword:
+        query = query.where(User.username.contains(keyword, autoescape=True))
+    role = args.get('role')
+    if role in ('admin', 'user'):
+        query = query.where(User.is_admin == (role == 'admin'))
+    query = filter_dates(query, User.created_at, args)
+    return query.order_by(User.created_at.desc(), User.id.desc())
+
+def paginate(query):
+    return db.paginate(
+        query,
+        per_page=current_app.config['ADMIN_PAGE_SIZE'],
+        max_per_page=current_app.config['ADMIN_PAGE_SIZE_MAX'],
+        error_out=False
+    )
+
+def iter_csv(header, rows):
+    """逐批生成CSV文本，带BOM便于Excel识别UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % KEY_EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def csv_response(chunks, filename):
+    return current_app.response_class(chunks, mimetype='text/csv', headers={
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Cache-Control": "no-store"
+    })
+
+@bp.route('/users', methods=['GET', 'POST', 'DELETE'])
+@admin_required
+def users():
+    if request.method == 'POST':
+        try:
+            username = request.form.get('username')
+            password = request.form.get('password')
+            is_admin = request.form.get('is_admin') == 'on'
+            
+            if User.query.filter_by(username=username).first():
+                return jsonify({"status": "error", "msg": "用户名已存在"})
+            
+            new_user = User(
+                username=username,
+                password_hash=services.password_hasher.hash(password),
+                is_admin=is_admin
+            )
+            db.session.add(new_user)
+            db.session.flush()
+            db.session.add(Setting(user_id=new_user.id))
+            db.session.commit()
+            # 数据库可能复用已删除用户的id
+            services.user_cache.invalidate(new_user.id)
+            services.setting_cache.invalidate(new_user.id)
+            
+            log(f"管理员{session['user_id']}添加了新用户: {username}")
+            return jsonify({"status": "success", "msg": "用户添加成功"})
+        except HasherBusy:
+            db.session.rollback()
+            return jsonify({"status": "error", "msg": "系统繁忙，请稍后再试"}), 503
+        except Exception as e:
+            db.session.rollback()
+            log(f"添加用户失败: {str(e)}", "error")
+            return jsonify({"status": "error", "msg": "操作失败"}), 500
+    
+    if request.method == 'DELETE':
+        try:
+            # 缓存与失效广播按整数id索引，前端传来的字符串需先转换
+            try:
+                user_id = int(request.json.get('user_id'))
+            except (TypeError, ValueError):
+                return jsonify({"status": "error", "msg": "无效的用户"}), 400
+            if user_id == session['user_id']:
+                return jsonify({"status": "error", "msg": "不能删除当前登录用户"})
+            
+            User.query.filter_by(id=user_id).delete()
+            db.session.commit()
+            services.user_cache.invalidate(user_id)
+            services.setting_cache.invalidate(user_id)
+            if services.faq_index:
+                services.faq_index.invalidate(user_id)
+            services.comment_history.discard(user_id)
+            log(f"管理员{session['user_id']}删除了用户: {user_id}")
+            return jsonify({"status": "success"})
+        except Exception as e:
+            db.session.rollback()
+            log(f"删除用户失败: {str(e)}", "error")
+            return jsonify({"status": "error", "msg": "操作失败"}), 500
+    
+    pagination = paginate(user_query(request.args))
+    return render_template(
+        'users.html', 
+        pagination=pagination, 
+        usage=page_usage([user.id for user in pagination.items]),
+        quota={field: current_app.config[name] for field, name in QUOTA_LIMITS.items()}
+    )
+
+def page_usage(user_ids):
+    """当前页用户的当日用量（数据库 + 本进程未写入的增量），一次查询"""
+    usage = {user_id: services.usage_meter.pending(user_id) for user_id in user_ids}
+    if user_ids:
+        rows = Usage.query.filter(Usage.user_id.in_(user_ids), Usage.day == date.today())
+        for row in rows:
+            for field in USAGE_FIELDS:
+                usage[row.user_id][field] += getattr(row, field)
+    return usage
+
+@bp.route('/keys', methods=['GET', 'POST', 'DELETE'])
+@admin_required
+def keys():
+    if request.method == 'POST':
+        count = request.form.get('count', 1, type=int)
+        if not 1 <= count <= current_app.config['KEYS_GENERATE_MAX']:
+            return render_keys(error=f"生成数量需在1-{current_app.config['KEYS_GENERATE_MAX']}之间")
+        try:
+            new_keys = create_api_keys(count)
+            log(f"管理员{session['user_id']}生成了{count}个卡密")
+        except Exception as e:
+            db.session.rollback()
+            log(f"生成卡密失败: {str(e)}", "error")
+            return render_keys(error="生成失败")
+        if count > current_app.config['KEYS_DISPLAY_MAX']:
+            # 数量较多时直接下载，不在页面上渲染
+            filename = f"keys_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            return csv_response(iter_csv(KEY_CSV_HEADER, ([k, "未使用", "", ""] for k in new_keys)), filename)
+        return render_keys(new_keys=new_keys)
+    
+    if request.method == 'DELETE':
+        try:
+            key_id = request.json.get('key_id')
+            api_key = db.session.get(APIKey, key_id)
+            if api_key and not api_key.is_used:
+                db.session.delete(api_key)
+                db.session.commit()
+                log(f"管理员{session['user_id']}删除了卡密: {api_key.key}")
+                return jsonify({"status": "success"})
+            return jsonify({"status": "error", "msg": "只能删除未使用的卡密"})
+        except Exception as e:
+            db.session.rollback()
+            log(f"删除卡密失败: {str(e)}", "error")
+            return jsonify({"status": "error", "msg": "操作失败"}), 500
+    
+    return render_keys()
+
+def render_keys(**context):
+    pagination = paginate(key_query(request.args))
+    # 只查询当前页用到的用户名，避免逐行加载关联用户
+    user_ids = {key.user_id for key in pagination.items if key.user_id}
+    usernames = dict(db.session.execute(
+        db.select(User.id, User.username).where(User.id.in_(user_ids))
+    ).all()) if user_ids else {}
+    return render_template('keys.html', pagination=pagination, usernames=usernames, **context)
+
+@bp.route('/keys/export')
+@admin_required
+def export_keys():
+    """按当前筛选条件流式导出卡密CSV，逐批读取，内存占用与总数无关"""
+    query = key_query(request.args).with_only_columns(
+        APIKey.key, APIKey.is_used, User.username, APIKey.created_at, APIKey.used_at
+    ).outerjoin(User, User.id == APIKey.user_id).execution_options(yield_per=KEY_EXPORT_BATCH)
+    
+    def rows():
+        for key, is_used, username, created_at, used_at in db.session.execute(query):
+            yield [
+                key,
+                "已使用" if is_used else "未使用",
+                username or "",
+                created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else "",
+                used_at.strftime("%Y-%m-%d %H:%M:%S") if used_at else ""
+            ]
+    
+    log(f"管理员{session['user_id']}导出了卡密")
+    filename = f"keys_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return csv_response(stream_with_context(iter_csv(KEY_CSV_HEADER, rows())), filename)
+
+@bp.route('/system/stats')
+@admin_required
+def system_stats():
+    """运行时统计（缓存命中等），供管理员排查性能"""
+    return jsonify({
+        "reply_cache": services.reply_cache.stats(),
+        "audio_cache": services.audio_store.stats() if services.audio_store else None,
+        "analysis": services.analysis_executor.stats(),
+        "comment_scheduler": services.comment_scheduler.stats(),
+        "comment_priority": services.comment_prioritizer.stats(),
+        "comment_batcher": services.comment_batcher.stats(),
+        "comment_history": services.comment_history.stats(),
+        "http": services.http_client.stats(),
+        "setting_cache": services.setting_cache.stats(),
+        "user_cache": services.user_cache.stats(),
+        "prompt": services.prompt_compiler.stats(),
+        "emit": services.emit_batcher.stats(),
+        "sql": services.query_timer.stats(),
+        "faq": services.faq_index.stats() if services.faq_index else None,
+        "rate_limit": services.rate_limiter.stats(),
+        "usage": services.usage_meter.stats(),
+        "password_hash": services.password_hasher.stats(),
+        "log": {"queued": services.log_listener.queue.qsize(), "dropped": services.logger.handlers[0].dropped}
+    })
+
+LOOPBACK_ADDRS = {'127.0.0.1', '::1'}
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus抓取接口；设置METRICS_TOKEN后需携带 Authorization: Bearer <token>，未设置时只允许本机访问"""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != f"Bearer {token}":
+            abort(401)
+    elif request.remote_addr not in LOOPBACK_ADDRS:
+        abort(404)
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
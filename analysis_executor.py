@@ -0,0 +1,180 @@
+"""评论分析任务执行器：固定大小线程池 + 有界队列 + 单用户并发上限"""
+import time
+import threading
+from collections import deque
+
+
+class _Job:
+    __slots__ = ('user_id', 'key', 'fn', 'on_drop', 'submitted_at')
+
+    def __init__(self, user_id, key, fn, on_drop):
+        self.user_id = user_id
+        self.key = key
+        self.fn = fn
+        self.on_drop = on_drop
+        self.submitted_at = time.time()
+
+
+class AnalysisExecutor:
+    """有界的评论分析线程池
+
+    - workers: 工作线程数（每个进程）
+    - queue_size: 等待队列上限
+    - per_user_limit: 单个用户排队+执行中的任务上限
+    - overflow: 队列或用户额度已满时的策略
+        reject      拒绝新任务
+        drop_oldest 丢弃最早排队的任务（用户额度满时只丢该用户的任务）
+        coalesce    与队列中相同内容的任务合并，无可合并时拒绝
+    """
+
+    OVERFLOW_POLICIES = ('reject', 'drop_oldest', 'coalesce')
+
+    QUEUED = 'queued'
+    COALESCED = 'coalesced'
+    REJECTED = 'rejected'
+
+    def __init__(self, workers=8, queue_size=200, per_user_limit=5,
+                 overflow='reject', on_error=None, name='analyze'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow}")
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.per_user_limit = max(1, int(per_user_limit))
+        self.overflow = overflow
+        self.on_error = on_error
+        self.name = name
+        self._queue = deque()
+        self._pending_keys = set()  # {(user_id, key)} 排队中的任务，用于合并
+        self._inflight = {}         # {user_id: 排队+执行中的任务数}
+        self._running = 0
+        self._threads = []
+        self._shutdown = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "submitted": 0, "completed": 0, "errors": 0,
+            "rejected": 0, "dropped": 0, "coalesced": 0,
+            "wait_total": 0.0, "wait_max": 0.0
+        }
+
+    def submit(self, user_id, fn, key=None, on_drop=None):
+        """提交任务，返回 queued / coalesced / rejected"""
+        dropped = None
+        with self._cond:
+            if self._shutdown:
+                self._stats["rejected"] += 1
+                return self.REJECTED
+            if self.overflow == 'coalesce' and key is not None \
+                    and (user_id, key) in self._pending_keys:
+                self._stats["coalesced"] += 1
+                return self.COALESCED
+
+            user_full = self._inflight.get(user_id, 0) >= self.per_user_limit
+            if user_full or len(self._queue) >= self.queue_size:
+                if self.overflow != 'drop_oldest':
+                    self._stats["rejected"] += 1
+                    return self.REJECTED
+                dropped = self._oldest_job(user_id if user_full else None)
+                if dropped is None:
+                    self._stats["rejected"] += 1
+                    return self.REJECTED
+                self._remove(dropped)
+                self._stats["dropped"] += 1
+
+            job = _Job(user_id, key, fn, on_drop)
+            self._queue.append(job)
+            if key is not None:
+                self._pending_keys.add((user_id, key))
+            self._inflight[user_id] = self._inflight.get(user_id, 0) + 1
+            self._stats["submitted"] += 1
+            self._ensure_workers()
+            self._cond.notify()
+
+        if dropped is not None and dropped.on_drop:
+            self._safe_call(dropped.on_drop)
+        return self.QUEUED
+
+    def stats(self):
+        """队列深度、等待时间与拒绝/丢弃/合并计数"""
+        with self._cond:
+            data = dict(self._stats)
+            data["queue_depth"] = len(self._queue)
+            data["running"] = self._running
+            data["workers"] = len(self._threads)
+        started = data["completed"] + data["errors"] + data["running"]
+        data["wait_avg_ms"] = round(data.pop("wait_total") / started * 1000, 2) if started else 0.0
+        data["wait_max_ms"] = round(data.pop("wait_max") * 1000, 2)
+        return data
+
+    def shutdown(self, wait=True):
+        """停止接收任务，等待队列清空后退出工作线程"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _ensure_workers(self):
+        """按需启动工作线程（需持有锁）"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"{self.name}_worker_{len(self._threads)}",
+                daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _oldest_job(self, user_id=None):
+        for job in self._queue:
+            if user_id is None or job.user_id == user_id:
+                return job
+        return None
+
+    def _remove(self, job):
+        """移出排队中的任务并释放用户额度（需持有锁）"""
+        self._queue.remove(job)
+        self._unmark_pending(job)
+        self._release(job)
+
+    def _unmark_pending(self, job):
+        if job.key is not None:
+            self._pending_keys.discard((job.user_id, job.key))
+
+    def _release(self, job):
+        """释放用户并发额度（需持有锁）"""
+        count = self._inflight.get(job.user_id, 0) - 1
+        if count > 0:
+            self._inflight[job.user_id] = count
+        else:
+            self._inflight.pop(job.user_id, None)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job = self._queue.popleft()
+                self._unmark_pending(job)
+                self._running += 1
+                waited = time.time() - job.submitted_at
+                self._stats["wait_total"] += waited
+                self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+
+            failed = not self._safe_call(job.fn)
+
+            with self._cond:
+                self._running -= 1
+                self._release(job)
+                self._stats["errors" if failed else "completed"] += 1
+
+    def _safe_call(self, fn):
+        try:
+            fn()
+            return True
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+            return False
@@ -0,0 +1,92 @@
+"""异步日志：调用方只把日志记录放入内存队列，由后台线程统一格式化、写文件和轮转
+
+调用方不做任何磁盘I/O，也不依赖Flask应用上下文，可在采集/分析等后台线程中直接使用。
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime
+
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines格式，便于日志采集系统解析"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created).strftime(DATE_FORMAT),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志并计数，保证调用方永不阻塞"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def create_file_handler(log_file, rotate='size', max_bytes=10 * 1024 * 1024, backup_count=5, when='midnight'):
+    """按轮转方式创建文件handler：size 按大小 | time 按时间 | none 不轮转"""
+    log_dir = os.path.dirname(log_file)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    if rotate == 'size':
+        return logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+    if rotate == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    return logging.FileHandler(log_file, encoding='utf-8')
+
+
+def stop_listener(listener):
+    """停止后台写入线程（写完队列中剩余的日志），可重复调用"""
+    if listener._thread is not None:
+        listener.stop()
+
+
+def setup_logging(name, log_file, level='INFO', json_format=False, console=False,
+                  rotate='size', max_bytes=10 * 1024 * 1024, backup_count=5, when='midnight',
+                  queue_size=10000):
+    """创建异步logger，返回 (logger, listener)；进程退出时自动停止listener并写完剩余日志"""
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT, DATE_FORMAT)
+    handlers = [create_file_handler(log_file, rotate, max_bytes, backup_count, when)]
+    if console:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    listener.start()
+    atexit.register(stop_listener, listener)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    logger.handlers = [DroppingQueueHandler(log_queue)]
+    logger.propagate = False
+    return logger, listener
@@ -0,0 +1,110 @@
+"""语音文件存储：按合成参数内容寻址的磁盘缓存，超出容量后淘汰最久未访问的文件"""
+import os
+import json
+import uuid
+import hashlib
+import threading
+
+
+def audio_key(text, per, spd, vol, pit):
+    """合成参数的内容哈希，相同文本与音色参数得到相同的key"""
+    raw = json.dumps([text, per, spd, vol, pit], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+class AudioStore:
+    """线程安全的MP3文件缓存（文件名即key，mtime作为最近访问时间）"""
+
+    SUFFIX = '.mp3'
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = {}  # {key: 文件大小}
+        self._total = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def exists(self, key):
+        """查询是否已缓存，命中时刷新访问时间"""
+        with self._lock:
+            if key in self._sizes:
+                try:
+                    os.utime(self.path(key))
+                    self._stats["hits"] += 1
+                    return True
+                except OSError:
+                    self._forget(key)
+            self._stats["misses"] += 1
+            return False
+
+    def read(self, key):
+        """读取音频内容，不存在时返回None"""
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """原子写入音频文件，并按容量淘汰旧文件"""
+        tmp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+        with self._lock:
+            self._forget(key)
+            self._sizes[key] = len(data)
+            self._total += len(data)
+            self._stats["stores"] += 1
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["files"] = len(self._sizes)
+            data["bytes"] = self._total
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else 0.0
+        return data
+
+    def _scan(self):
+        """启动时载入已有文件（多进程共享同一目录）"""
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            self._sizes[name[:-len(self.SUFFIX)]] = size
+            self._total += size
+
+    def _forget(self, key):
+        self._total -= self._sizes.pop(key, 0)
+
+    def _evict(self):
+        """总大小超限时按mtime从旧到新删除（需持有锁）"""
+        if self._total <= self.max_bytes:
+            return
+        entries = []
+        for key in self._sizes:
+            try:
+                entries.append((os.path.getmtime(self.path(key)), key))
+            except OSError:
+                entries.append((0, key))
+        entries.sort()
+        for _, key in entries:
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            self._forget(key)
+            self._stats["evictions"] += 1
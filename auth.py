@@ -0,0 +1,132 @@
+"""登录、注册与权限装饰器"""
+import math
+from datetime import datetime
+from flask import Blueprint, render_template, request, session, redirect, url_for
+import services
+from extensions import db
+from models import User, APIKey, Setting
+from password_hasher import HasherBusy
+from services import log, login_throttled, record_login_failure, RATE_LIMITED_TOTAL
+
+bp = Blueprint('auth', __name__)
+
+# ------------------------------
+# 装饰器
+# ------------------------------
+def login_required(f):
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            log("未登录用户尝试访问受保护资源", "warning")
+            return redirect(url_for('auth.login', next=request.path))
+        return f(*args, **kwargs)
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+def admin_required(f):
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return redirect(url_for('auth.login'))
+        user = services.user_cache.get(session['user_id'])
+        if not user or not user.is_admin:
+            log(f"用户{session['user_id']}尝试访问管理员资源", "warning")
+            return redirect(url_for('live.dashboard'))
+        return f(*args, **kwargs)
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+# ------------------------------
+# 路由
+# ------------------------------
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        # 失败次数超限时直接拒绝，不查询用户也不计算哈希
+        retry_after = login_throttled(username, request.remote_addr)
+        if retry_after:
+            RATE_LIMITED_TOTAL.inc('login')
+            log(f"用户{username}登录失败次数过多，暂时拒绝登录", "warning")
+            return render_template('login.html', error=f"登录失败次数过多，请{math.ceil(retry_after)}秒后再试"), 429
+        
+        user = User.query.filter_by(username=username).first()
+        try:
+            valid = user is not None and services.password_hasher.verify(user.password_hash, password)
+        except HasherBusy:
+            log(f"用户{username}登录时密码校验排队已满", "warning")
+            return render_template('login.html', error="登录人数较多，请稍后再试"), 503
+        
+        if valid:
+            upgrade_password_hash(user, password)
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['is_admin'] = user.is_admin
+            log(f"用户{username}登录成功")
+            next_url = request.args.get('next', url_for('live.dashboard'))
+            return redirect(next_url)
+        else:
+            record_login_failure(username, request.remote_addr)
+            log(f"用户{username}登录失败（密码错误）", "warning")
+            return render_template('login.html', error="用户名或密码错误")
+    
+    return render_template('login.html')
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        confirm_pwd = request.form.get('confirm_password')
+        key = request.form.get('key')
+        
+        if password != confirm_pwd:
+            return render_template('register.html', error="两次密码不一致")
+        if User.query.filter_by(username=username).first():
+            return render_template('register.html', error="用户名已存在")
+        
+        api_key = APIKey.query.filter_by(key=key, is_used=False).first()
+        if not api_key:
+            log(f"用户{username}注册失败（无效卡密: {key}）", "warning")
+            return render_template('register.html', error="无效或已使用的卡密")
+        
+        try:
+            password_hash = services.password_hasher.hash(password)
+        except HasherBusy:
+            return render_template('register.html', error="注册人数较多，请稍后再试"), 503
+        new_user = User(
+            username=username,
+            password_hash=password_hash
+        )
+        db.session.add(new_user)
+        db.session.flush()
+        
+        api_key.is_used = True
+        api_key.user_id = new_user.id
+        api_key.used_at = datetime.utcnow()
+        
+        db.session.add(Setting(user_id=new_user.id))
+        db.session.commit()
+        
+        log(f"新用户注册成功: {username}")
+        return redirect(url_for('auth.login', msg="注册成功，请登录"))
+    
+    return render_template('register.html')
+
+def upgrade_password_hash(user, password):
+    """登录成功后把旧算法或旧工作因子的哈希升级为当前配置，失败时不影响本次登录"""
+    try:
+        password_hash = services.password_hasher.upgrade(user.password_hash, password)
+        if password_hash:
+            user.password_hash = password_hash
+            db.session.commit()
+            log(f"用户{user.username}的密码哈希已升级为{services.password_hasher.prefix()}", "debug")
+    except Exception as e:
+        db.session.rollback()
+        log(f"用户{user.username}的密码哈希升级失败: {str(e)}", "warning")
+
+@bp.route('/logout')
+def logout():
+    username = session.get('username', '未知用户')
+    session.clear()
+    log(f"用户{username}退出登录")
+    return redirect(url_for('auth.login'))
@@ -0,0 +1,478 @@
+"""直播间流水线压测：启动DeepSeek/百度模拟服务，创建N个用户，每个用户一个Socket.IO客户端加入自己的直播间，
+按目标速率发送analyze_comment，统计评论到AI回复的延迟分布、吞吐、线程数与内存占用，结果写入JSON便于对比不同版本。
+
+两种传输方式（--transport）:
+    websocket  默认。以gunicorn在子进程中启动应用（worker类型与生产部署一致，--workers指定数量），
+               客户端为python-socketio，经真实的WebSocket传输、序列化与消息队列推送；线程数与内存取自worker进程
+    inprocess  应用与Flask-SocketIO测试客户端在同一进程中，不经过网络传输与序列化，
+               只测量进程内的评论处理流水线（分析线程池、LLM/TTS调用、推送合并），结果文件以pipeline_开头
+
+多worker时需配置共享存储与消息队列，如 --env SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6379/0。
+
+用法:
+    python benchmark.py --users 20 --rate 50 --duration 30 --latency 0.5
+    python benchmark.py --users 50 --rate 100 --workers 4 --env SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6379/0
+    python benchmark.py --users 5 --rate 10 --stream --env AUDIO_TRANSPORT=binary
+    python benchmark.py --users 200 --rate 200 --latency 2 --transport inprocess --async-mode threading
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from stub_server import start_stub_server
+
+MARKER = re.compile(r'#(\d+)-(\d+)#')
+QUESTIONS = ["这个多少钱", "有优惠吗", "什么时候发货", "质量怎么样", "有售后吗", "适合送人吗"]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))
+    return round(values[index] * 1000, 1)
+
+
+def rss_mb():
+    """当前进程常驻内存（MB），/proc不可用时取峰值"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def prepare_env(args, stub, workdir):
+    """应用在导入时读取配置，必须先设置环境变量"""
+    env = {
+        "FLASK_ENV": "production",
+        "SECRET_KEY": os.getenv('SECRET_KEY') or "benchmark",
+        "DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "LOG_FILE": os.path.join(workdir, 'bench.log'),
+        "AUDIO_CACHE_DIR": os.path.join(workdir, 'audio'),
+        "ASYNC_MODE": args.async_mode,
+        "AI_REPLY_STREAM": "true" if args.stream else "false",
+        # 默认关闭缓存与去重，测量完整的调用链路；可用 --env 覆盖
+        "REPLY_CACHE_SIZE": "0",
+        "COMMENT_PRIORITY_ENABLED": "false",
+        "RATE_LIMIT_COMMENT": "0",
+        "HISTORY_PERSIST": "false"
+    }
+    env.update(stub.env())
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    os.environ.update(env)
+    return env
+
+
+def create_users(app, count):
+    """用现有模型创建用户及默认设置，返回用户id列表"""
+    from extensions import db
+    from models import User, Setting
+    with app.app_context():
+        db.create_all()
+        users = []
+        for i in range(count):
+            user = User(username=f"bench_{i}_{int(time.time())}", password_hash="-")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Setting(user_id=user.id))
+            users.append(user.id)
+        db.session.commit()
+    return users
+
+
+def create_clients(app, users):
+    """进程内的Socket.IO测试客户端（直接写入session，跳过密码哈希）"""
+    from extensions import socketio
+    clients = []
+    for user_id in users:
+        http = app.test_client()
+        with http.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = f"bench_{user_id}"
+        client = socketio.test_client(app, flask_test_client=http)
+        client.get_received()
+        clients.append((user_id, client))
+    return clients
+
+
+class SocketClient:
+    """python-socketio客户端，经WebSocket连接已启动的服务；收到的事件连同到达时间缓存，
+    get_received与测试客户端的返回格式一致"""
+
+    def __init__(self, url, cookie):
+        import socketio
+        self._client = socketio.Client(reconnection=False)
+        self._received = []
+        self._lock = threading.Lock()
+        self._client.on('*', self._on_event)
+        self._client.connect(url, headers={"Cookie": cookie}, transports=['websocket'])
+
+    def _on_event(self, event, *args):
+        with self._lock:
+            self._received.append({"name": event, "args": list(args), "received_at": time.perf_counter()})
+
+    def emit(self, event, data):
+        self._client.emit(event, data)
+
+    def get_received(self):
+        with self._lock:
+            received, self._received = self._received, []
+        return received
+
+    def disconnect(self):
+        self._client.disconnect()
+
+
+def session_cookie(app, user_id):
+    """按应用的SECRET_KEY签发登录会话，跳过密码哈希"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    value = serializer.dumps({"user_id": user_id, "username": f"bench_{user_id}"})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def connect_clients(app, url, users):
+    clients = []
+    for user_id in users:
+        client = SocketClient(url, session_cookie(app, user_id))
+        clients.append((user_id, client))
+    # 丢弃连接时的系统消息与历史回放
+    time.sleep(0.2)
+    for _, client in clients:
+        client.get_received()
+    return clients
+
+
+def client_config():
+    """websocket模式下本进程只建用户与签发会话，不处理连接，按线程模式创建应用（无需gevent补丁）"""
+    from config import get_config
+
+    class BenchmarkClientConfig(get_config()):
+        ASYNC_MODE = 'threading'
+
+    return BenchmarkClientConfig
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ServedApp:
+    """在子进程中以gunicorn启动wsgi:app，worker类型与生产部署一致"""
+
+    WORKER_CLASSES = {
+        'gevent': 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker',
+        'threading': 'gthread'
+    }
+
+    def __init__(self, args, workdir):
+        port = free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        command = [
+            sys.executable, '-m', 'gunicorn',
+            '-w', str(args.workers),
+            '-k', self.WORKER_CLASSES[args.async_mode],
+            '-b', f"127.0.0.1:{port}",
+            '--graceful-timeout', '5'
+        ]
+        if args.async_mode == 'threading':
+            # 线程模式下每个WebSocket连接占用一个线程
+            command += ['--threads', str(args.users + 16)]
+        else:
+            command += ['--worker-connections', '2000']
+        command.append('wsgi:app')
+        self.log_path = os.path.join(workdir, 'gunicorn.log')
+        self._log = open(self.log_path, 'w')
+        self.proc = subprocess.Popen(
+            command, cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ), stdout=self._log, stderr=subprocess.STDOUT
+        )
+        self._wait_ready(args.startup_timeout)
+
+    def _wait_ready(self, timeout):
+        import requests
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                break
+            try:
+                if requests.get(self.url + '/login', timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        with open(self.log_path, encoding='utf-8', errors='replace') as f:
+            raise RuntimeError(f"gunicorn启动失败:\n{f.read()[-2000:]}")
+
+    def workers(self):
+        """worker进程pid（gunicorn master的子进程），/proc不可用时为空"""
+        try:
+            with open(f"/proc/{self.proc.pid}/task/{self.proc.pid}/children") as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def usage(self):
+        """所有worker的线程数与常驻内存（MB）之和，无法读取时为 (None, None)"""
+        threads, rss = 0, 0
+        pids = self.workers()
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith('Threads:'):
+                            threads += int(line.split()[1])
+                        elif line.startswith('VmRSS:'):
+                            rss += int(line.split()[1])
+            except OSError:
+                continue
+        if not pids:
+            return None, None
+        return threads, round(rss / 1024, 1)
+
+    def stop(self):
+        workers = self.workers()
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        # master被强制结束时worker不会随之退出
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self._log.close()
+
+
+def unpack_events(messages, now):
+    """展开服务端合并推送的batch事件，产出 (事件名, 数据, 到达时间)"""
+    for message in messages:
+        data = message['args'][0] if message['args'] else {}
+        received_at = message.get('received_at', now)
+        if message['name'] == 'batch':
+            for name, item in data:
+                yield name, item, received_at
+        else:
+            yield message['name'], data, received_at
+
+
+def run(args):
+    if args.transport == 'inprocess' and args.async_mode == 'gevent':
+        # 与gunicorn的gevent worker一致，在启动任何线程之前打补丁
+        from gevent import monkey
+        monkey.patch_all()
+    stub = start_stub_server(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        echo=True
+    )
+    workdir = tempfile.mkdtemp(prefix='douyin_bench_')
+    env = prepare_env(args, stub, workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import create_app
+    import services
+
+    server = None
+    clients = []
+    try:
+        if args.transport == 'inprocess':
+            app = create_app()
+            clients = create_clients(app, create_users(app, args.users))
+        else:
+            app = create_app(client_config())
+            users = create_users(app, args.users)
+            server = ServedApp(args, workdir)
+            clients = connect_clients(app, server.url, users)
+        result = drive(args, clients, server)
+    finally:
+        if server:
+            for _, client in clients:
+                client.disconnect()
+            server.stop()
+
+    stats = {}
+    if server is None:
+        with app.app_context():
+            for name in ('analysis_executor', 'http_client', 'reply_cache', 'emit_batcher'):
+                component = getattr(services, name, None)
+                if component is not None:
+                    stats[name] = component.stats()
+
+    result["results"].update({"stub_calls": dict(stub.calls), "stub_connections": stub.connections})
+    result["config"] = {
+        "users": args.users,
+        "rate": args.rate,
+        "duration": args.duration,
+        "stub_latency": args.latency,
+        "stub_token_delay": args.token_delay,
+        "stub_error_rate": args.error_rate,
+        "stream": args.stream,
+        "async_mode": args.async_mode,
+        "transport": args.transport,
+        "workers": args.workers if server else None,
+        "env": {k: v for k, v in env.items() if k not in ('SECRET_KEY',)}
+    }
+    result["components"] = stats
+    return result
+
+
+def drive(args, clients, server):
+    """按目标速率发送评论并收集回复；线程数与内存取自服务进程（进程内模式为本进程）"""
+    pending = {}     # {(user_id, seq): 发送时间}
+    latencies = []
+    counters = {"sent": 0, "replies": 0, "fallback": 0, "busy": 0, "unmatched": 0}
+    usage = {"threads_peak": 0, "rss_mb": None, "sampled_at": 0}
+    last_reply = [time.perf_counter()]
+
+    def sample():
+        now = time.perf_counter()
+        if server is None:
+            usage["threads_peak"] = max(usage["threads_peak"], threading.active_count())
+        elif now - usage["sampled_at"] >= 0.5:
+            threads, rss = server.usage()
+            usage["sampled_at"] = now
+            if threads is not None:
+                usage["threads_peak"] = max(usage["threads_peak"], threads)
+                usage["rss_mb"] = rss
+
+    def collect():
+        now = time.perf_counter()
+        for user_id, client in clients:
+            for name, data, received_at in unpack_events(client.get_received(), now):
+                if name == 'system_msg' and data.get('type') == 'warning':
+                    counters["busy"] += 1
+                if name != 'ai_reply':
+                    continue
+                counters["replies"] += 1
+                content = data.get('content') or ''
+                if content.startswith('抱歉'):
+                    counters["fallback"] += 1
+                # 微批模式下一条回复可能覆盖多条评论
+                matched = False
+                for uid, seq in MARKER.findall(content):
+                    sent_at = pending.pop((int(uid), int(seq)), None)
+                    if sent_at is not None:
+                        latencies.append(received_at - sent_at)
+                        last_reply[0] = max(last_reply[0], received_at)
+                        matched = True
+                if not matched:
+                    counters["unmatched"] += 1
+
+    interval = 1.0 / args.rate
+    started = time.perf_counter()
+    next_send = started
+    seq = 0
+    while time.perf_counter() - started < args.duration:
+        now = time.perf_counter()
+        while next_send <= now:
+            user_id, client = clients[seq % len(clients)]
+            question = QUESTIONS[seq % len(QUESTIONS)]
+            pending[(user_id, seq)] = time.perf_counter()
+            client.emit('analyze_comment', {"user": f"观众{seq}", "content": f"{question} #{user_id}-{seq}#"})
+            counters["sent"] += 1
+            seq += 1
+            next_send += interval
+        collect()
+        sample()
+        time.sleep(0.002)
+    send_elapsed = time.perf_counter() - started
+
+    # 发送结束后等待在途回复；被拒绝的评论不会有回复，持续无新回复即结束
+    drain_deadline = time.perf_counter() + args.drain
+    while pending and time.perf_counter() < drain_deadline:
+        collect()
+        sample()
+        if time.perf_counter() - max(last_reply[0], started + send_elapsed) > args.idle:
+            break
+        time.sleep(0.005)
+    elapsed = max(last_reply[0], started + send_elapsed) - started
+
+    return {
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - elapsed)),
+        "results": {
+            "sent": counters["sent"],
+            "answered": len(latencies),
+            "lost": len(pending),
+            "fallback_replies": counters["fallback"],
+            "busy_rejections": counters["busy"],
+            "unmatched_replies": counters["unmatched"],
+            "send_rate": round(counters["sent"] / send_elapsed, 2),
+            "throughput": round(len(latencies) / elapsed, 2),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": round(max(latencies) * 1000, 1) if latencies else None
+            },
+            "threads_peak": usage["threads_peak"],
+            "rss_mb": rss_mb() if server is None else usage["rss_mb"]
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直播间评论-回复流水线压测")
+    parser.add_argument('--users', type=int, default=10, help="并发直播间（用户）数")
+    parser.add_argument('--rate', type=float, default=20, help="总发送速率（条/秒）")
+    parser.add_argument('--duration', type=float, default=20, help="发送时长（秒）")
+    parser.add_argument('--drain', type=float, default=15, help="发送结束后等待回复的最长时间（秒）")
+    parser.add_argument('--idle', type=float, default=3, help="等待回复时连续无新回复即结束（秒）")
+    parser.add_argument('--latency', type=float, default=0.3, help="模拟服务首包延迟（秒）")
+    parser.add_argument('--token-delay', type=float, default=0.02, help="模拟流式输出每段间隔（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="模拟服务注入503错误的概率")
+    parser.add_argument('--stream', action='store_true', help="启用流式回复（AI_REPLY_STREAM）")
+    parser.add_argument('--async-mode', choices=('gevent', 'threading'), default='gevent', help="并发模式（ASYNC_MODE）")
+    parser.add_argument('--transport', choices=('websocket', 'inprocess'), default='websocket',
+                        help="websocket: gunicorn子进程+真实客户端；inprocess: 进程内测试客户端，只测处理流水线")
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn worker数（websocket模式）")
+    parser.add_argument('--startup-timeout', type=float, default=30, help="等待gunicorn启动的最长时间（秒）")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help="覆盖应用配置，可重复")
+    parser.add_argument('--output', help="结果JSON路径，默认 benchmark_results/<时间>.json")
+    args = parser.parse_args()
+
+    result = run(args)
+    prefix = 'pipeline_' if args.transport == 'inprocess' else 'websocket_'
+    output = args.output or os.path.join('benchmark_results', prefix + time.strftime("%Y%m%d_%H%M%S") + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    r = result["results"]
+    if args.transport == 'inprocess':
+        print("进程内测试客户端：未经过网络传输、序列化与消息队列，结果只反映评论处理流水线")
+    print(f"发送 {r['sent']} 条（{r['send_rate']}/s），回复 {r['answered']} 条，丢失 {r['lost']} 条，"
+          f"降级 {r['fallback_replies']} 条，繁忙拒绝 {r['busy_rejections']} 次")
+    print(f"吞吐 {r['throughput']}/s，延迟 p50={r['latency_ms']['p50']}ms "
+          f"p95={r['latency_ms']['p95']}ms p99={r['latency_ms']['p99']}ms")
+    scope = "本进程" if args.transport == 'inprocess' else f"{args.workers}个worker合计"
+    print(f"线程峰值 {r['threads_peak']}，RSS {r['rss_mb']}MB（{scope}）")
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""评论微批处理：按直播间收集短时间窗口内的评论，相似问题聚类后整批交给回调"""
+import threading
+
+from reply_cache import normalize_text, char_ngrams, ngram_similarity
+from comment_scheduler import CommentScheduler
+
+
+class CommentCluster:
+    """一组相似评论，以第一条作为代表问题"""
+
+    __slots__ = ('question', 'comments', '_text', '_grams')
+
+    def __init__(self, comment, text, grams):
+        self.question = comment['content']
+        self.comments = [comment]
+        self._text = text
+        self._grams = grams
+
+    @property
+    def askers(self):
+        """提问观众昵称（去重并保持顺序）"""
+        return list(dict.fromkeys(c.get('user', '观众') for c in self.comments))
+
+
+def cluster_comments(comments, similarity=0.6, ngram=2):
+    """贪心聚类：与已有簇的代表问题相似度达到阈值即并入"""
+    clusters = []
+    for comment in comments:
+        text = normalize_text(comment.get('content'))
+        grams = char_ngrams(text, ngram)
+        for cluster in clusters:
+            if text == cluster._text or ngram_similarity(grams, cluster._grams) >= similarity:
+                cluster.comments.append(comment)
+                break
+        else:
+            clusters.append(CommentCluster(comment, text, grams))
+    return clusters
+
+
+class CommentBatcher:
+    """按key（直播间）收集评论
+
+    - on_batch(key, clusters, context): 窗口结束或达到上限时调用
+    - window: 收集窗口秒数，从窗口内第一条评论开始计时
+    - max_size: 单批评论上限，达到后立即提交
+    """
+
+    def __init__(self, on_batch, window=0.8, max_size=20, similarity=0.6, ngram=2):
+        self.on_batch = on_batch
+        self.window = window
+        self.max_size = max(1, int(max_size))
+        self.similarity = similarity
+        self.ngram = ngram
+        self._pending = {}  # {key: ([comment], context)}
+        self._lock = threading.Lock()
+        self._timer = CommentScheduler(self._on_deadline, name='comment_batcher')
+        self._stats = {"comments": 0, "batches": 0, "clusters": 0}
+
+    def add(self, key, comment, context=None):
+        """加入评论；context为提交时附带的上下文（以最新一次为准）"""
+        with self._lock:
+            comments, _ = self._pending.get(key, ([], None))
+            comments.append(comment)
+            self._pending[key] = (comments, context)
+            self._stats["comments"] += 1
+            first, full = len(comments) == 1, len(comments) >= self.max_size
+        if full:
+            self._timer.cancel(key)
+            self.flush(key)
+        elif first:
+            self._timer.schedule(key, self.window, delay=self.window)
+
+    def flush(self, key):
+        with self._lock:
+            comments, context = self._pending.pop(key, (None, None))
+            if not comments:
+                return
+            clusters = cluster_comments(comments, self.similarity, self.ngram)
+            self._stats["batches"] += 1
+            self._stats["clusters"] += len(clusters)
+        self.on_batch(key, clusters, context)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["pending_rooms"] = len(self._pending)
+        # 每次LLM调用平均覆盖的评论数
+        data["comments_per_cluster"] = round(data["comments"] / data["clusters"], 2) if data["clusters"] else 0.0
+        return data
+
+    def _on_deadline(self, key):
+        self.flush(key)
+        return None
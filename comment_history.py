@@ -0,0 +1,142 @@
+"""直播间评论/回复历史：每个直播间一个定长环形缓冲，后台线程批量写入数据库
+
+内存中只保留最近 max_size 条记录供断线重连时回放，更早的历史从数据库分页查询。
+"""
+import time
+import itertools
+import threading
+from collections import deque
+
+
+class HistoryRecord:
+    """单条历史记录（评论或AI回复）"""
+
+    __slots__ = ('seq', 'user_id', 'kind', 'user', 'content', 'timestamp',
+                 'created_at', 'reply_to', 'question')
+
+    def __init__(self, seq, user_id, kind, user, content, timestamp, reply_to=None, question=None):
+        self.seq = seq
+        self.user_id = user_id
+        self.kind = kind  # comment | reply
+        self.user = user
+        self.content = content
+        self.timestamp = timestamp
+        self.created_at = time.time()
+        self.reply_to = reply_to
+        self.question = question
+
+    def to_dict(self):
+        """与 new_comment / ai_reply 推送结构一致，前端可直接渲染"""
+        data = {
+            "kind": self.kind,
+            "user": self.user,
+            "content": self.content,
+            "timestamp": self.timestamp
+        }
+        if self.reply_to:
+            data["reply_to"] = self.reply_to
+        return data
+
+
+class CommentHistory:
+    """按直播间（user_id）保存最近的评论与回复
+
+    - writer(records): 批量持久化回调，在后台线程中调用；抛出异常时该批记录丢弃
+    - flush_interval: 最长写入间隔（秒）
+    - flush_size: 积压达到该条数时立即唤醒写入；积压上限为其10倍，超出丢弃最旧记录
+    """
+
+    def __init__(self, max_size=1000, writer=None, flush_interval=2.0, flush_size=200,
+                 on_error=None, name='comment_history'):
+        self.max_size = max(1, int(max_size))
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.flush_size = max(1, int(flush_size))
+        self.on_error = on_error
+        self.name = name
+        self._rooms = {}     # {user_id: deque[HistoryRecord]}
+        self._pending = []   # 待写入数据库的记录
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {"recorded": 0, "flushed": 0, "flushes": 0, "dropped": 0}
+
+    def record(self, user_id, kind, data, question=None):
+        """记录一条推送（data为 new_comment / ai_reply 的推送内容）"""
+        record = HistoryRecord(
+            next(self._seq), user_id, kind,
+            data.get('user'), data.get('content'), data.get('timestamp'),
+            reply_to=data.get('reply_to'), question=question
+        )
+        wake = False
+        with self._lock:
+            room = self._rooms.get(user_id)
+            if room is None:
+                room = self._rooms[user_id] = deque(maxlen=self.max_size)
+            room.append(record)
+            self._stats["recorded"] += 1
+            if self.writer:
+                self._pending.append(record)
+                overflow = len(self._pending) - self.flush_size * 10
+                if overflow > 0:
+                    # 数据库长时间不可用时限制积压
+                    del self._pending[:overflow]
+                    self._stats["dropped"] += overflow
+                wake = len(self._pending) >= self.flush_size
+                self._ensure_thread()
+        if wake:
+            self._wakeup.set()
+        return record
+
+    def recent(self, user_id, limit=None):
+        """最近的记录（按时间正序）"""
+        with self._lock:
+            records = list(self._rooms.get(user_id, ()))
+        return records[-limit:] if limit else records
+
+    def discard(self, user_id):
+        """释放直播间的内存缓冲（直播停止或用户删除时调用）；待写入的记录不受影响，回放改从数据库读取"""
+        with self._lock:
+            self._rooms.pop(user_id, None)
+
+    def flush(self):
+        """立即写入积压记录，返回写入条数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self.writer(batch)
+            except Exception as e:
+                with self._lock:
+                    self._stats["dropped"] += len(batch)
+                if self.on_error:
+                    self.on_error(e)
+                return 0
+            with self._lock:
+                self._stats["flushed"] += len(batch)
+                self._stats["flushes"] += 1
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["rooms"] = len(self._rooms)
+            data["buffered"] = sum(len(room) for room in self._rooms.values())
+            data["pending"] = len(self._pending)
+        return data
+
+    def _ensure_thread(self):
+        # 首次记录时启动（需持有锁），避免在gunicorn fork之前创建线程
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
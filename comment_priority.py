@@ -0,0 +1,224 @@
+"""评论优先级调度：按购买意向等规则打分，去重/合并重复问题，并按每分钟回复预算放行
+
+每个直播间一个优先队列。评论进入后立即尝试放行；预算用尽时留在队列中，
+后到的高分评论可以插到低分评论之前，超过最长等待时间的评论直接丢弃。
+"""
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+from reply_cache import normalize_text, char_ngrams, ngram_similarity
+from comment_scheduler import CommentScheduler
+
+DEFAULT_RULES = [
+    (("价格", "多少钱", "优惠", "便宜", "折扣", "券", "发货", "包邮", "链接", "怎么买", "下单", "库存", "尺码"), 10),
+    (("质量", "售后", "退货", "保修", "材质", "怎么用", "效果", "正品"), 5),
+    (("?", "？", "吗", "么", "怎么", "什么", "哪"), 2),
+]
+
+
+def parse_rules(text):
+    """解析规则配置，格式为 "价格,优惠,发货:10;质量,售后:5"，为空时使用默认规则"""
+    if not text:
+        return DEFAULT_RULES
+    rules = []
+    for part in text.split(';'):
+        if ':' not in part:
+            continue
+        words, weight = part.rsplit(':', 1)
+        keywords = tuple(w.strip() for w in words.split(',') if w.strip())
+        if keywords:
+            rules.append((keywords, float(weight)))
+    return rules
+
+
+def score_comment(content, rules):
+    """命中的每组规则取其权重累加"""
+    return sum(weight for keywords, weight in rules if any(k in content for k in keywords))
+
+
+class QueuedComment:
+    __slots__ = ('comment', 'text', 'grams', 'score', 'received_at', 'askers', 'removed')
+
+    def __init__(self, comment, text, grams, score):
+        self.comment = comment
+        self.text = text
+        self.grams = grams
+        self.score = score
+        self.received_at = time.time()
+        self.askers = [comment.get('user', '观众')]
+        self.removed = False
+
+
+class RoomQueue:
+    __slots__ = ('heap', 'items', 'answered', 'sent', 'budget', 'context', 'scheduled')
+
+    def __init__(self):
+        self.heap = []          # [(-优先级, seq, QueuedComment)]，合并后的旧条目惰性删除
+        self.items = []         # 排队中的评论，用于合并相似问题
+        self.answered = deque() # 已放行问题 [(时间, 文本, n-gram)]
+        self.sent = deque()     # 最近一分钟的放行时间
+        self.budget = 0
+        self.context = None
+        self.scheduled = False  # 是否在调度中（与调度器状态在本类的锁内同步）
+
+
+class CommentPrioritizer:
+    """按key（直播间）排队评论
+
+    - dispatch(key, comment, askers, context): 放行回调，在调度线程中执行，应尽快返回
+    - dedup_window: 相似问题在该秒数内已放行过则丢弃
+    - similarity: 判定相似问题的n-gram相似度阈值
+    - recency_weight: 每等待1秒扣减的分数，同分时越新的评论越优先（直播中新问题更有时效）
+    - merge_weight: 每合并一条重复问题增加的分数（问的人越多越优先）
+    - max_wait: 排队超过该秒数的评论丢弃
+    - max_queue: 单个直播间的队列上限，超出时丢弃分数最低的评论
+    - burst: 每次调度最多放行的条数，剩余评论稍后再放行以便插队
+    """
+
+    TICK = 0.2
+
+    def __init__(self, dispatch, rules=None, dedup_window=60, similarity=0.8, ngram=2,
+                 recency_weight=0.1, merge_weight=1, max_wait=60, max_queue=100, burst=3):
+        self.dispatch = dispatch
+        self.rules = rules or DEFAULT_RULES
+        self.dedup_window = dedup_window
+        self.similarity = similarity
+        self.ngram = ngram
+        self.recency_weight = recency_weight
+        self.merge_weight = merge_weight
+        self.max_wait = max_wait
+        self.max_queue = max(1, int(max_queue))
+        self.burst = max(1, int(burst))
+        self._rooms = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._timer = CommentScheduler(self._on_tick, name='comment_priority')
+        self._stats = {"queued": 0, "dispatched": 0, "duplicates": 0, "merged": 0,
+                       "expired": 0, "overflow": 0, "deferred": 0}
+
+    def push(self, key, comment, budget=0, context=None):
+        """加入评论；budget为每分钟最多放行的条数（0为不限），返回 queued/merged/duplicate"""
+        text = normalize_text(comment.get('content'))
+        grams = char_ngrams(text, self.ngram)
+        now = time.time()
+        with self._lock:
+            room = self._rooms.get(key)
+            if room is None:
+                room = self._rooms[key] = RoomQueue()
+            room.budget = budget
+            room.context = context
+            self._expire_answered(room, now)
+
+            if any(self._similar(text, grams, t, g) for _, t, g in room.answered):
+                self._stats["duplicates"] += 1
+                return 'duplicate'
+            for item in room.items:
+                if self._similar(text, grams, item.text, item.grams):
+                    item.askers.append(comment.get('user', '观众'))
+                    item.score += self.merge_weight
+                    # 分数变化后重新入堆，旧条目在出堆时按removed跳过
+                    self._push_heap(room, item)
+                    self._stats["merged"] += 1
+                    return 'merged'
+
+            item = QueuedComment(comment, text, grams, score_comment(comment.get('content') or '', self.rules))
+            idle = not room.items
+            room.items.append(item)
+            self._push_heap(room, item)
+            self._stats["queued"] += 1
+            if len(room.items) > self.max_queue:
+                lowest = min(room.items, key=self._priority)
+                self._remove(room, lowest)
+                self._stats["overflow"] += 1
+            # 空队列的直播间可能正等待清理，重新按TICK调度
+            start = idle or not room.scheduled
+            room.scheduled = True
+        if start:
+            self._timer.schedule(key, self.TICK)
+        return 'queued'
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["rooms"] = len(self._rooms)
+            data["waiting"] = sum(len(room.items) for room in self._rooms.values())
+        return data
+
+    def _similar(self, text, grams, other_text, other_grams):
+        return text == other_text or ngram_similarity(grams, other_grams) >= self.similarity
+
+    def _priority(self, item):
+        # score - w * (now - received_at) 与 score + w * received_at 排序一致，堆键无需随时间更新
+        return item.score + self.recency_weight * item.received_at
+
+    def _push_heap(self, room, item):
+        heapq.heappush(room.heap, (-self._priority(item), next(self._seq), item))
+
+    def _remove(self, room, item):
+        item.removed = True
+        room.items.remove(item)
+
+    def _expire_answered(self, room, now):
+        while room.answered and now - room.answered[0][0] > self.dedup_window:
+            room.answered.popleft()
+        while room.sent and now - room.sent[0] > 60:
+            room.sent.popleft()
+
+    def _retain_until(self, room):
+        """空队列的直播间需保留到去重记录与放行计数过期，都已过期时返回None"""
+        deadlines = []
+        if room.answered:
+            deadlines.append(room.answered[-1][0] + self.dedup_window)
+        if room.budget and room.sent:
+            deadlines.append(room.sent[-1] + 60)
+        return max(deadlines) if deadlines else None
+
+    def _on_tick(self, key):
+        released = []
+        now = time.time()
+        with self._lock:
+            room = self._rooms.get(key)
+            if room is None:
+                return None
+            self._expire_answered(room, now)
+            for item in [i for i in room.items if now - i.received_at > self.max_wait]:
+                self._remove(room, item)
+                self._stats["expired"] += 1
+
+            while room.heap and len(released) < self.burst:
+                if room.budget and len(room.sent) >= room.budget:
+                    self._stats["deferred"] += 1
+                    break
+                _, _, item = heapq.heappop(room.heap)
+                if item.removed:
+                    continue
+                self._remove(room, item)
+                room.sent.append(now)
+                room.answered.append((now, item.text, item.grams))
+                released.append(item)
+            # 清理失效的堆条目
+            room.heap = [entry for entry in room.heap if not entry[2].removed]
+            heapq.heapify(room.heap)
+            context = room.context
+            if not room.items:
+                retain_until = self._retain_until(room)
+                if retain_until is None:
+                    next_delay = None
+                    room.scheduled = False
+                    del self._rooms[key]
+                else:
+                    # 队列已空，去重记录与预算计数过期后再调度一次以删除直播间
+                    next_delay = max(self.TICK, retain_until - now + self.TICK)
+            elif room.budget and len(room.sent) >= room.budget:
+                # 预算用尽，等到最早一次放行满一分钟
+                next_delay = max(self.TICK, room.sent[0] + 60 - now)
+            else:
+                next_delay = self.TICK
+            self._stats["dispatched"] += len(released)
+
+        for item in released:
+            self.dispatch(key, item.comment, item.askers, context)
+        return next_delay
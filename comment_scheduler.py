@@ -0,0 +1,126 @@
+"""评论采集调度器：单线程 + 最小堆维护各直播间的下次采集时间
+
+所有直播间共用一个调度线程，空闲时阻塞等待最近的截止时间，
+停止的直播间直接移出调度，不再占用线程或产生空转唤醒。
+"""
+import time
+import heapq
+import itertools
+import threading
+
+
+class CommentScheduler:
+    """按截止时间驱动的直播间调度器
+
+    - on_tick(user_id): 到期回调，返回下次间隔（秒）；返回None表示移出调度
+    - on_error(user_id, e): 回调异常时调用，该直播间按原间隔继续调度
+    """
+
+    def __init__(self, on_tick, on_error=None, name='comment_scheduler'):
+        self.on_tick = on_tick
+        self.on_error = on_error
+        self.name = name
+        self._entries = {}  # {user_id: [generation, interval, deadline]}
+        self._heap = []     # [(deadline, seq, user_id, generation)]，失效条目惰性删除
+        self._seq = itertools.count()
+        self._generation = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {"ticks": 0, "errors": 0, "max_lag_ms": 0.0}
+
+    def schedule(self, user_id, interval, delay=0):
+        """加入或重置直播间调度，delay秒后首次触发"""
+        with self._cond:
+            self._push(user_id, interval, time.time() + delay)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def reschedule(self, user_id, interval):
+        """修改采集间隔，从上次触发时间起按新间隔计算"""
+        with self._cond:
+            entry = self._entries.get(user_id)
+            if not entry:
+                return False
+            last_fired = entry[2] - entry[1]
+            self._push(user_id, interval, max(time.time(), last_fired + interval))
+            self._cond.notify()
+            return True
+
+    def cancel(self, user_id):
+        """移出调度（堆中的旧条目在到期时丢弃）"""
+        with self._cond:
+            return self._entries.pop(user_id, None) is not None
+
+    def is_scheduled(self, user_id):
+        with self._cond:
+            return user_id in self._entries
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._stats)
+            data["rooms"] = len(self._entries)
+            data["heap_size"] = len(self._heap)
+        data["max_lag_ms"] = round(data["max_lag_ms"], 2)
+        return data
+
+    def _push(self, user_id, interval, deadline):
+        """写入新条目（需持有锁），必要时压缩堆中的失效条目"""
+        generation = next(self._generation)
+        self._entries[user_id] = [generation, interval, deadline]
+        heapq.heappush(self._heap, (deadline, next(self._seq), user_id, generation))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (entry[2], next(self._seq), uid, entry[0])
+                for uid, entry in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _pop_due(self):
+        """阻塞直到有到期条目，返回 (user_id, generation, interval, deadline)（需持有锁）"""
+        while True:
+            while self._heap:
+                deadline, _, user_id, generation = self._heap[0]
+                entry = self._entries.get(user_id)
+                if entry is None or entry[0] != generation:
+                    heapq.heappop(self._heap)
+                    continue
+                wait = deadline - time.time()
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    return user_id, generation, entry[1], deadline
+                self._cond.wait(wait)
+                break
+            else:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                user_id, generation, interval, deadline = self._pop_due()
+                lag = (time.time() - deadline) * 1000
+                self._stats["max_lag_ms"] = max(self._stats["max_lag_ms"], lag)
+                self._stats["ticks"] += 1
+
+            try:
+                next_interval = self.on_tick(user_id)
+            except Exception as e:
+                next_interval = interval
+                with self._cond:
+                    self._stats["errors"] += 1
+                if self.on_error:
+                    self.on_error(user_id, e)
+
+            with self._cond:
+                entry = self._entries.get(user_id)
+                # 回调期间被取消或重新调度时，以最新状态为准
+                if entry is None or entry[0] != generation:
+                    continue
+                if next_interval is None:
+                    del self._entries[user_id]
+                else:
+                    self._push(user_id, next_interval, time.time() + next_interval)
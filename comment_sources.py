@@ -0,0 +1,245 @@
+"""直播间评论来源：模拟数据 / 抖音弹幕websocket / JSONL录制回放
+
+调度器每次到期调用 fetch() 取走当前可用的评论，再按 next_delay() 安排下次采集。
+评论统一为 {"user", "content", "timestamp", "answered"} 结构。
+"""
+import re
+import json
+import time
+import uuid
+import threading
+from collections import deque
+
+import douyin_proto
+
+
+def make_comment(user, content, ts=None):
+    return {
+        "user": user,
+        "content": content,
+        "timestamp": time.strftime("%H:%M:%S", time.localtime(ts)),
+        "answered": False
+    }
+
+
+class CommentSource:
+    """评论来源接口"""
+
+    exhausted = False  # 为True时调度器将直播间移出调度
+
+    def fetch(self, limit):
+        """非阻塞地取出最多limit条评论"""
+        raise NotImplementedError
+
+    def next_delay(self, interval):
+        """距下次采集的秒数，interval为用户设置的监控间隔"""
+        return interval
+
+    def close(self):
+        pass
+
+
+class DemoCommentSource(CommentSource):
+    """模拟评论：每个间隔产生一条"""
+
+    COMMENTS = [
+        "这个产品怎么用？", "价格能优惠吗？", "发货地在哪？",
+        "有售后服务吗？", "适合送人吗？", "质量怎么样？",
+        "主播能演示下吗？", "今天有什么优惠？", "买过的说说体验"
+    ]
+
+    def fetch(self, limit):
+        now = time.time()
+        return [make_comment(
+            f"观众{int(now % 1000)}",
+            self.COMMENTS[int(now) % len(self.COMMENTS)]
+        )]
+
+
+class ReplayCommentSource(CommentSource):
+    """回放录制的弹幕（JSONL，每行 {"user", "content", "ts"}）
+
+    speed: 1为原速，N为N倍速，0为不等待（最大速度）
+    loop: 回放结束后从头开始，用于持续压测
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    self.records.append((float(record.get('ts') or 0), record))
+        self.speed = speed
+        self.loop = loop
+        self._pos = 0
+        self._start = time.time()
+        self._origin = self.records[0][0] if self.records else 0
+
+    @property
+    def exhausted(self):
+        return not self.records or (not self.loop and self._pos >= len(self.records))
+
+    def _due_at(self, index):
+        if self.speed <= 0:
+            return 0
+        return self._start + (self.records[index][0] - self._origin) / self.speed
+
+    def fetch(self, limit):
+        comments = []
+        now = time.time()
+        while self.records and len(comments) < limit:
+            if self._pos >= len(self.records):
+                if not self.loop:
+                    break
+                # 新一轮回放以当前时间为起点
+                self._pos = 0
+                self._start = now
+            if self._due_at(self._pos) > now:
+                break
+            _, record = self.records[self._pos]
+            comments.append(make_comment(record.get('user', '观众'), record.get('content', '')))
+            self._pos += 1
+        return comments
+
+    def next_delay(self, interval):
+        if self.speed <= 0 or self._pos >= len(self.records):
+            return 0
+        return max(0.0, self._due_at(self._pos) - time.time())
+
+
+class DouyinLiveSource(CommentSource):
+    """抖音直播弹幕采集：解析直播页得到room_id，连接webcast websocket并解码评论
+
+    - ws_url: websocket地址模板，支持 {room_id} 与 {user_unique_id} 占位
+    - signer: 可选的签名函数 signer(room_id, user_unique_id) -> signature，
+      抖音部分线路会校验该参数
+    - record_path: 可选，将收到的评论追加写入JSONL，供 ReplayCommentSource 回放
+    """
+
+    USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    HEARTBEAT_INTERVAL = 10
+    RECONNECT_DELAY = 5
+
+    def __init__(self, live_url, ws_url, poll_interval=1.0, buffer_size=5000,
+                 signer=None, record_path=None, on_error=None):
+        self.live_url = live_url
+        self.ws_url = ws_url
+        self.poll_interval = poll_interval
+        self.signer = signer
+        self.record_path = record_path
+        self.on_error = on_error
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._ws = None
+        self._thread = threading.Thread(target=self._run, name='douyin_ws', daemon=True)
+        self._thread.start()
+
+    def fetch(self, limit):
+        with self._lock:
+            count = min(limit, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def next_delay(self, interval):
+        return min(interval, self.poll_interval)
+
+    def close(self):
+        self._closed.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def resolve_room(self):
+        """访问直播页，返回 (room_id, ttwid)"""
+        import requests
+
+        response = requests.get(
+            self.live_url,
+            headers={"User-Agent": self.USER_AGENT},
+            cookies={"__ac_nonce": uuid.uuid4().hex[:21]},
+            timeout=10
+        )
+        match = re.search(r'roomId\\?":\\?"(\d+)', response.text)
+        if not match:
+            raise RuntimeError(f"无法从直播页解析room_id: {self.live_url}")
+        return match.group(1), response.cookies.get('ttwid', '')
+
+    def _run(self):
+        try:
+            import websocket
+        except ImportError:
+            self._report(RuntimeError("抖音弹幕采集需要安装websocket-client"))
+            return
+        while not self._closed.is_set():
+            try:
+                room_id, ttwid = self.resolve_room()
+                user_unique_id = str(int(time.time() * 1000))
+                url = self.ws_url.format(room_id=room_id, user_unique_id=user_unique_id)
+                if self.signer:
+                    url += f"&signature={self.signer(room_id, user_unique_id)}"
+                self._ws = websocket.WebSocketApp(
+                    url,
+                    header={"User-Agent": self.USER_AGENT},
+                    cookie=f"ttwid={ttwid}",
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=lambda ws, e: self._report(e)
+                )
+                self._ws.run_forever()
+            except Exception as e:
+                self._report(e)
+            self._closed.wait(self.RECONNECT_DELAY)
+
+    def _on_open(self, ws):
+        def heartbeat():
+            while not self._closed.is_set() and ws.sock and ws.sock.connected:
+                ws.send(douyin_proto.encode_push_frame('hb'), opcode=0x2)
+                self._closed.wait(self.HEARTBEAT_INTERVAL)
+        threading.Thread(target=heartbeat, name='douyin_ws_hb', daemon=True).start()
+
+    def _on_message(self, ws, data):
+        frame = douyin_proto.decode_push_frame(data)
+        if frame['payload_type'] != 'msg':
+            return
+        response = douyin_proto.decode_response(frame['payload'], frame['payload_encoding'] or 'gzip')
+        if response['need_ack']:
+            ack = douyin_proto.encode_push_frame('ack', response['internal_ext'], frame['log_id'])
+            ws.send(ack, opcode=0x2)
+        comments = []
+        for message in response['messages']:
+            if message['method'] != 'WebcastChatMessage':
+                continue
+            chat = douyin_proto.decode_chat_message(message['payload'])
+            if chat['content']:
+                comments.append(make_comment(chat['user'], chat['content']))
+        if comments:
+            with self._lock:
+                self._buffer.extend(comments)
+            self._record(comments)
+
+    def _record(self, comments):
+        if not self.record_path:
+            return
+        now = time.time()
+        with open(self.record_path, 'a', encoding='utf-8') as f:
+            for comment in comments:
+                f.write(json.dumps({"user": comment['user'], "content": comment['content'], "ts": now},
+                                   ensure_ascii=False) + "\n")
+
+    def _report(self, e):
+        if self.on_error and not self._closed.is_set():
+            self.on_error(e)
+
+
+def parse_speed(value):
+    """回放速度：'max'/'0' 为最大速度，其余按倍速解析"""
+    value = str(value).strip().lower()
+    if value in ('max', '0', ''):
+        return 0.0
+    return float(value.rstrip('x'))
@@ -5,6 +5,12 @@ from dotenv import load_dotenv
 # 加载环境变量
 load_dotenv()
 
+# 依赖并发模式的默认值 (gevent, threading)：gevent下工作者是greenlet，等待第三方API时不占线程，可以开得更多
+ASYNC_MODE_DEFAULTS = {
+    'HTTP_POOL_SIZE': (100, 20),
+    'ANALYZE_WORKERS': (100, 8)
+}
+
 class Config:
     """基础配置类"""
     # Flask核心配置
@@ -12,6 +18,10 @@ class Config:
     SESSION_COOKIE_SECURE = os.getenv('FLASK_ENV') == 'production'
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     
+    # 并发模式：gevent 启动时完整打猴子补丁，线程/sleep/网络IO均为协作式greenlet（生产部署）
+    # | threading 原生线程（调试器等不兼容gevent时使用）
+    ASYNC_MODE = os.getenv('ASYNC_MODE', 'gevent')
+    
     # 数据库配置
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///site.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -19,6 +29,16 @@ class Config:
         'pool_recycle': 300,
         'pool_pre_ping': True
     }
+    # SQLite连接参数：WAL模式下读写互不阻塞，写锁冲突时最多等待busy_timeout毫秒
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # WAL下NORMAL不会损坏数据库，仅断电时可能丢失最后的事务
+    # 执行ondelete级联；运行flask db迁移时应设为false（重建表会触发级联删除）
+    SQLITE_FOREIGN_KEYS = os.getenv('SQLITE_FOREIGN_KEYS', 'true').lower() == 'true'
+    # SQL计时：单条慢查询记录日志，单个请求SQL条数过多时告警
+    SQL_SLOW_QUERY_MS = int(os.getenv('SQL_SLOW_QUERY_MS', 200))  # 0为不记录
+    SQL_QUERY_WARN_COUNT = int(os.getenv('SQL_QUERY_WARN_COUNT', 30))
+    SQL_TIMING_HEADER = os.getenv('SQL_TIMING_HEADER', 'false').lower() == 'true'  # 响应附带Server-Timing头
     
     # 第三方API配置
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
@@ -28,37 +48,227 @@ class Config:
     BAIDU_APP_ID = os.getenv('BAIDU_APP_ID', '')
     BAIDU_API_KEY = os.getenv('BAIDU_API_KEY', '')
     BAIDU_SECRET_KEY = os.getenv('BAIDU_SECRET_KEY', '')
+    BAIDU_TOKEN_URL = os.getenv('BAIDU_TOKEN_URL', 'https://aip.baidubce.com/oauth/2.0/token')
+    BAIDU_TTS_URL = os.getenv('BAIDU_TTS_URL', 'https://tsn.baidu.com/text2audio')
+    
+    # 用户/设置缓存：修改设置时写穿，多worker部署可配置Redis广播失效消息
+    SETTINGS_CACHE_TTL = int(os.getenv('SETTINGS_CACHE_TTL', 60))  # 秒，0为关闭
+    CACHE_INVALIDATION_URL = os.getenv('CACHE_INVALIDATION_URL')  # 如 redis://127.0.0.1:6379/0
+    
+    # 第三方API的HTTP连接池与重试（指数退避+随机抖动，遵循429/503的Retry-After）
+    HTTP_POOL_SIZE = os.getenv('HTTP_POOL_SIZE')  # 未设置时按应用的并发模式取默认值，见ASYNC_MODE_DEFAULTS
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+    HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', 0.5))  # 首次重试的最大等待秒数，之后逐次翻倍
+    HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 8))
     
     # 系统配置
     DEBUG = os.getenv('FLASK_ENV') == 'development'
-    MAX_COMMENT_HISTORY = 1000
+    MAX_COMMENT_HISTORY = int(os.getenv('MAX_COMMENT_HISTORY', 1000))  # 每个直播间内存中保留的评论/回复条数
     AI_REPLY_TIMEOUT = 10
     COMMENT_FETCH_INTERVAL = 5
     
+    # 评论来源：demo 模拟数据 | douyin 抖音弹幕 | replay 回放JSONL录制文件
+    COMMENT_SOURCE = os.getenv('COMMENT_SOURCE', 'demo')
+    COMMENT_BATCH_MAX = int(os.getenv('COMMENT_BATCH_MAX', 200))  # 单次调度最多推送的评论数
+    COMMENT_REPLAY_FILE = os.getenv('COMMENT_REPLAY_FILE', 'fixtures/danmaku_sample.jsonl')
+    COMMENT_REPLAY_SPEED = os.getenv('COMMENT_REPLAY_SPEED', '1')  # 1 原速 | 10 十倍速 | max 最大速度
+    COMMENT_REPLAY_LOOP = os.getenv('COMMENT_REPLAY_LOOP', 'false').lower() == 'true'
+    COMMENT_RECORD_FILE = os.getenv('COMMENT_RECORD_FILE')  # 录制抖音弹幕到JSONL，供回放使用
+    DOUYIN_WS_URL = os.getenv(
+        'DOUYIN_WS_URL',
+        'wss://webcast5-ws-web-lf.douyin.com/webcast/im/push/v2/?app_name=douyin_web'
+        '&version_code=180800&webcast_sdk_version=1.0.14-beta.0&update_version_code=1.0.14-beta.0'
+        '&compress=gzip&device_platform=web&cookie_enabled=true&browser_language=zh-CN'
+        '&browser_platform=Win32&browser_name=Mozilla&browser_online=true&tz_name=Asia/Shanghai'
+        '&host=https://live.douyin.com&aid=6383&live_id=1&did_rule=3&endpoint=live_pc&support_wrds=1'
+        '&user_unique_id={user_unique_id}&im_path=/webcast/im/fetch/&identity=audience'
+        '&need_persist_msg_type_15=1&room_id={room_id}&heartbeatDuration=0'
+    )
+    
+    # 评论/回复历史：批量落库，客户端连接时回放最近记录
+    HISTORY_PERSIST = os.getenv('HISTORY_PERSIST', 'true').lower() == 'true'
+    HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', 2))  # 最长写入间隔（秒）
+    HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', 200))  # 积压达到该条数立即写入
+    HISTORY_REPLAY_ON_CONNECT = os.getenv('HISTORY_REPLAY_ON_CONNECT', 'true').lower() == 'true'
+    HISTORY_REPLAY_LIMIT = int(os.getenv('HISTORY_REPLAY_LIMIT', 50))
+    
+    # 评论优先级：按关键词规则打分，近期已回答的相似问题丢弃，排队中的相似问题合并
+    COMMENT_PRIORITY_ENABLED = os.getenv('COMMENT_PRIORITY_ENABLED', 'true').lower() == 'true'
+    COMMENT_PRIORITY_RULES = os.getenv('COMMENT_PRIORITY_RULES')  # 如 "价格,优惠,发货:10;质量,售后:5"，不设置使用默认规则
+    COMMENT_DEDUP_WINDOW = int(os.getenv('COMMENT_DEDUP_WINDOW', 60))  # 秒
+    COMMENT_DEDUP_SIMILARITY = float(os.getenv('COMMENT_DEDUP_SIMILARITY', 0.8))
+    COMMENT_PRIORITY_MAX_WAIT = int(os.getenv('COMMENT_PRIORITY_MAX_WAIT', 60))  # 排队超时丢弃（秒）
+    COMMENT_PRIORITY_BURST = int(os.getenv('COMMENT_PRIORITY_BURST', 3))  # 每0.2秒最多放行条数
+    
+    # 评论微批处理：窗口内的相似问题合并为一次LLM请求
+    ANALYZE_BATCH_ENABLED = os.getenv('ANALYZE_BATCH_ENABLED', 'false').lower() == 'true'
+    ANALYZE_BATCH_WINDOW_MS = int(os.getenv('ANALYZE_BATCH_WINDOW_MS', 800))
+    ANALYZE_BATCH_MAX = int(os.getenv('ANALYZE_BATCH_MAX', 20))
+    ANALYZE_BATCH_SIMILARITY = float(os.getenv('ANALYZE_BATCH_SIMILARITY', 0.6))  # 聚类相似度阈值
+    
+    # 流式回复：边生成边推送文本，整句即合成语音
+    AI_REPLY_STREAM = os.getenv('AI_REPLY_STREAM', 'false').lower() == 'true'
+    AI_STREAM_MIN_SENTENCE = int(os.getenv('AI_STREAM_MIN_SENTENCE', 6))  # 送入TTS的最短句长
+    
+    # 提示词预编译与token预算（按字符估算，中文约0.6 token/字）
+    AI_PROMPT_TOKEN_BUDGET = int(os.getenv('AI_PROMPT_TOKEN_BUDGET', 600))  # 系统提示词上限，超出时省略中间部分
+    AI_COMMENT_TOKEN_BUDGET = int(os.getenv('AI_COMMENT_TOKEN_BUDGET', 120))  # 单条评论上限
+    AI_MAX_TOKENS = os.getenv('AI_MAX_TOKENS', 'normal:120,professional:300,friendly:150')  # 各模式的回复上限
+    AI_CONTEXT_TURNS = int(os.getenv('AI_CONTEXT_TURNS', 0))  # 附带直播间最近几轮问答作为上下文，0为不附带
+    AI_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CONTEXT_TOKEN_BUDGET', 300))
+    
+    # AI回复缓存配置
+    REPLY_CACHE_SIZE = int(os.getenv('REPLY_CACHE_SIZE', 1024))  # 最大缓存条数，0为关闭
+    REPLY_CACHE_TTL = int(os.getenv('REPLY_CACHE_TTL', 1800))  # 缓存有效期（秒）
+    REPLY_CACHE_SIMILARITY = float(os.getenv('REPLY_CACHE_SIMILARITY', 0.85))  # 近似匹配阈值，>=1仅精确匹配
+    REPLY_CACHE_NGRAM = int(os.getenv('REPLY_CACHE_NGRAM', 2))  # 近似匹配的字符n-gram长度
+    
+    # 主播问题库：评论匹配到预设问题时直接回复，否则取相近条目作为LLM参考资料
+    FAQ_ENABLED = os.getenv('FAQ_ENABLED', 'true').lower() == 'true'
+    FAQ_MATCH_THRESHOLD = float(os.getenv('FAQ_MATCH_THRESHOLD', 0.7))  # 直接使用预设答案的最低匹配分（0~1）
+    FAQ_NGRAM = int(os.getenv('FAQ_NGRAM', 2))  # 索引的字符n-gram长度
+    FAQ_CONTEXT_TOP_K = int(os.getenv('FAQ_CONTEXT_TOP_K', 3))  # 未命中时附带的相近条目数，0为不附带
+    FAQ_CONTEXT_MIN_SCORE = float(os.getenv('FAQ_CONTEXT_MIN_SCORE', 0.2))
+    FAQ_CONTEXT_TOKEN_BUDGET = int(os.getenv('FAQ_CONTEXT_TOKEN_BUDGET', 300))
+    FAQ_MAX_ENTRIES = int(os.getenv('FAQ_MAX_ENTRIES', 500))  # 每个用户的问题数上限
+    FAQ_INDEX_TTL = int(os.getenv('FAQ_INDEX_TTL', 60))  # 秒，未配置CACHE_INVALIDATION_URL时其他worker最迟在此时间后看到修改
+    
+    # 语音缓存配置（关闭时回退为base64内联音频）
+    AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'true').lower() == 'true'
+    AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'audio_cache')
+    AUDIO_CACHE_MAX_MB = int(os.getenv('AUDIO_CACHE_MAX_MB', 256))
+    AUDIO_CACHE_MAX_AGE = 365 * 24 * 3600  # 内容寻址文件永不变化，浏览器可长期缓存
+    
+    # 语音推送方式：url 短URL（需启用语音缓存，否则回退为datauri）| binary Socket.IO二进制附件
+    # | chunked 分块audio_chunk事件 | datauri base64内联（旧方式）
+    AUDIO_TRANSPORT = os.getenv('AUDIO_TRANSPORT', 'url')
+    AUDIO_CHUNK_SIZE = int(os.getenv('AUDIO_CHUNK_SIZE', 16 * 1024))
+    
+    # 评论分析线程池配置（每个进程）
+    # gevent模式下工作者是greenlet，等待第三方API时不占线程，可以开得更多
+    ANALYZE_WORKERS = os.getenv('ANALYZE_WORKERS')  # 未设置时按应用的并发模式取默认值，见ASYNC_MODE_DEFAULTS
+    ANALYZE_QUEUE_SIZE = int(os.getenv('ANALYZE_QUEUE_SIZE', 200))
+    ANALYZE_USER_INFLIGHT = int(os.getenv('ANALYZE_USER_INFLIGHT', 5))  # 单用户排队+执行中的上限
+    ANALYZE_OVERFLOW = os.getenv('ANALYZE_OVERFLOW', 'reject')  # reject/drop_oldest/coalesce
+    
+    # 多worker部署：直播间状态共享存储与Socket.IO消息队列
+    ROOM_STATE_URL = os.getenv('ROOM_STATE_URL', 'memory://')  # memory:// | redis://... | sqlite:///rooms.db
+    # 负责采集的worker每次采集时续期租约；worker退出后租约过期，其他worker在该时间内接管（秒）
+    ROOM_LEASE_TTL = int(os.getenv('ROOM_LEASE_TTL', 30))
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')  # 如 redis://127.0.0.1:6379/0，单进程可不设
+    
+    # Socket.IO推送合并：new_comment/ai_reply在窗口内按房间合并为一个batch事件
+    EMIT_BATCH_INTERVAL_MS = int(os.getenv('EMIT_BATCH_INTERVAL_MS', 20))  # 合并窗口（毫秒），0为逐条推送
+    EMIT_BATCH_MAX = int(os.getenv('EMIT_BATCH_MAX', 50))  # 单帧最多合并的事件数
+    EMIT_BATCH_EVENTS = os.getenv('EMIT_BATCH_EVENTS', 'new_comment,ai_reply')
+    
+    # 管理后台：卡密批量生成与列表分页
+    KEYS_GENERATE_MAX = int(os.getenv('KEYS_GENERATE_MAX', 10000))  # 单次生成上限
+    KEYS_DISPLAY_MAX = int(os.getenv('KEYS_DISPLAY_MAX', 100))  # 超过该数量时直接下载CSV而不在页面展示
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 50))
+    ADMIN_PAGE_SIZE_MAX = 500  # per_page参数上限
+    
+    # 限流与每日AI额度（按用户计数；规则格式 次数/周期，如 10/s、300/m，0为不限）
+    RATE_LIMIT_URL = os.getenv('RATE_LIMIT_URL', 'memory://')  # 多worker部署时设为 redis://... 共享令牌桶
+    RATE_LIMIT_COMMENT = os.getenv('RATE_LIMIT_COMMENT', '10/s')  # analyze_comment事件
+    RATE_LIMIT_HTTP = os.getenv('RATE_LIMIT_HTTP', '300/m')  # HTTP请求（未登录按IP）
+    LOGIN_FAIL_LIMIT = os.getenv('LOGIN_FAIL_LIMIT', '5/5m')  # 同一用户名的登录失败次数，超出后不再校验密码
+    LOGIN_FAIL_IP_LIMIT = os.getenv('LOGIN_FAIL_IP_LIMIT', '20/5m')  # 同一IP的登录失败次数
+    DAILY_LLM_TOKENS = int(os.getenv('DAILY_LLM_TOKENS', 0))  # 每用户每日LLM token上限，0为不限
+    DAILY_TTS_CHARS = int(os.getenv('DAILY_TTS_CHARS', 0))  # 每用户每日语音合成字符上限，超出后改为文字回复
+    USAGE_FLUSH_INTERVAL = float(os.getenv('USAGE_FLUSH_INTERVAL', 5))  # 用量批量写入间隔（秒）
+    PROXY_FIX = int(os.getenv('PROXY_FIX', 0))  # 前置反向代理层数，>0时从X-Forwarded-For取客户端IP
+    
+    # 密码哈希（werkzeug格式，工作因子写在方法中）；登录成功时旧算法或旧参数的哈希自动升级为此配置
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_POOL = os.getenv('PASSWORD_HASH_POOL', 'thread')  # thread 线程池 | process 进程池 | inline 请求中直接计算
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # 每个进程同时计算的哈希数（scrypt每个约占32MB内存）
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 32))  # 排队上限，超出时提示稍后再试
+    
+    # Prometheus指标：/metrics 设置令牌后按令牌校验，未设置时只允许本机（经ProxyFix识别后的客户端IP）访问
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    
     # 日志配置
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+    LOG_JSON = os.getenv('LOG_JSON', 'false').lower() == 'true'  # 输出JSON Lines格式
+    LOG_ROTATE = os.getenv('LOG_ROTATE', 'size')  # size 按大小 | time 按时间 | none 不轮转（多worker写同一文件时建议none并交给logrotate）
+    LOG_MAX_MB = int(os.getenv('LOG_MAX_MB', 10))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # 待写入日志上限，写入跟不上时丢弃新日志
+    LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')  # 按时间轮转的周期，见TimedRotatingFileHandler
+    
+    @staticmethod
+    def init_app(app):
+        """创建应用时按环境校验配置，并按应用最终的ASYNC_MODE补全默认值（测试等配置类可覆盖并发模式）"""
+        gevent = app.config['ASYNC_MODE'] == 'gevent'
+        for key, (gevent_default, threading_default) in ASYNC_MODE_DEFAULTS.items():
+            value = app.config.get(key)
+            if value in (None, ''):
+                app.config[key] = gevent_default if gevent else threading_default
+            else:
+                app.config[key] = int(value)
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
     SQLALCHEMY_ECHO = True  # 打印SQL语句
-    LOG_LEVEL = 'DEBUG'
+    SQL_TIMING_HEADER = os.getenv('SQL_TIMING_HEADER', 'true').lower() == 'true'
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
 
 class ProductionConfig(Config):
     """生产环境配置"""
     DEBUG = False
-    # 生产环境强制要求设置密钥
-    if not os.getenv('SECRET_KEY'):
-        raise ValueError("生产环境必须设置SECRET_KEY环境变量")
-    LOG_LEVEL = 'WARNING'
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'WARNING')
+    
+    @staticmethod
+    def init_app(app):
+        Config.init_app(app)
+        # 生产环境强制要求设置密钥（创建应用时校验，导入配置模块不报错）
+        if not os.getenv('SECRET_KEY'):
+            raise ValueError("生产环境必须设置SECRET_KEY环境变量")
+
+class TestingConfig(Config):
+    """测试环境配置：内存数据库、线程模式、评论历史不落库、低成本密码哈希"""
+    TESTING = True
+    DEBUG = False
+    ASYNC_MODE = 'threading'
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI', 'sqlite://')
+    HISTORY_PERSIST = False
+    RATE_LIMIT_HTTP = '0'
+    RATE_LIMIT_COMMENT = '0'
+    LOGIN_FAIL_LIMIT = '0'
+    LOGIN_FAIL_IP_LIMIT = '0'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_POOL = 'inline'
 
 # 配置映射
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': ProductionConfig
 }
 
+def get_config(name=None):
+    """按环境名取配置类（默认取FLASK_ENV），传入配置类时原样返回"""
+    if name is None:
+        name = os.getenv('FLASK_ENV', 'default')
+    if isinstance(name, str):
+        return config[name]
+    return name
+
 # 激活当前配置
-active_config = config[os.getenv('FLASK_ENV', 'default')]
\ No newline at end of file
+active_config = get_config()
+
+def monkey_patch(config_class=None):
+    """gevent模式下打猴子补丁，由入口脚本（wsgi.py、python app.py）在导入app之前调用
+
+    补丁必须在导入socket/ssl/threading/requests等模块和启动线程之前完成，导入app本身不打补丁，
+    测试等在同一进程中创建其他配置的应用时不受影响；gunicorn的gevent worker已经打过补丁时跳过。
+    """
+    if (config_class or active_config).ASYNC_MODE != 'gevent':
+        return
+    from gevent import monkey
+    if not monkey.is_module_patched('socket'):
+        monkey.patch_all()
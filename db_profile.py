@@ -0,0 +1,94 @@
+"""数据库连接调优与SQL计时
+
+- SQLite：每个新连接设置WAL日志、busy_timeout与synchronous，多worker并发写入时读不阻塞写、写锁等待而非立即报错
+- 查询计时：统计每个请求执行的SQL条数与耗时，超过阈值的慢查询回调记录日志，便于发现N+1查询
+"""
+import time
+import threading
+from sqlalchemy import event
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def sqlite_pragmas(journal_mode='WAL', busy_timeout=5000, synchronous='NORMAL', foreign_keys=True):
+    """校验并生成PRAGMA语句列表（取值来自配置，拼接前先校验）"""
+    statements = []
+    if journal_mode:
+        if journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"无效的SQLite日志模式: {journal_mode}")
+        statements.append(f"PRAGMA journal_mode={journal_mode.upper()}")
+    statements.append(f"PRAGMA busy_timeout={int(busy_timeout)}")
+    if synchronous:
+        if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"无效的SQLite同步级别: {synchronous}")
+        statements.append(f"PRAGMA synchronous={synchronous.upper()}")
+    # SQLite默认不执行外键约束，ondelete CASCADE / SET NULL需要逐连接开启
+    statements.append(f"PRAGMA foreign_keys={'ON' if foreign_keys else 'OFF'}")
+    return statements
+
+
+def apply_sqlite_pragmas(engine, **options):
+    """为SQLite引擎注册连接钩子，返回执行的PRAGMA列表；其他数据库不处理，返回空列表"""
+    if engine.dialect.name != 'sqlite':
+        return []
+    statements = sqlite_pragmas(**options)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return statements
+
+
+class QueryTimer:
+    """SQL执行计时
+
+    - scope(): 返回当前请求的计数列表 [条数, 秒数]，不在请求中时返回None
+    - on_slow(statement, seconds): 单条SQL耗时达到slow_threshold秒时回调
+    """
+
+    def __init__(self, engine, scope, slow_threshold=0.2, on_slow=None):
+        self.scope = scope
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "seconds": 0.0, "slow": 0}
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        event.listen(engine, 'handle_error', self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        counters = self.scope()
+        if counters is not None:
+            counters[0] += 1
+            counters[1] += elapsed
+        slow = self.slow_threshold and elapsed >= self.slow_threshold
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["seconds"] += elapsed
+            if slow:
+                self._stats["slow"] += 1
+        if slow and self.on_slow:
+            self.on_slow(statement, elapsed)
+
+    def _error(self, context):
+        # 执行失败时不会触发after_cursor_execute，丢弃对应的开始时间
+        connection = context.connection
+        if connection is not None and connection.info.get('query_started'):
+            connection.info['query_started'].pop()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data["seconds"] = round(data["seconds"], 3)
+        return data
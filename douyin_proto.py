@@ -0,0 +1,137 @@
+"""抖音直播弹幕（webcast）protobuf 最小编解码，仅覆盖评论采集用到的字段
+
+不依赖protobuf库，按字段号手工解析wire格式:
+    PushFrame   1 seqId 2 logId 3 service 4 method 5 headers 6 payloadEncoding 7 payloadType 8 payload
+    Response    1 messages 2 cursor 3 fetchInterval 4 now 5 internalExt 8 heartbeatDuration 9 needAck
+    Message     1 method 2 payload 3 msgId
+    ChatMessage 2 user 3 content
+    User        1 id 3 nickName
+"""
+import gzip
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_BYTES = 2
+WIRE_FIXED32 = 5
+
+
+def read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("varint越界")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_varint(value):
+    out = bytearray()
+    value &= (1 << 64) - 1
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def parse_fields(buf):
+    """解析消息为 {字段号: [原始值]}，varint为int，length-delimited为bytes"""
+    fields = {}
+    pos = 0
+    while pos < len(buf):
+        key, pos = read_varint(buf, pos)
+        number, wire = key >> 3, key & 0x07
+        if wire == WIRE_VARINT:
+            value, pos = read_varint(buf, pos)
+        elif wire == WIRE_BYTES:
+            length, pos = read_varint(buf, pos)
+            value = bytes(buf[pos:pos + length])
+            pos += length
+        elif wire == WIRE_FIXED64:
+            value = int.from_bytes(buf[pos:pos + 8], 'little')
+            pos += 8
+        elif wire == WIRE_FIXED32:
+            value = int.from_bytes(buf[pos:pos + 4], 'little')
+            pos += 4
+        else:
+            raise ValueError(f"不支持的wire类型: {wire}")
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def encode_field(number, value):
+    """编码单个字段：int按varint，str/bytes按length-delimited"""
+    if isinstance(value, bool) or isinstance(value, int):
+        return encode_varint(number << 3 | WIRE_VARINT) + encode_varint(int(value))
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return encode_varint(number << 3 | WIRE_BYTES) + encode_varint(len(value)) + value
+
+
+def _first(fields, number, default=None):
+    values = fields.get(number)
+    return values[0] if values else default
+
+
+def _text(fields, number):
+    value = _first(fields, number, b'')
+    return value.decode('utf-8', errors='replace') if isinstance(value, bytes) else str(value)
+
+
+def decode_push_frame(data):
+    fields = parse_fields(data)
+    return {
+        "seq_id": _first(fields, 1, 0),
+        "log_id": _first(fields, 2, 0),
+        "payload_encoding": _text(fields, 6),
+        "payload_type": _text(fields, 7),
+        "payload": _first(fields, 8, b'')
+    }
+
+
+def encode_push_frame(payload_type, payload=b'', log_id=0):
+    """构造上行帧：心跳(hb)或确认(ack)"""
+    data = b''
+    if log_id:
+        data += encode_field(2, log_id)
+    data += encode_field(7, payload_type)
+    if payload:
+        data += encode_field(8, payload)
+    return data
+
+
+def decode_response(payload, encoding='gzip'):
+    if encoding == 'gzip':
+        payload = gzip.decompress(payload)
+    fields = parse_fields(payload)
+    messages = []
+    for raw in fields.get(1, []):
+        message = parse_fields(raw)
+        messages.append({
+            "method": _text(message, 1),
+            "payload": _first(message, 2, b''),
+            "msg_id": _first(message, 3, 0)
+        })
+    return {
+        "messages": messages,
+        "cursor": _text(fields, 2),
+        "internal_ext": _text(fields, 5),
+        "need_ack": bool(_first(fields, 9, 0))
+    }
+
+
+def decode_chat_message(payload):
+    """WebcastChatMessage -> {"user": 昵称, "content": 评论内容}"""
+    fields = parse_fields(payload)
+    user = parse_fields(_first(fields, 2, b''))
+    return {
+        "user": _text(user, 3) or "匿名观众",
+        "content": _text(fields, 3)
+    }
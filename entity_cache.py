@@ -0,0 +1,192 @@
+"""按user_id缓存用户/设置等很少变化的数据，避免热路径上每条评论查询一次数据库
+
+缓存的是与ORM会话无关的快照（__slots__对象），可安全地交给后台线程使用。
+多worker部署时通过Redis发布失效消息，其余worker收到后丢弃本地副本；
+未配置Redis时各worker仅依靠TTL收敛。
+"""
+import json
+import time
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+
+class Snapshot:
+    """ORM对象的只读快照，FIELDS为要复制的列名"""
+
+    FIELDS = ()
+    __slots__ = ()
+
+    @classmethod
+    def from_model(cls, model):
+        snapshot = cls.__new__(cls)
+        for name in cls.FIELDS:
+            object.__setattr__(snapshot, name, getattr(model, name))
+        return snapshot
+
+    def __setattr__(self, name, value):
+        raise AttributeError("快照只读")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{n}={getattr(self, n)!r}' for n in self.FIELDS)})"
+
+
+class SettingSnapshot(Snapshot):
+    FIELDS = ('id', 'user_id', 'live_url', 'prompt', 'voice_style', 'monitor_interval',
+              'ai_mode', 'speech_speed', 'volume', 'replies_per_minute', 'created_at', 'updated_at')
+    __slots__ = FIELDS
+
+
+class UserSnapshot(Snapshot):
+    FIELDS = ('id', 'username', 'is_admin', 'created_at')
+    __slots__ = FIELDS
+
+
+_MISSING = object()
+
+
+class EntityCache:
+    """TTL + LRU缓存
+
+    - loader(key): 未命中时加载，返回None表示不存在（同样缓存，避免反复查询已删除的用户）
+    - ttl: 有效期（秒），也是未收到失效消息时各worker间不一致的最长时间
+
+    加载在锁外进行；加载期间同一key被写穿或失效时，丢弃加载到的旧值
+    """
+
+    def __init__(self, name, loader, ttl=60, max_size=10000, bus=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_size = max_size
+        self.bus = bus
+        self._entries = OrderedDict()  # {key: (value, expires_at)}
+        self._loading = {}             # {key: 进行中的加载数}
+        self._generations = {}         # {key: 加载期间的写穿/失效次数}，只记录加载中的key
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "stale_loads": 0}
+        if bus:
+            bus.register(self)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+            generation = self._generations.get(key, 0)
+            self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            value = self.loader(key)
+        finally:
+            with self._lock:
+                stale = self._generations.get(key, 0) != generation
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+                    self._generations.pop(key, None)
+        with self._lock:
+            if not stale:
+                self._store(key, value)
+                return value
+            # 加载期间被写穿时返回新值；被失效时不缓存，本次仍返回加载结果
+            self._stats["stale_loads"] += 1
+            entry = self._entries.get(key, _MISSING)
+            return entry[0] if entry is not _MISSING else value
+
+    def set(self, key, value, broadcast=True):
+        """写穿：更新本地副本，并通知其他worker丢弃旧值"""
+        with self._lock:
+            self._bump(key)
+            self._store(key, value)
+        if broadcast and self.bus:
+            self.bus.publish(self.name, key)
+
+    def invalidate(self, key, broadcast=True):
+        self.discard(key)
+        if broadcast and self.bus:
+            self.bus.publish(self.name, key)
+
+    def discard(self, key):
+        with self._lock:
+            self._bump(key)
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            for key in self._loading:
+                self._bump(key)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = len(self._entries)
+        total = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / total, 4) if total else 0.0
+        return data
+
+    def _bump(self, key):
+        """写穿或失效时使进行中的加载作废（需持有锁）"""
+        if key in self._loading:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _store(self, key, value):
+        """写入本地副本（需持有锁）"""
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (value, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class RedisInvalidationBus:
+    """基于Redis发布订阅的缓存失效广播"""
+
+    def __init__(self, url, channel='douyin_ai:cache_invalidation'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("缓存失效广播需要安装redis: pip install redis")
+        self._redis = redis.Redis.from_url(url)
+        self._channel = channel
+        self._caches = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, cache):
+        with self._lock:
+            self._caches[cache.name] = cache
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='cache_invalidation', daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _origin():
+        # 忽略本进程发出的消息，保留写穿后的本地副本（fork后取值）
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def publish(self, name, key):
+        self._redis.publish(self._channel, json.dumps({"cache": name, "key": key, "origin": self._origin()}))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    if data.get('origin') == self._origin():
+                        continue
+                    cache = self._caches.get(data.get('cache'))
+                    if cache:
+                        cache.discard(data.get('key'))
+            except Exception:
+                # 连接中断期间的失效消息会丢失，由TTL兜底
+                time.sleep(1)
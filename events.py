@@ -0,0 +1,104 @@
+"""Socket.IO事件处理（处理函数注册在socketio扩展对象上，导入本模块即生效）"""
+import time
+import calendar
+from flask import session, current_app
+from flask_socketio import emit, join_room, leave_room
+import services
+from extensions import socketio
+from models import Comment, Reply
+from analysis_executor import AnalysisExecutor
+from services import (
+    log, room_name, quota_exceeded, faq_match, dispatch_comment,
+    CONNECTED_SOCKETS, COMMENTS_TOTAL, RATE_LIMITED_TOTAL, QUOTA_EXCEEDED_TOTAL, STAGE_SECONDS
+)
+
+def recent_history(user_id, limit):
+    """最近的评论与回复（时间正序）；本进程缓冲为空时（如重启或其他worker）从数据库读取"""
+    records = [record.to_dict() for record in services.comment_history.recent(user_id, limit)]
+    if records or not current_app.config['HISTORY_PERSIST']:
+        return records
+    
+    rows = [
+        (row.created_at, {"kind": "comment", "user": row.viewer, "content": row.content})
+        for row in Comment.query.filter_by(user_id=user_id).order_by(Comment.id.desc()).limit(limit)
+    ] + [
+        (row.created_at, {"kind": "reply", "user": "AI助手", "content": row.content, "reply_to": row.reply_to})
+        for row in Reply.query.filter_by(user_id=user_id).order_by(Reply.id.desc()).limit(limit)
+    ]
+    rows.sort(key=lambda item: item[0])
+    for created_at, record in rows[-limit:]:
+        # 数据库存UTC时间，展示为本地时间
+        record["timestamp"] = time.strftime("%H:%M:%S", time.localtime(calendar.timegm(created_at.timetuple())))
+        records.append(record)
+    return records
+
+@socketio.on('connect')
+def handle_connect():
+    if 'user_id' not in session:
+        emit('system_msg', {"msg": "请先登录", "type": "error"})
+        return False
+    
+    user_id = session['user_id']
+    room = room_name(user_id)
+    join_room(room)
+    CONNECTED_SOCKETS.inc()
+    emit('system_msg', {
+        "msg": "已连接到直播间", 
+        "time": time.strftime("%H:%M:%S"),
+        "type": "info"
+    })
+    if current_app.config['HISTORY_REPLAY_ON_CONNECT']:
+        records = recent_history(user_id, current_app.config['HISTORY_REPLAY_LIMIT'])
+        if records:
+            emit('history', {"records": records})
+    log(f"用户{user_id}的客户端连接到WebSocket", "debug")
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    if 'user_id' in session:
+        user_id = session['user_id']
+        leave_room(room_name(user_id))
+        CONNECTED_SOCKETS.dec()
+        log(f"用户{user_id}的客户端断开连接", "debug")
+
+@socketio.on('analyze_comment')
+def handle_analyze(comment):
+    try:
+        user_id = session['user_id']
+        room = room_name(user_id)
+        COMMENTS_TOTAL.inc()
+        if services.COMMENT_RATE:
+            allowed, _ = services.rate_limiter.allow(f"comment:{user_id}", services.COMMENT_RATE)
+            if not allowed:
+                RATE_LIMITED_TOTAL.inc('comment')
+                emit('system_msg', {"msg": "评论提交过于频繁，已忽略", "type": "warning"})
+                return
+        if quota_exceeded(user_id, 'llm_tokens') and faq_match(user_id, comment.get('content')) is None:
+            QUOTA_EXCEEDED_TOTAL.inc('llm_tokens')
+            emit('system_msg', {"msg": "今日AI回复额度已用完", "type": "warning"})
+            return
+        with STAGE_SECONDS.time('settings'):
+            setting = services.setting_cache.get(user_id)
+        
+        if not setting:
+            emit('ai_reply', {"error": "未找到系统设置"}, room=room)
+            return
+        
+        if current_app.config['COMMENT_PRIORITY_ENABLED']:
+            result = services.comment_prioritizer.push(
+                user_id, comment, 
+                budget=setting.replies_per_minute or 0, 
+                context=(setting, room)
+            )
+            if result == 'duplicate':
+                log(f"用户{user_id}的直播间跳过近期已回答的问题: {comment.get('content')}", "debug")
+                emit('system_msg', {"msg": f"相同的问题刚刚已回答，已跳过: {comment.get('content')}", "type": "info"})
+            return
+        
+        status = dispatch_comment(user_id, comment, setting, room)
+        if status == AnalysisExecutor.REJECTED:
+            emit('system_msg', {"msg": "评论处理繁忙，请稍后再试", "type": "warning"})
+    
+    except Exception as e:
+        log(f"处理评论分析失败: {str(e)}", "error")
+        emit('system_msg', {"msg": "处理评论失败", "type": "error"})
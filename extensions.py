@@ -0,0 +1,13 @@
+"""Flask扩展实例：模块导入时只创建对象，由create_app绑定应用（此时才创建数据库引擎与Socket.IO服务）"""
+from flask_sqlalchemy import SQLAlchemy
+from flask_socketio import SocketIO
+
+db = SQLAlchemy()
+socketio = SocketIO()
+
+
+def init_migrate(app):
+    """注册数据库迁移（flask db命令）；alembic导入较慢，只在命令行中加载"""
+    from flask_migrate import Migrate
+    # SQLite不支持ALTER TABLE修改约束，迁移以重建表的批处理方式生成
+    Migrate(app, db, render_as_batch=app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'))
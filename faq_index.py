@@ -0,0 +1,175 @@
+"""主播常见问题库的内存检索：按用户维护字符n-gram倒排索引
+
+评论与问题的匹配分取 Dice系数 与 问题覆盖率（问题的n-gram被评论包含的比例）的平均值，
+"发货地在哪里呀" 能匹配 "发货地在哪"，而只共享一两个字的评论得分很低。
+索引在首次查询时从数据库加载，编辑时按条目增量更新；多worker部署时通过失效广播让其他worker重新加载，
+未配置广播时按ttl过期后重新加载。
+"""
+import time
+import heapq
+import threading
+from collections import OrderedDict
+
+from reply_cache import normalize_text, char_ngrams
+
+
+class FaqEntry:
+    __slots__ = ('id', 'question', 'answer', 'grams')
+
+    def __init__(self, id, question, answer, grams):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.grams = grams
+
+
+class _UserIndex:
+    __slots__ = ('entries', 'postings', 'loaded_at')
+
+    def __init__(self, loaded_at):
+        self.entries = {}   # {faq_id: FaqEntry}
+        self.postings = {}  # {gram: set(faq_id)}
+        self.loaded_at = loaded_at
+
+
+class FaqIndex:
+    """按user_id缓存的问题库索引
+
+    - loader(user_id): 返回该用户全部问题 [(id, question, answer)]
+    - threshold: 直接使用预设答案的最低匹配分
+    - max_users: 内存中保留索引的用户数，超出时淘汰最久未查询的用户
+    - ttl: 索引有效期（秒），也是未收到失效消息时各worker间不一致的最长时间；0为不过期
+    - bus: 失效广播（与EntityCache共用），注册名为name
+    """
+
+    def __init__(self, loader, threshold=0.7, ngram=2, max_users=1000, ttl=60, bus=None, name='faq'):
+        self.loader = loader
+        self.threshold = threshold
+        self.ngram = ngram
+        self.max_users = max_users
+        self.ttl = ttl
+        self.bus = bus
+        self.name = name
+        self._users = OrderedDict()
+        self._versions = {}  # {user_id: 修改次数}，加载期间发生修改时不缓存加载结果
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "matches": 0, "loads": 0}
+        if bus:
+            bus.register(self)
+
+    def search(self, user_id, text, limit=3, min_score=0.0):
+        """按匹配分从高到低返回 [(score, FaqEntry)]"""
+        grams = char_ngrams(normalize_text(text), self.ngram)
+        if not grams:
+            return []
+        index = self._index(user_id)
+        with self._lock:
+            self._stats["lookups"] += 1
+            overlap = {}
+            for gram in grams:
+                for faq_id in index.postings.get(gram, ()):
+                    overlap[faq_id] = overlap.get(faq_id, 0) + 1
+            scored = []
+            for faq_id, shared in overlap.items():
+                entry = index.entries[faq_id]
+                score = (2.0 * shared / (len(grams) + len(entry.grams)) + shared / len(entry.grams)) / 2
+                if score >= min_score:
+                    scored.append((score, entry))
+        return heapq.nlargest(limit, scored, key=lambda item: item[0])
+
+    def match(self, user_id, text):
+        """匹配分达到阈值的最佳问题，没有时返回None"""
+        best = self.search(user_id, text, limit=1, min_score=self.threshold)
+        if not best:
+            return None
+        with self._lock:
+            self._stats["matches"] += 1
+        return best[0][1]
+
+    def upsert(self, user_id, faq_id, question, answer, broadcast=True):
+        """新增或修改一条问题，只更新该条目的倒排记录"""
+        with self._lock:
+            self._bump(user_id)
+            index = self._users.get(user_id)
+            if index is not None:
+                self._remove_entry(index, faq_id)
+                self._add_entry(index, faq_id, question, answer)
+        if broadcast and self.bus:
+            self.bus.publish(self.name, user_id)
+
+    def remove(self, user_id, faq_id, broadcast=True):
+        with self._lock:
+            self._bump(user_id)
+            index = self._users.get(user_id)
+            if index is not None:
+                self._remove_entry(index, faq_id)
+        if broadcast and self.bus:
+            self.bus.publish(self.name, user_id)
+
+    def invalidate(self, user_id, broadcast=True):
+        self.discard(user_id)
+        if broadcast and self.bus:
+            self.bus.publish(self.name, user_id)
+
+    def discard(self, user_id):
+        """丢弃该用户的索引，下次查询时重新加载（收到其他worker的失效消息时调用）"""
+        with self._lock:
+            self._bump(user_id)
+            self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["users"] = len(self._users)
+            data["entries"] = sum(len(index.entries) for index in self._users.values())
+        return data
+
+    def _index(self, user_id):
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None and not self._expired(index):
+                self._users.move_to_end(user_id)
+                return index
+            version = self._versions.get(user_id, 0)
+        index = _UserIndex(time.monotonic())
+        rows = self.loader(user_id)
+        for faq_id, question, answer in rows:
+            self._add_entry(index, faq_id, question, answer)
+        with self._lock:
+            self._stats["loads"] += 1
+            # 加载期间其他线程可能已经放入，以已有的为准；期间有修改时本次结果可能过时，只用于本次查询
+            existing = self._users.get(user_id)
+            if existing is not None and not self._expired(existing):
+                return existing
+            if self._versions.get(user_id, 0) != version:
+                return index
+            self._users[user_id] = index
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return index
+
+    def _expired(self, index):
+        return self.ttl > 0 and time.monotonic() - index.loaded_at > self.ttl
+
+    def _bump(self, user_id):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def _add_entry(self, index, faq_id, question, answer):
+        grams = char_ngrams(normalize_text(question), self.ngram)
+        if not grams:
+            return
+        index.entries[faq_id] = FaqEntry(faq_id, question, answer, grams)
+        for gram in grams:
+            index.postings.setdefault(gram, set()).add(faq_id)
+
+    def _remove_entry(self, index, faq_id):
+        entry = index.entries.pop(faq_id, None)
+        if entry is None:
+            return
+        for gram in entry.grams:
+            bucket = index.postings.get(gram)
+            if bucket:
+                bucket.discard(faq_id)
+                if not bucket:
+                    del index.postings[gram]
@@ -0,0 +1,120 @@
+"""第三方API共用的HTTP客户端：进程内共享连接池（keep-alive），失败按指数退避+抖动重试
+
+可重试的情况：连接错误、超时、429 及 5xx；429/503 带 Retry-After 时按服务端要求等待。
+"""
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def parse_retry_after(value):
+    """解析Retry-After（秒数或HTTP日期），返回等待秒数，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, retry_after=None):
+    """第attempt次重试前的等待秒数：full jitter指数退避，服务端指定Retry-After时取较大值"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap * 4))
+    return delay
+
+
+class HttpClient:
+    """requests.Session的封装
+
+    - pool_size: 每个主机保持的连接数
+    - max_retries: 默认重试次数（不含首次请求），单次调用可通过retries覆盖
+    - on_retry(method, url, attempt, error, delay): 每次重试前回调，用于记录日志
+    """
+
+    def __init__(self, pool_size=20, max_retries=2, backoff=0.5, backoff_max=8.0, on_retry=None):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.on_retry = on_retry
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    @property
+    def session(self):
+        # fork后的子进程不能复用父进程的连接，按pid重建
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._create_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, url, retries=None, **kwargs):
+        """发送请求，返回状态码正常的响应；重试耗尽时抛出最后一次的异常"""
+        import requests
+
+        retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            self._count("requests")
+            retry_after = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code in RETRY_STATUSES and attempt < retries:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    response.close()
+                    error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+                else:
+                    response.raise_for_status()
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    self._count("failures")
+                    raise
+                error = e
+            except requests.HTTPError:
+                self._count("failures")
+                raise
+
+            delay = backoff_delay(attempt, self.backoff, self.backoff_max, retry_after)
+            attempt += 1
+            self._count("retries")
+            if self.on_retry:
+                self.on_retry(method, url, attempt, error, delay)
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
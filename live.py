@@ -0,0 +1,185 @@
+"""主播端页面：控制台、设置、问题库与直播间控制"""
+import re
+from flask import (
+    Blueprint, render_template, request, jsonify, session, redirect, url_for,
+    current_app, abort, send_from_directory
+)
+import services
+from extensions import db
+from models import Setting, Comment, Reply, Faq
+from entity_cache import SettingSnapshot
+from audio_store import AudioStore
+from auth import login_required
+from services import log, start_comment_collection, close_comment_source, prewarm_faq_audio
+
+bp = Blueprint('live', __name__)
+
+@bp.route('/')
+def index():
+    return redirect(url_for('live.dashboard') if 'user_id' in session else url_for('auth.login'))
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    user_id = session['user_id']
+    setting = services.setting_cache.get(user_id)
+    return render_template('dashboard.html', setting=setting)
+
+@bp.route('/settings', methods=['GET', 'POST'])
+@login_required
+def settings():
+    user_id = session['user_id']
+    
+    if request.method == 'POST':
+        setting = Setting.query.filter_by(user_id=user_id).first()
+        try:
+            setting.live_url = request.form.get('live_url')
+            setting.prompt = request.form.get('ai_prompt')
+            setting.voice_style = request.form.get('voice_style')
+            setting.monitor_interval = int(request.form.get('monitor_interval', 5))
+            setting.ai_mode = request.form.get('ai_mode')
+            setting.speech_speed = int(request.form.get('speech_speed', 5))
+            setting.volume = int(request.form.get('volume', 5))
+            setting.replies_per_minute = int(request.form.get('replies_per_minute') or 0)
+            db.session.commit()
+            services.setting_cache.set(user_id, SettingSnapshot.from_model(setting))
+            
+            services.live_rooms.update(user_id, interval=setting.monitor_interval)
+            services.comment_scheduler.reschedule(user_id, setting.monitor_interval)
+            
+            log(f"用户{user_id}更新了系统设置")
+            return jsonify({"status": "success", "msg": "设置已更新"})
+        except Exception as e:
+            db.session.rollback()
+            log(f"用户{user_id}更新设置失败: {str(e)}", "error")
+            return jsonify({"status": "error", "msg": "更新失败，请重试"}), 500
+    
+    faqs = Faq.query.filter_by(user_id=user_id).order_by(Faq.id).all()
+    return render_template('settings.html', setting=services.setting_cache.get(user_id), faqs=faqs)
+
+@bp.route('/faq', methods=['POST', 'DELETE'])
+@login_required
+def faq():
+    user_id = session['user_id']
+    if services.faq_index is None:
+        return jsonify({"status": "error", "msg": "问题库未启用"})
+    
+    if request.method == 'DELETE':
+        # 问题库索引按整数id索引，前端传来的字符串需先转换
+        try:
+            faq_id = int(request.json.get('faq_id'))
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "msg": "无效的问题"}), 400
+        try:
+            Faq.query.filter_by(id=faq_id, user_id=user_id).delete()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log(f"用户{user_id}删除常见问题失败: {str(e)}", "error")
+            return jsonify({"status": "error", "msg": "操作失败"}), 500
+        services.faq_index.remove(user_id, faq_id)
+        return jsonify({"status": "success"})
+    
+    faq_id = request.form.get('faq_id', type=int)
+    question = (request.form.get('question') or '').strip()
+    answer = (request.form.get('answer') or '').strip()
+    if not question or not answer:
+        return jsonify({"status": "error", "msg": "问题和答案不能为空"})
+    try:
+        if faq_id:
+            item = Faq.query.filter_by(id=faq_id, user_id=user_id).first()
+            if not item:
+                return jsonify({"status": "error", "msg": "问题不存在"})
+        else:
+            if Faq.query.filter_by(user_id=user_id).count() >= current_app.config['FAQ_MAX_ENTRIES']:
+                return jsonify({"status": "error", "msg": f"最多添加{current_app.config['FAQ_MAX_ENTRIES']}个问题"})
+            item = Faq(user_id=user_id)
+            db.session.add(item)
+        item.question = question
+        item.answer = answer
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log(f"用户{user_id}保存常见问题失败: {str(e)}", "error")
+        return jsonify({"status": "error", "msg": "保存失败，请重试"}), 500
+    
+    services.faq_index.upsert(user_id, item.id, question, answer)
+    prewarm_faq_audio(user_id, answer)
+    log(f"用户{user_id}{'修改' if faq_id else '添加'}了常见问题: {question}", "debug")
+    return jsonify({"status": "success", "faq": {"id": item.id, "question": question, "answer": answer}})
+
+@bp.route('/live/start')
+@login_required
+def start_live():
+    user_id = session['user_id']
+    try:
+        room = start_comment_collection(user_id)
+        log(f"用户{user_id}启动了直播间: {room}")
+        return jsonify({
+            "status": "success", 
+            "msg": "直播间已启动",
+            "room": room
+        })
+    except Exception as e:
+        log(f"用户{user_id}启动直播间失败: {str(e)}", "error")
+        return jsonify({"status": "error", "msg": "启动失败，请重试"}), 500
+
+@bp.route('/live/stop')
+@login_required
+def stop_live():
+    user_id = session['user_id']
+    services.live_rooms.update(user_id, active=False)
+    services.comment_scheduler.cancel(user_id)
+    close_comment_source(user_id)
+    log(f"用户{user_id}停止了直播间")
+    return jsonify({"status": "success", "msg": "直播间已停止"})
+
+@bp.route('/live/history')
+@login_required
+def live_history():
+    """分页查询评论/回复历史（游标为上一页最后一条记录的id，按id倒序）"""
+    user_id = session['user_id']
+    model = Reply if request.args.get('type') == 'reply' else Comment
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    # 先写入本进程积压的记录，保证刚推送的内容可查
+    services.comment_history.flush()
+    query = model.query.filter_by(user_id=user_id)
+    if before:
+        query = query.filter(model.id < before)
+    rows = query.order_by(model.id.desc()).limit(limit).all()
+    
+    records = []
+    for row in rows:
+        record = {
+            "id": row.id,
+            "content": row.content,
+            "created_at": row.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if model is Comment:
+            record["user"] = row.viewer
+        else:
+            record.update(question=row.question, reply_to=row.reply_to)
+        records.append(record)
+    return jsonify({
+        "status": "success",
+        "records": records,
+        "next_cursor": rows[-1].id if len(rows) == limit else None
+    })
+
+@bp.route('/audio/<key>.mp3')
+@login_required
+def audio_file(key):
+    """输出缓存的语音文件（内容寻址，可长期缓存）"""
+    if not services.audio_store or not re.fullmatch(r'[0-9a-f]{32}', key):
+        abort(404)
+    response = send_from_directory(
+        services.audio_store.directory,
+        key + AudioStore.SUFFIX,
+        mimetype='audio/mpeg',
+        conditional=True
+    )
+    max_age = current_app.config['AUDIO_CACHE_MAX_AGE']
+    response.headers['Cache-Control'] = f"private, max-age={max_age}, immutable"
+    return response
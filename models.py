@@ -0,0 +1,77 @@
+"""数据库模型"""
+from datetime import datetime
+
+from extensions import db
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(50), unique=True, nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)  # scrypt哈希约160字符
+    is_admin = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    setting = db.relationship('Setting', backref='user', uselist=False, cascade="all, delete-orphan")
+    api_keys = db.relationship('APIKey', backref='user', lazy=True, cascade="all, delete-orphan")
+
+class APIKey(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(50), unique=True, nullable=False)
+    is_used = db.Column(db.Boolean, default=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    used_at = db.Column(db.DateTime)
+    
+    # 卡密管理页按状态筛选并按时间倒序分页
+    __table_args__ = (db.Index('ix_api_key_is_used_created_at', 'is_used', 'created_at'),)
+
+class Setting(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    live_url = db.Column(db.String(200))
+    prompt = db.Column(db.Text, default="你是专业直播助手，简洁回复观众问题")
+    voice_style = db.Column(db.String(50), default="知性女声")
+    monitor_interval = db.Column(db.Integer, default=5)
+    ai_mode = db.Column(db.String(20), default="normal")
+    speech_speed = db.Column(db.Integer, default=5)
+    volume = db.Column(db.Integer, default=5)
+    replies_per_minute = db.Column(db.Integer, default=0)  # 每分钟最多回复条数，0为不限
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 每个用户一份设置；唯一约束同时作为按user_id查询的索引
+    __table_args__ = (db.UniqueConstraint('user_id', name='uq_setting_user_id'),)
+
+class Comment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    viewer = db.Column(db.String(100))
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Reply(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    question = db.Column(db.Text)
+    reply_to = db.Column(db.String(200))
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Usage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    llm_tokens = db.Column(db.Integer, default=0, nullable=False)
+    tts_chars = db.Column(db.Integer, default=0, nullable=False)
+    requests = db.Column(db.Integer, default=0, nullable=False)  # LLM请求次数
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', name='uq_usage_user_day'),)
+
+class Faq(db.Model):
+    """主播预设的常见问题与答案，评论匹配到时直接回复，不调用LLM"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    question = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
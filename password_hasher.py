@@ -0,0 +1,124 @@
+"""密码哈希：scrypt/PBKDF2是CPU密集计算，放到有界的线程池或进程池中执行
+
+gevent模式下请求在greenlet中处理，直接计算哈希会阻塞同一worker上的所有连接（每次几十到几百毫秒）。
+线程池使用原生线程（已打猴子补丁时用gevent.threadpool），hashlib计算期间释放GIL；
+进程池以spawn方式启动子进程，不继承父进程的事件循环。等待结果时只挂起当前greenlet。
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    """排队等待计算的哈希已达上限"""
+
+
+class PasswordHasher:
+    """有界的密码哈希执行器
+
+    - method: werkzeug哈希方法，工作因子写在方法中，如 scrypt:32768:8:1、pbkdf2:sha256:600000
+    - pool: thread 线程池 | process 进程池 | inline 在调用方直接计算（测试用）
+    - workers: 同时计算的哈希数
+    - queue_size: 排队上限，超出时抛出HasherBusy
+    """
+
+    POOLS = ('thread', 'process', 'inline')
+
+    def __init__(self, method='scrypt:32768:8:1', pool='thread', workers=2, queue_size=32, name='password_hash'):
+        if pool not in self.POOLS:
+            raise ValueError(f"未知的密码哈希执行方式: {pool}")
+        self.method = method
+        self.pool = pool
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self.name = name
+        self._prefix = None
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._stats = {"hashed": 0, "verified": 0, "upgraded": 0, "rejected": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+    def hash(self, password):
+        with self._lock:
+            self._stats["hashed"] += 1
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        with self._lock:
+            self._stats["verified"] += 1
+        return self._run(check_password_hash, stored, password)
+
+    def needs_upgrade(self, stored):
+        """存储的哈希与当前配置的算法或工作因子不同（方法前缀按werkzeug规范化后比较）"""
+        return stored.split('$', 1)[0] != self.prefix()
+
+    def upgrade(self, stored, password):
+        """需要升级时返回按当前配置重新计算的哈希，否则返回None（在密码校验通过后调用）"""
+        if not self.needs_upgrade(stored):
+            return None
+        with self._lock:
+            self._stats["upgraded"] += 1
+        return self.hash(password)
+
+    def prefix(self):
+        # 方法可以省略参数（如 pbkdf2），由werkzeug补全默认值；首次使用时计算一次
+        if self._prefix is None:
+            self._prefix = self._run(generate_password_hash, '', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data["seconds"] = round(data["seconds"], 3)
+        data["max_seconds"] = round(data["max_seconds"], 3)
+        data["pool"] = self.pool
+        data["method"] = self._prefix or self.method
+        return data
+
+    def _run(self, fn, *args):
+        if self.pool == 'inline':
+            return self._timed(fn, *args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HasherBusy()
+        try:
+            started = time.perf_counter()
+            result = self._get_executor().submit(fn, *args).result()
+            self._record(time.perf_counter() - started)
+            return result
+        finally:
+            self._slots.release()
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self._record(time.perf_counter() - started)
+        return result
+
+    def _record(self, elapsed):
+        with self._lock:
+            self._stats["seconds"] += elapsed
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], elapsed)
+
+    def _get_executor(self):
+        # 首次使用时创建，避免在gunicorn fork之前启动线程或子进程
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            return self._executor
+
+    def _create_executor(self):
+        if self.pool == 'process':
+            import multiprocessing
+            return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            from gevent import monkey
+        except ImportError:
+            monkey = None
+        if monkey is not None and monkey.is_module_patched('threading'):
+            # 打补丁后threading创建的是greenlet，计算哈希仍会阻塞事件循环
+            from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+            return NativeThreadPoolExecutor(self.workers)
+        return ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
@@ -0,0 +1,149 @@
+"""提示词预编译：按 (提示词, 模式, 附加指令) 缓存拼好的系统消息，并按token预算裁剪
+
+系统消息与其token估算只在首次使用时计算；修改设置后提示词内容变化，自然落到新的缓存条目，
+旧条目按LRU淘汰。评论与直播间上下文在每次请求时按预算截断，回复长度由各模式的max_tokens限制。
+"""
+import math
+import threading
+from collections import OrderedDict
+
+ELLIPSIS = "……"
+
+
+def estimate_tokens(text):
+    """粗略估算token数：中日韩文字约0.6 token/字，其余约4个字符1 token"""
+    if not text:
+        return 0
+    wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return math.ceil(wide * 0.6 + (len(text) - wide) / 4)
+
+
+def truncate_tokens(text, budget, keep_tail=False):
+    """截断到约budget个token；keep_tail为True时保留开头与结尾、省略中间（提示词的要求常写在末尾）"""
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return text
+    if budget <= 0:
+        return ""
+    keep = max(1, int(len(text) * budget / tokens) - len(ELLIPSIS))
+    if keep_tail:
+        head = keep * 2 // 3
+        return text[:head] + ELLIPSIS + text[len(text) - (keep - head):]
+    return text[:keep] + ELLIPSIS
+
+
+def parse_max_tokens(text):
+    """解析 "normal:120,professional:300" 格式的各模式回复上限"""
+    limits = {}
+    for part in (text or '').split(','):
+        mode, _, value = part.partition(':')
+        if mode.strip() and value.strip().isdigit():
+            limits[mode.strip()] = int(value)
+    return limits
+
+
+class CompiledPrompt:
+    __slots__ = ('system', 'tokens', 'max_tokens', 'truncated')
+
+    def __init__(self, system, tokens, max_tokens, truncated):
+        self.system = system
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        self.truncated = truncated
+
+
+class PromptCompiler:
+    """系统消息缓存与请求消息组装
+
+    - modes: {ai_mode: 模式补充要求}，未知模式使用default_mode
+    - max_tokens: {ai_mode: 回复token上限}，未配置的模式使用default_max_tokens
+    - prompt_budget / comment_budget / context_budget: 系统提示词、单条评论、历史问答上下文的token预算
+    - knowledge_budget: 参考资料（主播问题库中相近的问答）的token预算
+    """
+
+    def __init__(self, modes, max_tokens=None, default_mode="请用简洁语言回复", default_max_tokens=150,
+                 prompt_budget=600, comment_budget=120, context_budget=300, knowledge_budget=300, max_size=256):
+        self.modes = modes
+        self.max_tokens = max_tokens or {}
+        self.default_mode = default_mode
+        self.default_max_tokens = default_max_tokens
+        self.prompt_budget = prompt_budget
+        self.comment_budget = comment_budget
+        self.context_budget = context_budget
+        self.knowledge_budget = knowledge_budget
+        self.max_size = max_size
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "truncated_prompts": 0, "truncated_comments": 0}
+
+    def compile(self, prompt, ai_mode, instruction=None):
+        """instruction为附加指令（如批量回答的输出格式），不参与截断"""
+        key = (prompt, ai_mode, instruction)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                self._stats["hits"] += 1
+                return compiled
+            self._stats["misses"] += 1
+
+        mode_text = self.modes.get(ai_mode, self.default_mode)
+        fixed = f"\n补充要求：{mode_text}" + (f"\n{instruction}" if instruction else "")
+        body = (prompt or "").strip()
+        budget = max(0, self.prompt_budget - estimate_tokens(fixed))
+        truncated = truncate_tokens(body, budget, keep_tail=True)
+        system = truncated + fixed
+        compiled = CompiledPrompt(
+            system,
+            estimate_tokens(system),
+            self.max_tokens.get(ai_mode, self.default_max_tokens),
+            truncated != body
+        )
+        with self._lock:
+            if compiled.truncated:
+                self._stats["truncated_prompts"] += 1
+            self._compiled[key] = compiled
+            while len(self._compiled) > self.max_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def messages(self, compiled, comment, context=None, comment_budget=None, knowledge=None):
+        """组装chat messages：系统消息 + 参考资料 + 预算内最近的问答上下文 + 截断后的评论
+
+        context为 [(问题, 回答)]，按时间正序，超出预算时丢弃最早的轮次；
+        knowledge为 [(问题, 答案)]，按相关度从高到低，超出预算时丢弃靠后的条目
+        """
+        budget = self.comment_budget if comment_budget is None else comment_budget
+        content = truncate_tokens(comment or "", budget)
+        if content != comment:
+            with self._lock:
+                self._stats["truncated_comments"] += 1
+
+        history = []
+        remaining = self.context_budget
+        for question, answer in reversed(context or ()):
+            cost = estimate_tokens(question) + estimate_tokens(answer)
+            if cost > remaining:
+                break
+            history[:0] = [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+            remaining -= cost
+
+        messages = [{"role": "system", "content": compiled.system}]
+        references = []
+        remaining = self.knowledge_budget
+        for question, answer in knowledge or ():
+            item = f"问：{question}\n答：{answer}"
+            cost = estimate_tokens(item)
+            if cost > remaining:
+                break
+            references.append(item)
+            remaining -= cost
+        if references:
+            messages.append({"role": "system", "content": "主播提供的参考资料（相关时据此回答）：\n" + "\n".join(references)})
+        return messages + history + [{"role": "user", "content": content}]
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = len(self._compiled)
+        return data
@@ -0,0 +1,135 @@
+"""令牌桶限流：进程内存 / Redis 两种后端，多worker部署时用Redis共享配额
+
+每个key一个桶，容量为burst，每秒补充rate个令牌；请求消耗cost个令牌，不足时拒绝并给出需等待的秒数。
+限流规则写作 "次数/周期"，如 "5/s"、"60/m"、"20/10s"，桶容量默认等于次数（允许一个周期内的突发）。
+"""
+import re
+import time
+import threading
+from collections import OrderedDict
+
+_RULE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class RateRule:
+    __slots__ = ('rate', 'burst', 'text')
+
+    def __init__(self, rate, burst, text=''):
+        self.rate = rate    # 每秒补充的令牌数
+        self.burst = burst  # 桶容量
+        self.text = text
+
+    def __repr__(self):
+        return f"RateRule({self.text!r})"
+
+
+def parse_rule(text):
+    """解析限流规则，为空或"0"时返回None（不限流）"""
+    if not text or text.strip() in ('0', 'none'):
+        return None
+    match = _RULE.match(text)
+    if not match:
+        raise ValueError(f"无效的限流规则: {text}（格式如 5/s、60/m、20/10s）")
+    count, multiple, unit = match.groups()
+    period = int(multiple or 1) * _PERIODS[unit]
+    return RateRule(int(count) / period, int(count), text.strip())
+
+
+class MemoryRateLimiter:
+    """单进程内存令牌桶（开发环境/单worker部署）"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # {key: [令牌数, 上次更新时间]}，按最近访问排序
+        self._lock = threading.Lock()
+
+    def allow(self, key, rule, cost=1, consume=True):
+        """返回 (是否放行, 需等待秒数)；consume为False时只检查令牌是否足够，不扣减"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [rule.burst, now]
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(rule.burst, bucket[0] + (now - bucket[1]) * rule.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost if consume else tokens
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (cost - tokens) / rule.rate
+
+    def _prune(self, now):
+        # 从最久未访问的桶开始清理：一小时未访问的全部删除（通常早已补满，删除等价于重新开始），
+        # 仍不够时逐个淘汰最旧的桶，活跃key的配额不受影响
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated <= 3600 and len(self._buckets) < self.max_keys:
+                break
+            self._buckets.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "keys": len(self._buckets)}
+
+
+# 读取-补充-扣减在Redis内原子执行；桶在补满所需时间后自动过期
+_REDIS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local consume = tonumber(ARGV[5])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    if consume == 1 then
+        tokens = tokens - cost
+    end
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimiter:
+    """Redis令牌桶，所有worker共享同一个桶"""
+
+    def __init__(self, url, prefix='douyin_ai:ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("使用Redis限流需要安装redis: pip install redis")
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_SCRIPT)
+        self._prefix = prefix
+
+    def allow(self, key, rule, cost=1, consume=True):
+        allowed, tokens = self._script(
+            keys=[self._prefix + key],
+            args=[rule.rate, rule.burst, cost, time.time(), 1 if consume else 0]
+        )
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rule.rate
+
+    def stats(self):
+        return {"backend": "redis"}
+
+
+def create_rate_limiter(url):
+    """根据URL创建限流后端：memory:// | redis://host:6379/0"""
+    if not url or url.startswith('memory://'):
+        return MemoryRateLimiter()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisRateLimiter(url)
+    raise ValueError(f"不支持的限流存储: {url}")
@@ -0,0 +1,172 @@
+"""AI回复缓存：按（提示词, 回复模式, 问题库参考资料）分区，支持TTL过期、LRU淘汰与近似问题匹配"""
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# 归一化时剔除的字符：空白、标点、表情等非文字字符
+_STRIP_PATTERN = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize_text(text):
+    """评论文本归一化：全半角统一、小写、去除空白与标点"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return _STRIP_PATTERN.sub('', text).replace('_', '')
+
+
+def char_ngrams(text, n=2):
+    """字符n-gram集合（文本短于n时返回整体）"""
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def ngram_similarity(a, b):
+    """Dice系数：2|A∩B| / (|A|+|B|)"""
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+class _Entry:
+    __slots__ = ('namespace', 'text', 'grams', 'reply', 'latency', 'expires_at')
+
+    def __init__(self, namespace, text, grams, reply, latency, expires_at):
+        self.namespace = namespace
+        self.text = text
+        self.grams = grams
+        self.reply = reply
+        self.latency = latency
+        self.expires_at = expires_at
+
+
+class ReplyCache:
+    """线程安全的AI回复缓存
+
+    - max_size: 最大条目数，超出后淘汰最久未使用的条目
+    - ttl: 条目存活秒数
+    - similarity: 近似匹配阈值（0-1），>=1 时只做精确匹配
+    - ngram: 近似匹配使用的字符n-gram长度
+    """
+
+    def __init__(self, max_size=1024, ttl=1800, similarity=0.85, ngram=2):
+        self.max_size = max(0, int(max_size))
+        self.ttl = ttl
+        self.similarity = similarity
+        self.ngram = max(1, int(ngram))
+        self._entries = OrderedDict()  # {(namespace, text): _Entry}
+        self._index = {}               # {(namespace, gram): set((namespace, text))}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "near_hits": 0, "misses": 0,
+            "stores": 0, "evictions": 0, "expired": 0,
+            "saved_seconds": 0.0
+        }
+
+    @staticmethod
+    def namespace(prompt, ai_mode, user_id=None, knowledge=None):
+        """提示词与回复模式共同决定回复内容，作为缓存分区
+
+        回复参考了主播问题库（knowledge为[(问题, 答案)]）时再按用户与条目内容分区：
+        其他主播不会命中，问题库编辑或删除后参考资料变化，旧回复也不再命中
+        """
+        raw = f"{prompt or ''}\x00{ai_mode or ''}"
+        if knowledge:
+            refs = "\x00".join(f"{question}\x01{answer}" for question, answer in knowledge)
+            raw += f"\x00{user_id}\x00{refs}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @property
+    def near_match_enabled(self):
+        return 0 < self.similarity < 1
+
+    def get(self, comment, prompt, ai_mode, user_id=None, knowledge=None):
+        """查找缓存的回复，未命中返回None"""
+        if not self.max_size:
+            return None
+        ns = self.namespace(prompt, ai_mode, user_id, knowledge)
+        text = normalize_text(comment)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((ns, text))
+            if entry and entry.expires_at <= now:
+                self._remove((ns, text))
+                self._stats["expired"] += 1
+                entry = None
+            if entry:
+                self._stats["hits"] += 1
+            elif self.near_match_enabled:
+                entry = self._near_match(ns, char_ngrams(text, self.ngram), now)
+                if entry:
+                    self._stats["near_hits"] += 1
+            if not entry:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end((entry.namespace, entry.text))
+            self._stats["saved_seconds"] += entry.latency
+            return entry.reply
+
+    def put(self, comment, prompt, ai_mode, reply, latency=0.0, user_id=None, knowledge=None):
+        """写入回复；latency为本次LLM调用耗时，用于统计命中节省的时间"""
+        if not self.max_size or not reply:
+            return
+        ns = self.namespace(prompt, ai_mode, user_id, knowledge)
+        text = normalize_text(comment)
+        if not text:
+            return
+        key = (ns, text)
+        grams = char_ngrams(text, self.ngram)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(ns, text, grams, reply, latency, time.time() + self.ttl)
+            for gram in grams:
+                self._index.setdefault((ns, gram), set()).add(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def stats(self):
+        """命中统计：hit_ratio 含近似命中"""
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = len(self._entries)
+        lookups = data["hits"] + data["near_hits"] + data["misses"]
+        data["hit_ratio"] = round((data["hits"] + data["near_hits"]) / lookups, 4) if lookups else 0.0
+        data["saved_seconds"] = round(data["saved_seconds"], 3)
+        return data
+
+    def _near_match(self, ns, grams, now):
+        """通过n-gram倒排索引取候选，再按相似度择优（需持有锁）"""
+        candidates = set()
+        for gram in grams:
+            candidates |= self._index.get((ns, gram), set())
+        best, best_score = None, self.similarity
+        for key in candidates:
+            entry = self._entries[key]
+            if entry.expires_at <= now:
+                continue
+            score = ngram_similarity(grams, entry.grams)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def _remove(self, key):
+        """删除条目并清理倒排索引（需持有锁）"""
+        entry = self._entries.pop(key, None)
+        if not entry:
+            return
+        for gram in entry.grams:
+            bucket = self._index.get((entry.namespace, gram))
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._index[(entry.namespace, gram)]
@@ -0,0 +1,173 @@
+"""直播间状态存储：进程内存 / Redis / SQLite 三种后端，多worker部署时共享房间状态
+
+房间状态为可JSON序列化的dict，例如:
+    {"active": True, "room": "room_1", "interval": 5, "owner": "host:1234", "lease_until": 1700000000.0}
+
+owner为负责采集的worker，由其定时续期lease_until（心跳）；worker退出后租约过期，
+其他worker通过条件更新（update的when参数）接管，同一时刻只有一个worker能接管成功。
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import closing
+
+
+def worker_id():
+    """当前worker标识（fork后取值），用于确定由哪个进程负责直播间的评论采集"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemoryRoomStore:
+    """单进程内存存储（开发环境/单worker部署）"""
+
+    shared = False  # 状态是否在worker间共享（共享时才需要接管其他worker的直播间）
+
+    def __init__(self):
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            state = self._rooms.get(user_id)
+            return dict(state) if state else None
+
+    def save(self, user_id, state):
+        with self._lock:
+            self._rooms[user_id] = dict(state, updated_at=time.time())
+
+    def update(self, user_id, when=None, **fields):
+        """合并更新已存在的房间状态，房间不存在或when(当前状态)为假时不更新并返回None"""
+        with self._lock:
+            state = self._rooms.get(user_id)
+            if state is None or (when and not when(state)):
+                return None
+            state.update(fields, updated_at=time.time())
+            return dict(state)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._rooms.pop(user_id, None)
+
+    def items(self):
+        with self._lock:
+            return [(user_id, dict(state)) for user_id, state in self._rooms.items()]
+
+
+class RedisRoomStore:
+    """Redis哈希存储，适用于多worker/多节点部署"""
+
+    shared = True
+
+    def __init__(self, url, key='douyin_ai:rooms'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("使用Redis房间状态需要安装redis: pip install redis")
+        self._redis = redis.Redis.from_url(url)
+        self._key = key
+
+    def get(self, user_id):
+        raw = self._redis.hget(self._key, user_id)
+        return json.loads(raw) if raw else None
+
+    def save(self, user_id, state):
+        self._redis.hset(self._key, user_id, json.dumps(dict(state, updated_at=time.time())))
+
+    def update(self, user_id, when=None, **fields):
+        result = {}
+
+        def merge(pipe):
+            raw = pipe.hget(self._key, user_id)
+            state = json.loads(raw) if raw else None
+            if state is None or (when and not when(state)):
+                result['state'] = None
+                return
+            state.update(fields, updated_at=time.time())
+            pipe.multi()
+            pipe.hset(self._key, user_id, json.dumps(state))
+            result['state'] = state
+
+        self._redis.transaction(merge, self._key)
+        return result['state']
+
+    def delete(self, user_id):
+        self._redis.hdel(self._key, user_id)
+
+    def items(self):
+        return [(int(user_id), json.loads(raw)) for user_id, raw in self._redis.hgetall(self._key).items()]
+
+
+class SQLiteRoomStore:
+    """SQLite文件存储（依赖文件锁），用于单机多worker的本地测试"""
+
+    shared = True
+
+    def __init__(self, path):
+        self._path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS live_rooms ("
+                "user_id INTEGER PRIMARY KEY, state TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        # 自动提交模式，读改写操作显式使用 BEGIN IMMEDIATE 加写锁
+        return closing(sqlite3.connect(self._path, timeout=10, isolation_level=None))
+
+    def get(self, user_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM live_rooms WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, user_id, state):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO live_rooms (user_id, state) VALUES (?, ?)",
+                (user_id, json.dumps(dict(state, updated_at=time.time())))
+            )
+
+    def update(self, user_id, when=None, **fields):
+        with self._connect() as conn:
+            return self._update(conn, user_id, when, fields)
+
+    def _update(self, conn, user_id, when, fields):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT state FROM live_rooms WHERE user_id = ?", (user_id,)).fetchone()
+            state = json.loads(row[0]) if row else None
+            if state is None or (when and not when(state)):
+                conn.execute("ROLLBACK")
+                return None
+            state.update(fields, updated_at=time.time())
+            conn.execute("UPDATE live_rooms SET state = ? WHERE user_id = ?", (json.dumps(state), user_id))
+            conn.execute("COMMIT")
+            return state
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, user_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM live_rooms WHERE user_id = ?", (user_id,))
+
+    def items(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT user_id, state FROM live_rooms").fetchall()
+        return [(user_id, json.loads(state)) for user_id, state in rows]
+
+
+def create_room_store(url):
+    """根据URL创建存储：memory:// | redis://host:6379/0 | sqlite:///path/rooms.db"""
+    if not url or url.startswith('memory://'):
+        return MemoryRoomStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisRoomStore(url)
+    if url.startswith('sqlite://'):
+        # 与SQLAlchemy一致：sqlite:///相对路径，sqlite:////绝对路径
+        return SQLiteRoomStore(url[len('sqlite:///'):])
+    raise ValueError(f"不支持的房间状态存储: {url}")
@@ -0,0 +1,1230 @@
+"""业务服务：缓存、线程池、评论采集调度、第三方API与回复推送
+
+依赖配置的组件在init_app中创建并绑定到模块全局变量（导入本模块不连接Redis、不启动线程）。
+蓝图与事件处理中通过 services.<组件名> 访问组件，不要在导入时 from services import 组件，
+否则拿到的是创建前的None。后台线程绑定唯一的应用，每个进程只创建一个应用。
+"""
+import re
+import logging
+import atexit
+import json
+import math
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime, date
+from urllib.parse import urlparse
+from flask import request, jsonify, session, g, current_app, has_request_context
+from sqlalchemy.exc import IntegrityError
+from extensions import db, socketio
+from models import User, Setting, Comment, Reply, Usage, Faq
+from http_client import HttpClient
+from rate_limit import create_rate_limiter, parse_rule
+from password_hasher import PasswordHasher
+from usage_meter import UsageMeter, FIELDS as USAGE_FIELDS
+from prompt_compiler import PromptCompiler, parse_max_tokens, estimate_tokens
+from metrics import Registry
+from db_profile import apply_sqlite_pragmas, QueryTimer
+from emit_batcher import EmitBatcher
+from entity_cache import EntityCache, RedisInvalidationBus, SettingSnapshot, UserSnapshot
+from async_logging import setup_logging
+from reply_cache import ReplyCache, normalize_text
+from faq_index import FaqIndex
+from audio_store import AudioStore, audio_key
+from analysis_executor import AnalysisExecutor
+from room_state import create_room_store, worker_id
+from comment_scheduler import CommentScheduler
+from comment_batcher import CommentBatcher
+from comment_priority import CommentPrioritizer, parse_rules
+from comment_history import CommentHistory
+from comment_sources import (
+    DemoCommentSource, ReplayCommentSource, DouyinLiveSource, parse_speed
+)
+
+# 由init_app绑定
+app = None
+logger = log_listener = None
+live_rooms = cache_bus = setting_cache = user_cache = None
+faq_index = reply_cache = audio_store = analysis_executor = comment_history = None
+emit_batcher = query_timer = None
+rate_limiter = COMMENT_RATE = HTTP_RATE = LOGIN_FAIL_RATE = LOGIN_FAIL_IP_RATE = None
+password_hasher = None
+usage_cache = usage_meter = None
+comment_scheduler = room_lease_scheduler = http_client = prompt_compiler = None
+comment_prioritizer = comment_batcher = None
+
+# ------------------------------
+# 全局状态与工具函数
+# ------------------------------
+
+def room_name(user_id):
+    """用户直播间对应的Socket.IO房间名"""
+    state = live_rooms.get(user_id)
+    return state['room'] if state else f"room_{user_id}"
+
+# 用户与设置很少变化，缓存快照避免每条评论查询一次数据库
+def load_setting(user_id):
+    setting = Setting.query.filter_by(user_id=user_id).first()
+    return SettingSnapshot.from_model(setting) if setting else None
+
+def load_user(user_id):
+    user = db.session.get(User, user_id)
+    return UserSnapshot.from_model(user) if user else None
+
+
+def load_faqs(user_id):
+    with app.app_context():
+        return db.session.execute(
+            db.select(Faq.id, Faq.question, Faq.answer).where(Faq.user_id == user_id)
+        ).all()
+
+
+def _analysis_error(e):
+    log(f"评论分析任务异常: {str(e)}", "error")
+
+
+def write_history(records):
+    """批量写入评论/回复历史（executemany，每批一次提交）"""
+    comments, replies = [], []
+    for record in records:
+        created_at = datetime.utcfromtimestamp(record.created_at)
+        if record.kind == 'comment':
+            comments.append({
+                "user_id": record.user_id,
+                "viewer": record.user,
+                "content": record.content,
+                "created_at": created_at
+            })
+        else:
+            replies.append({
+                "user_id": record.user_id,
+                "question": record.question,
+                "reply_to": record.reply_to,
+                "content": record.content,
+                "created_at": created_at
+            })
+    with app.app_context():
+        # 直播中途被删除的用户，其记录违反外键约束，跳过以免整批写入失败
+        user_ids = {row["user_id"] for row in comments + replies}
+        valid_users = set(db.session.scalars(db.select(User.id).where(User.id.in_(user_ids))))
+        comments = [row for row in comments if row["user_id"] in valid_users]
+        replies = [row for row in replies if row["user_id"] in valid_users]
+        if comments:
+            db.session.execute(db.insert(Comment), comments)
+        if replies:
+            db.session.execute(db.insert(Reply), replies)
+        db.session.commit()
+
+def _history_error(e):
+    log(f"评论历史写入失败: {str(e)}", "error")
+
+
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR
+}
+
+def log(message, level="info"):
+    """统一日志输出"""
+    logger.log(LOG_LEVELS.get(level, logging.INFO), message)
+
+# ------------------------------
+# 运行指标（/metrics）
+# ------------------------------
+metrics = Registry()
+STAGE_SECONDS = metrics.histogram(
+    'douyin_ai_stage_seconds', 
+    "评论处理各阶段耗时（settings 读取设置 / llm 非流式调用 / llm_stream 流式调用 / "
+    "llm_first_token 流式首段 / tts 语音合成 / emit 推送回复 / queue_wait 线程池排队）",
+    labels=('stage',)
+)
+COMMENTS_TOTAL = metrics.counter('douyin_ai_comments_total', "收到的待分析评论数")
+REPLIES_TOTAL = metrics.counter('douyin_ai_replies_total', "推送的AI回复数")
+FAQ_ANSWERS_TOTAL = metrics.counter('douyin_ai_faq_answers_total', "命中问题库、直接使用预设答案的回复数")
+FALLBACKS_TOTAL = metrics.counter(
+    'douyin_ai_fallbacks_total', "降级次数（llm 固定话术回复 / tts 文字回复text_fallback）", labels=('kind',)
+)
+HTTP_RETRIES_TOTAL = metrics.counter('douyin_ai_http_retries_total', "第三方API重试次数", labels=('host',))
+RATE_LIMITED_TOTAL = metrics.counter('douyin_ai_rate_limited_total', "被限流拒绝的请求数（http / comment / login）", labels=('scope',))
+QUOTA_EXCEEDED_TOTAL = metrics.counter(
+    'douyin_ai_quota_exceeded_total', "超出每日额度的次数（llm_tokens 拒绝评论 / tts_chars 改为文字回复）", labels=('kind',)
+)
+CONNECTED_SOCKETS = metrics.gauge('douyin_ai_connected_sockets', "本进程的Socket.IO连接数")
+metrics.gauge('douyin_ai_threads', "本进程线程数", threading.active_count)
+metrics.gauge(
+    'douyin_ai_live_rooms', "运行中的直播间数（共享状态存储，租约未过期）",
+    lambda: sum(1 for _, state in live_rooms.items() if state.get('active') and not lease_expired(state))
+)
+metrics.gauge('douyin_ai_analysis_queue_depth', "评论分析线程池排队任务数", lambda: analysis_executor.stats()["queue_depth"])
+metrics.gauge('douyin_ai_analysis_running', "评论分析线程池执行中任务数", lambda: analysis_executor.stats()["running"])
+SQL_QUERIES = metrics.histogram(
+    'douyin_ai_request_sql_queries', "每个HTTP请求执行的SQL条数", labels=('endpoint',),
+    buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+SQL_SECONDS = metrics.histogram('douyin_ai_request_sql_seconds', "每个HTTP请求的SQL总耗时", labels=('endpoint',))
+EMIT_BATCH_SIZE = metrics.histogram(
+    'douyin_ai_emit_batch_size', "每帧Socket.IO推送合并的事件数（_count为帧数，_sum为事件数）",
+    buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+
+# ------------------------------
+# Socket.IO推送合并
+# ------------------------------
+def _emit_error(e):
+    log(f"Socket.IO推送失败: {str(e)}", "error")
+
+
+def room_emit(event, data, room):
+    """推送到房间：可合并的事件进入emit_batcher，其余立即推送"""
+    if not emit_batcher.emit(room, event, data):
+        socketio.emit(event, data, room=room)
+
+# ------------------------------
+# 数据库连接调优与SQL计时
+# ------------------------------
+def request_sql_counters():
+    """当前请求的SQL计数 [条数, 秒数]；后台线程中的查询不计入请求"""
+    if not has_request_context():
+        return None
+    counters = g.get('sql_counters')
+    if counters is None:
+        counters = g.sql_counters = [0, 0.0]
+    return counters
+
+def _slow_query(statement, seconds):
+    log(f"慢查询（{seconds * 1000:.0f}ms）: {' '.join(statement.split())[:500]}", "warning")
+
+
+# ------------------------------
+# 限流与每日额度
+# ------------------------------
+RATE_LIMIT_EXEMPT = {'static', 'live.audio_file', 'admin.metrics_endpoint'}
+
+QUOTA_LIMITS = {'llm_tokens': 'DAILY_LLM_TOKENS', 'tts_chars': 'DAILY_TTS_CHARS'}
+
+def login_fail_buckets(username, ip):
+    """登录失败计数的令牌桶：按用户名防止针对单个账号的猜测，按IP防止换用户名撞库"""
+    buckets = []
+    if LOGIN_FAIL_RATE:
+        buckets.append((f"login:user:{username}", LOGIN_FAIL_RATE))
+    if LOGIN_FAIL_IP_RATE:
+        buckets.append((f"login:ip:{ip}", LOGIN_FAIL_IP_RATE))
+    return buckets
+
+def login_throttled(username, ip):
+    """失败次数已达上限时返回需等待的秒数，否则返回0（只检查不扣减，在计算密码哈希之前调用）"""
+    retry_after = 0
+    for key, rule in login_fail_buckets(username, ip):
+        allowed, wait = rate_limiter.allow(key, rule, consume=False)
+        if not allowed:
+            retry_after = max(retry_after, wait)
+    return retry_after
+
+def record_login_failure(username, ip):
+    for key, rule in login_fail_buckets(username, ip):
+        rate_limiter.allow(key, rule)
+
+def write_usage(deltas):
+    """用量增量写入usage表：已有行executemany累加，新行批量插入；其他worker并发插入同一行时整批重试"""
+    with app.app_context():
+        for attempt in range(2):
+            try:
+                _write_usage(deltas)
+                db.session.commit()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+
+def _write_usage(deltas):
+    user_ids = {user_id for user_id, _ in deltas}
+    days = {day for _, day in deltas}
+    existing = set(db.session.execute(
+        db.select(Usage.user_id, Usage.day).where(Usage.user_id.in_(user_ids), Usage.day.in_(days))
+    ).all())
+    valid_users = set(db.session.scalars(db.select(User.id).where(User.id.in_(user_ids))))
+    
+    updates, inserts = [], []
+    for (user_id, day), delta in deltas.items():
+        if (user_id, day) in existing:
+            updates.append({"b_user_id": user_id, "b_day": day, "d_llm_tokens": delta['llm_tokens'],
+                            "d_tts_chars": delta['tts_chars'], "d_requests": delta['requests']})
+        elif user_id in valid_users:
+            inserts.append(dict(delta, user_id=user_id, day=day))
+    if updates:
+        table = Usage.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.user_id == db.bindparam('b_user_id'), table.c.day == db.bindparam('b_day'))
+            .values(
+                llm_tokens=table.c.llm_tokens + db.bindparam('d_llm_tokens'),
+                tts_chars=table.c.tts_chars + db.bindparam('d_tts_chars'),
+                requests=table.c.requests + db.bindparam('d_requests')
+            ),
+            updates
+        )
+    if inserts:
+        db.session.execute(db.insert(Usage), inserts)
+
+def load_usage(user_id):
+    row = Usage.query.filter_by(user_id=user_id, day=date.today()).first()
+    return {field: getattr(row, field) if row else 0 for field in USAGE_FIELDS}
+
+def _usage_flushed(user_ids):
+    for user_id in user_ids:
+        usage_cache.discard(user_id)
+
+def _usage_error(e):
+    log(f"用量写入失败（稍后重试）: {str(e)}", "error")
+
+
+def usage_today(user_id):
+    persisted = usage_cache.get(user_id)
+    pending = usage_meter.pending(user_id)
+    return {field: persisted[field] + pending[field] for field in USAGE_FIELDS}
+
+def quota_exceeded(user_id, field):
+    """当日用量是否达到上限（多worker间存在一个写入间隔内的误差）"""
+    limit = app.config[QUOTA_LIMITS[field]]
+    return bool(limit and user_id) and usage_today(user_id)[field] >= limit
+
+def meter_usage(**counts):
+    """记入当前分析任务所属用户的用量（answer_comment等在应用上下文的g中设置usage_user）"""
+    usage_meter.record(g.get('usage_user'), **counts)
+
+# ------------------------------
+# 抖音评论采集
+# ------------------------------
+comment_sources = {}  # 本进程负责采集的直播间评论来源 {user_id: CommentSource}
+sources_lock = threading.Lock()
+
+def create_comment_source(user_id, setting):
+    """按配置创建评论来源"""
+    kind = app.config['COMMENT_SOURCE']
+    if kind == 'replay':
+        return ReplayCommentSource(
+            app.config['COMMENT_REPLAY_FILE'],
+            speed=parse_speed(app.config['COMMENT_REPLAY_SPEED']),
+            loop=app.config['COMMENT_REPLAY_LOOP']
+        )
+    if kind == 'douyin':
+        if setting and setting.live_url:
+            def on_error(e):
+                log(f"用户{user_id}的抖音弹幕连接异常: {str(e)}", "error")
+            
+            return DouyinLiveSource(
+                setting.live_url,
+                app.config['DOUYIN_WS_URL'],
+                record_path=app.config['COMMENT_RECORD_FILE'],
+                on_error=on_error
+            )
+        log(f"用户{user_id}未设置直播间链接，使用模拟评论", "warning")
+    return DemoCommentSource()
+
+def close_comment_source(user_id):
+    with sources_lock:
+        source = comment_sources.pop(user_id, None)
+    if source:
+        source.close()
+    comment_history.discard(user_id)
+
+def comment_tick(user_id):
+    """调度器到期回调：推送当前可用的评论并返回下次间隔，直播间停止时返回None移出调度"""
+    with app.app_context():
+        state = live_rooms.get(user_id)
+        source = comment_sources.get(user_id)
+        # 已停止或被其他worker接管（重新启动）的直播间不再由本进程采集
+        if (not state or not state.get('active') 
+                or state.get('owner') != worker_id() or source is None):
+            close_comment_source(user_id)
+            log(f"用户{user_id}的直播间移出评论调度", "debug")
+            return None
+        
+        comments = source.fetch(app.config['COMMENT_BATCH_MAX'])
+        for comment in comments:
+            room_emit('new_comment', comment, state['room'])
+            comment_history.record(user_id, 'comment', comment)
+        if comments:
+            log(f"用户{user_id}的直播间推送{len(comments)}条评论: {comments[-1]['content']}", "debug")
+        if source.exhausted:
+            close_comment_source(user_id)
+            log(f"用户{user_id}的评论来源已结束")
+            return None
+        delay = source.next_delay(state.get('interval', 5))
+        renew_lease(user_id, state, delay)
+        return delay
+
+def _comment_tick_error(user_id, e):
+    log(f"用户{user_id}的评论采集错误: {str(e)}", "error")
+
+def lease_expired(state, now=None):
+    return state.get('lease_until', 0) < (now or time.time())
+
+def renew_lease(user_id, state, delay):
+    """心跳：租约需覆盖到下次采集之后；剩余时间充足时不写共享存储"""
+    now = time.time()
+    ttl = app.config['ROOM_LEASE_TTL']
+    if state.get('lease_until', 0) - now > delay + ttl / 2:
+        return
+    owner = worker_id()
+    live_rooms.update(
+        user_id,
+        when=lambda current: current.get('active') and current.get('owner') == owner,
+        lease_until=now + delay + ttl
+    )
+
+def claim_orphan_rooms(_key):
+    """接管租约已过期（负责的worker已退出）的直播间，返回下次检查间隔"""
+    now = time.time()
+    owner = worker_id()
+    for user_id, state in live_rooms.items():
+        if not state.get('active') or not lease_expired(state, now):
+            continue
+        # 条件更新保证多个worker同时检查时只有一个接管成功
+        claimed = live_rooms.update(
+            user_id,
+            when=lambda current: current.get('active') and lease_expired(current, now),
+            owner=owner,
+            lease_until=now + app.config['ROOM_LEASE_TTL']
+        )
+        if claimed:
+            log(f"用户{user_id}的直播间原负责进程{state.get('owner')}已失联，由本进程接管", "warning")
+            with app.app_context():
+                start_comment_collection(user_id)
+    return app.config['ROOM_LEASE_TTL'] / 2
+
+def _claim_error(_key, e):
+    log(f"接管失联直播间失败: {str(e)}", "error")
+
+
+def start_comment_collection(user_id):
+    room = f"room_{user_id}"
+    setting = setting_cache.get(user_id)
+    interval = setting.monitor_interval if setting else 5
+    
+    source = create_comment_source(user_id, setting)
+    with sources_lock:
+        previous = comment_sources.get(user_id)
+        comment_sources[user_id] = source
+    if previous:
+        previous.close()
+    
+    # 由当前worker负责采集（包括接管租约过期的直播间），其他worker上的旧调度检测到owner变化后自行移除
+    live_rooms.save(user_id, {
+        'active': True,
+        'room': room,
+        'interval': interval,
+        'owner': worker_id(),
+        'lease_until': time.time() + interval + app.config['ROOM_LEASE_TTL']
+    })
+    comment_scheduler.schedule(user_id, interval)
+    log(f"用户{user_id}的直播间加入评论调度")
+    return room
+
+# ------------------------------
+# 第三方服务集成
+# ------------------------------
+def _http_retry(method, url, attempt, error, delay):
+    HTTP_RETRIES_TOTAL.inc(urlparse(url).netloc)
+    log(f"{method} {url} 请求失败（第{attempt}次重试，{delay:.2f}秒后）: {str(error)}", "warning")
+
+
+MODE_PROMPTS = {
+    "normal": "请用简洁明了的语言回复观众问题",
+    "professional": "请用专业术语详细解答，突出产品优势",
+    "friendly": "请用亲切口语化的方式回复，拉近与观众距离"
+}
+
+
+def deepseek_payload(comment, prompt, ai_mode, stream=False, context=None, instruction=None, answers=1, knowledge=None):
+    """构造DeepSeek chat-completions请求体；answers为一次请求回答的问题数（按比例放宽评论与回复预算）"""
+    compiled = prompt_compiler.compile(prompt, ai_mode, instruction)
+    data = {
+        "model": current_app.config['DEEPSEEK_MODEL'],
+        "messages": prompt_compiler.messages(
+            compiled, comment, context, 
+            comment_budget=prompt_compiler.comment_budget * answers,
+            knowledge=knowledge
+        ),
+        "max_tokens": compiled.max_tokens * answers,
+        "timeout": current_app.config['AI_REPLY_TIMEOUT']
+    }
+    if stream:
+        data["stream"] = True
+        data["stream_options"] = {"include_usage": True}  # 最后一段附带token用量
+    return data
+
+def message_tokens(data, reply):
+    return sum(estimate_tokens(m["content"]) for m in data["messages"]) + estimate_tokens(reply)
+
+def fallback_reply(comment):
+    return f"抱歉，暂时无法回复关于'{comment}'的问题，请稍后再试~"
+
+def deepseek_headers():
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {current_app.config['DEEPSEEK_API_KEY']}"
+    }
+
+def deepseek_complete(data):
+    """发送chat-completions请求（失败重试），返回回复文本；重试耗尽时抛出最后一次的异常"""
+    try:
+        with STAGE_SECONDS.time('llm'):
+            response = http_client.post(
+                current_app.config['DEEPSEEK_API_URL'], 
+                json=data, 
+                headers=deepseek_headers(),
+                timeout=current_app.config['AI_REPLY_TIMEOUT'] + 2
+            )
+            result = response.json()
+        content = result["choices"][0]["message"]["content"]
+    except Exception as e:
+        log(f"DeepSeek API调用失败: {str(e)}", "error")
+        raise
+    # 接口未返回usage时按字符估算
+    tokens = (result.get("usage") or {}).get("total_tokens") or message_tokens(data, content)
+    meter_usage(llm_tokens=tokens, requests=1)
+    return content
+
+def deepseek_analyze(comment, prompt, ai_mode, use_cache=True, context=None, knowledge=None, user_id=None):
+    # 附带直播间上下文的回复只适用于当前对话，不读写缓存
+    if use_cache and not context:
+        cached = reply_cache.get(comment, prompt, ai_mode, user_id, knowledge)
+        if cached is not None:
+            log(f"AI回复缓存命中: {comment}", "debug")
+            return cached
+    
+    started = time.time()
+    try:
+        reply = deepseek_complete(deepseek_payload(comment, prompt, ai_mode, context=context, knowledge=knowledge))
+    except Exception:
+        FALLBACKS_TOTAL.inc('llm')
+        return fallback_reply(comment)
+    if not context:
+        reply_cache.put(comment, prompt, ai_mode, reply, latency=time.time() - started, user_id=user_id, knowledge=knowledge)
+    return reply
+
+BATCH_INSTRUCTION = (
+    "观众同时提出了多个问题，请逐条回答。"
+    "只输出JSON数组，每项格式为{\"id\": 问题编号, \"answer\": \"回答内容\"}"
+)
+
+def parse_batch_answers(content, count):
+    """解析批量回答，返回与问题等长的列表，缺失的回答为None"""
+    match = re.search(r'\[.*\]', content or '', re.S)
+    try:
+        items = json.loads(match.group(0)) if match else []
+    except ValueError:
+        items = []
+    answers = {}
+    for item in items:
+        if isinstance(item, dict) and item.get('answer'):
+            try:
+                answers[int(item.get('id'))] = str(item['answer'])
+            except (TypeError, ValueError):
+                continue
+    return [answers.get(i) for i in range(1, count + 1)]
+
+def deepseek_batch_answer(questions, prompt, ai_mode, knowledge=None):
+    """一次请求回答多个问题；请求失败时所有回答为None"""
+    numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    try:
+        content = deepseek_complete(deepseek_payload(
+            numbered, prompt, ai_mode, instruction=BATCH_INSTRUCTION, answers=len(questions), knowledge=knowledge
+        ))
+    except Exception:
+        return [None] * len(questions)
+    return parse_batch_answers(content, len(questions))
+
+def deepseek_stream(comment, prompt, ai_mode, context=None, knowledge=None):
+    """流式调用DeepSeek（SSE），逐段产出回复文本；仅在收到响应前重试"""
+    started = time.perf_counter()
+    first = True
+    data = deepseek_payload(comment, prompt, ai_mode, stream=True, context=context, knowledge=knowledge)
+    usage = {}
+    parts = []
+    with http_client.post(
+        current_app.config['DEEPSEEK_API_URL'],
+        json=data,
+        headers=deepseek_headers(),
+        stream=True,
+        timeout=current_app.config['AI_REPLY_TIMEOUT'] + 2
+    ) as response:
+        response.encoding = 'utf-8'
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                break
+            chunk = json.loads(payload)
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                if first:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, 'llm_first_token')
+                    first = False
+                parts.append(delta)
+                yield delta
+    STAGE_SECONDS.observe(time.perf_counter() - started, 'llm_stream')
+    meter_usage(llm_tokens=usage.get("total_tokens") or message_tokens(data, "".join(parts)), requests=1)
+
+VOICE_MAPPING = {
+    "知性女声": 0, "甜美女生": 1, "成熟男声": 3,
+    "磁性男声": 4, "可爱童声": 5
+}
+
+_baidu_token = {"value": None, "expires_at": 0}
+_baidu_token_lock = threading.Lock()
+
+def baidu_access_token():
+    """获取并缓存百度access token（提前60秒刷新）"""
+    with _baidu_token_lock:
+        if _baidu_token["value"] and _baidu_token["expires_at"] - 60 > time.time():
+            return _baidu_token["value"]
+        response = http_client.get(
+            current_app.config['BAIDU_TOKEN_URL'],
+            params={
+                "grant_type": "client_credentials",
+                "client_id": current_app.config['BAIDU_API_KEY'],
+                "client_secret": current_app.config['BAIDU_SECRET_KEY']
+            },
+            timeout=5
+        )
+        result = response.json()
+        if "access_token" not in result:
+            raise RuntimeError(f"获取百度access token失败: {result}")
+        _baidu_token["value"] = result["access_token"]
+        _baidu_token["expires_at"] = time.time() + int(result.get("expires_in", 0))
+        return _baidu_token["value"]
+
+def baidu_synthesis(text, options):
+    """调用百度短文本在线合成REST接口，成功返回MP3字节，失败返回错误dict"""
+    data = {
+        "tex": text,
+        "tok": baidu_access_token(),
+        "cuid": current_app.config['BAIDU_APP_ID'] or "douyin-ai-assistant",
+        "ctp": 1,
+        "lan": "zh",
+        "aue": 3
+    }
+    data.update(options)
+    with STAGE_SECONDS.time('tts'):
+        response = http_client.post(
+            current_app.config['BAIDU_TTS_URL'], 
+            data=data, 
+            timeout=current_app.config['AI_REPLY_TIMEOUT']
+        )
+    if response.headers.get('Content-Type', '').startswith('audio'):
+        meter_usage(tts_chars=len(text))
+        return response.content
+    return response.json()
+
+def audio_url(key):
+    return f"/audio/{key}{AudioStore.SUFFIX}"
+
+def deliver_audio(key, data=None):
+    """按AUDIO_TRANSPORT返回要推送的音频：url为短URL（需启用语音缓存），
+    binary/chunked为MP3字节，datauri为base64内联；缓存文件已不存在时返回None"""
+    transport = current_app.config['AUDIO_TRANSPORT']
+    if transport == 'url' and audio_store:
+        return audio_url(key)
+    if data is None:
+        data = audio_store.read(key)
+        if data is None:
+            # 索引按进程维护，文件可能刚被其他worker淘汰
+            log(f"语音缓存文件已被淘汰，重新合成: {key}", "warning")
+            return None
+    if transport in ('binary', 'chunked'):
+        return data
+    import base64
+    return f"data:audio/mp3;base64,{base64.b64encode(data).decode('utf-8')}"
+
+def baidu_tts(text, voice_style, speed=5, volume=5):
+    voice = VOICE_MAPPING.get(voice_style, 0)
+    pitch = 5
+    key = audio_key(text, voice, speed, volume, pitch)
+    if audio_store and audio_store.exists(key):
+        audio = deliver_audio(key)
+        if audio is not None:
+            return audio
+    if quota_exceeded(g.get('usage_user'), 'tts_chars'):
+        QUOTA_EXCEEDED_TOTAL.inc('tts_chars')
+        return {"type": "text", "content": text}
+    
+    try:
+        result = baidu_synthesis(
+            text,
+            {
+                'vol': volume, 
+                'spd': speed, 
+                'pit': pitch, 
+                'per': voice
+            }
+        )
+        
+        if not isinstance(result, dict):
+            if audio_store:
+                audio_store.put(key, result)
+            return deliver_audio(key, result)
+        else:
+            log(f"百度TTS错误: {result}", "error")
+    except Exception as e:
+        log(f"语音合成失败: {str(e)}", "error")
+    
+    FALLBACKS_TOTAL.inc('tts')
+    return {
+        "type": "text",
+        "content": text
+    }
+
+# ------------------------------
+# 流式回复
+# ------------------------------
+SENTENCE_ENDINGS = set("。！？!?；;\n…~")
+
+class SentenceBuffer:
+    """累积流式文本，按句末标点切出完整句子"""
+    
+    def __init__(self, min_length=6):
+        self.min_length = min_length
+        self._buffer = ""
+    
+    def feed(self, delta):
+        """追加文本，返回已完整的句子列表"""
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for i, char in enumerate(self._buffer):
+            if char in SENTENCE_ENDINGS and i + 1 - start >= self.min_length:
+                sentence = self._buffer[start:i + 1].strip()
+                if sentence:
+                    sentences.append(sentence)
+                start = i + 1
+        self._buffer = self._buffer[start:]
+        return sentences
+    
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+def stream_reply(comment, setting, room, context=None, knowledge=None):
+    """流式生成AI回复：逐段推送ai_reply_delta，整句立即送入TTS并按序推送ai_reply_audio
+    
+    返回 (完整回复, reply_id)；首段文本前即失败时回复为None，由调用方回退到普通模式
+    """
+    reply_id = uuid.uuid4().hex[:12]
+    sentences = queue.Queue()
+    app_obj = current_app._get_current_object()
+    
+    def synthesize_in_order():
+        # 单线程顺序合成，保证语音分段按句子顺序到达
+        with app_obj.app_context():
+            g.usage_user = setting.user_id
+            seq = 0
+            while True:
+                sentence = sentences.get()
+                if sentence is None:
+                    break
+                audio = baidu_tts(
+                    sentence,
+                    setting.voice_style,
+                    speed=setting.speech_speed,
+                    volume=setting.volume
+                )
+                payload = {"reply_id": reply_id, "seq": seq, "text": sentence}
+                payload.update(audio_fields(audio, room))
+                socketio.emit('ai_reply_audio', payload, room=room)
+                seq += 1
+    
+    tts_thread = threading.Thread(
+        target=synthesize_in_order, 
+        name=f"tts_stream_{reply_id}", 
+        daemon=True
+    )
+    tts_thread.start()
+    
+    splitter = SentenceBuffer(current_app.config['AI_STREAM_MIN_SENTENCE'])
+    parts = []
+    failed = False
+    started = time.time()
+    try:
+        for delta in deepseek_stream(comment, setting.prompt, setting.ai_mode, context, knowledge):
+            parts.append(delta)
+            socketio.emit('ai_reply_delta', {"reply_id": reply_id, "delta": delta}, room=room)
+            for sentence in splitter.feed(delta):
+                sentences.put(sentence)
+    except Exception as e:
+        failed = True
+        log(f"DeepSeek流式调用失败: {str(e)}", "error")
+    
+    for sentence in splitter.flush():
+        sentences.put(sentence)
+    sentences.put(None)
+    tts_thread.join()
+    
+    if not parts:
+        return None, reply_id
+    reply = "".join(parts)
+    if not failed and not context:
+        reply_cache.put(
+            comment, setting.prompt, setting.ai_mode, reply,
+            latency=time.time() - started, user_id=setting.user_id, knowledge=knowledge
+        )
+    return reply, reply_id
+
+def audio_fields(audio, room):
+    """TTS结果转为推送字段：URL/data URI放入audio_url，MP3字节作为Socket.IO二进制附件；
+    chunked模式下先分块推送audio_chunk事件，回复中只携带audio_id"""
+    fields = {"audio_url": None, "text_fallback": None}
+    if isinstance(audio, dict):
+        fields["text_fallback"] = audio.get('content')
+    elif isinstance(audio, str):
+        fields["audio_url"] = audio
+    elif isinstance(audio, bytes):
+        if current_app.config['AUDIO_TRANSPORT'] == 'chunked':
+            fields["audio_id"] = emit_audio_chunks(room, audio)
+        else:
+            fields["audio"] = audio
+    return fields
+
+def emit_audio_chunks(room, data):
+    audio_id = uuid.uuid4().hex[:12]
+    size = current_app.config['AUDIO_CHUNK_SIZE']
+    total = max(1, (len(data) + size - 1) // size)
+    for seq in range(total):
+        socketio.emit('audio_chunk', {
+            "audio_id": audio_id,
+            "seq": seq,
+            "last": seq == total - 1,
+            "data": data[seq * size:(seq + 1) * size]
+        }, room=room)
+    return audio_id
+
+def emit_ai_reply(user_id, room, content, audio=None, question=None, **extra):
+    """推送AI回复并记入历史；audio为TTS结果（URL、MP3字节或文字回退dict）"""
+    payload = {
+        "user": "AI助手",
+        "content": content,
+        "timestamp": time.strftime("%H:%M:%S")
+    }
+    payload.update(audio_fields(audio, room))
+    payload.update(extra)
+    with STAGE_SECONDS.time('emit'):
+        room_emit('ai_reply', payload, room)
+    REPLIES_TOTAL.inc()
+    comment_history.record(user_id, 'reply', payload, question=question)
+
+# ------------------------------
+# 评论分析
+# ------------------------------
+def room_context(user_id):
+    """直播间最近几轮AI问答（时间正序），作为LLM上下文；AI_CONTEXT_TURNS为0时不附带"""
+    turns = app.config['AI_CONTEXT_TURNS']
+    if not turns:
+        return None
+    # 评论远多于回复，多取一些记录再筛出问答
+    records = comment_history.recent(user_id, turns * 20)
+    pairs = [(record.question, record.content) for record in records if record.kind == 'reply' and record.question]
+    return pairs[-turns:]
+
+def faq_match(user_id, content):
+    """评论匹配到的问题库条目，未启用或未命中时返回None"""
+    if faq_index is None:
+        return None
+    return faq_index.match(user_id, content)
+
+def faq_knowledge(user_id, *questions):
+    """与问题相近的问题库条目 [(问题, 答案)]，作为LLM参考资料"""
+    if faq_index is None or not app.config['FAQ_CONTEXT_TOP_K']:
+        return None
+    entries = {}
+    for question in questions:
+        for _, entry in faq_index.search(
+            user_id, question,
+            limit=app.config['FAQ_CONTEXT_TOP_K'],
+            min_score=app.config['FAQ_CONTEXT_MIN_SCORE']
+        ):
+            entries.setdefault(entry.id, (entry.question, entry.answer))
+    return list(entries.values())
+
+def emit_faq_reply(entry, setting, room, question, **extra):
+    FAQ_ANSWERS_TOTAL.inc()
+    audio = baidu_tts(
+        entry.answer,
+        setting.voice_style,
+        speed=setting.speech_speed,
+        volume=setting.volume
+    )
+    emit_ai_reply(setting.user_id, room, entry.answer, audio, question=question, faq=True, **extra)
+
+def answer_comment(content, setting, room, use_cache=True, **extra):
+    """生成单条评论的AI回复并推送（流式模式下边生成边推送）；命中问题库时直接使用预设答案"""
+    with app.app_context():
+        g.usage_user = setting.user_id
+        entry = faq_match(setting.user_id, content)
+        if entry is not None:
+            emit_faq_reply(entry, setting, room, content, **extra)
+            return
+        context = room_context(setting.user_id)
+        knowledge = faq_knowledge(setting.user_id, content)
+        # 附带上下文时回复依赖本场对话，不使用缓存
+        use_cache = use_cache and not context
+        ai_reply = None
+        if app.config['AI_REPLY_STREAM']:
+            if use_cache:
+                ai_reply = reply_cache.get(content, setting.prompt, setting.ai_mode, setting.user_id, knowledge)
+            if ai_reply is None:
+                streamed, reply_id = stream_reply(content, setting, room, context, knowledge)
+                if streamed is not None:
+                    emit_ai_reply(setting.user_id, room, streamed, question=content, reply_id=reply_id, streamed=True, **extra)
+                    return
+        if ai_reply is None:
+            ai_reply = deepseek_analyze(
+                content, setting.prompt, setting.ai_mode, 
+                use_cache=use_cache and not app.config['AI_REPLY_STREAM'],
+                context=context,
+                knowledge=knowledge,
+                user_id=setting.user_id
+            )
+        audio = baidu_tts(
+            ai_reply, 
+            setting.voice_style,
+            speed=setting.speech_speed,
+            volume=setting.volume
+        )
+        emit_ai_reply(setting.user_id, room, ai_reply, audio, question=content, **extra)
+
+def answer_clusters(clusters, setting, room):
+    """批量回答聚类后的问题：问题库或缓存命中直接回复，其余合并为一次LLM请求"""
+    with app.app_context():
+        g.usage_user = setting.user_id
+        if len(clusters) == 1:
+            cluster = clusters[0]
+            answer_comment(cluster.question, setting, room, reply_to="、".join(cluster.askers))
+            return
+        
+        pending = []
+        knowledge = {}  # {问题: 问题库参考资料}，与单条回答相同，缓存按参考资料分区
+        for cluster in clusters:
+            entry = faq_match(setting.user_id, cluster.question)
+            if entry is not None:
+                emit_faq_reply(entry, setting, room, cluster.question, reply_to="、".join(cluster.askers))
+                continue
+            knowledge[cluster.question] = faq_knowledge(setting.user_id, cluster.question)
+            cached = reply_cache.get(
+                cluster.question, setting.prompt, setting.ai_mode, setting.user_id, knowledge[cluster.question]
+            )
+            if cached is None:
+                pending.append(cluster)
+            else:
+                emit_cluster_reply(cluster, cached, setting, room)
+        
+        if len(pending) == 1:
+            cluster = pending[0]
+            answer_comment(cluster.question, setting, room, use_cache=False, reply_to="、".join(cluster.askers))
+            return
+        if not pending:
+            return
+        
+        questions = [c.question for c in pending]
+        started = time.time()
+        answers = deepseek_batch_answer(
+            questions, setting.prompt, setting.ai_mode, knowledge=faq_knowledge(setting.user_id, *questions)
+        )
+        latency = (time.time() - started) / len(pending)
+        log(f"批量回答{len(pending)}个问题（覆盖{sum(len(c.comments) for c in pending)}条评论）", "debug")
+        for cluster, answer in zip(pending, answers):
+            if answer:
+                reply_cache.put(
+                    cluster.question, setting.prompt, setting.ai_mode, answer,
+                    latency=latency, user_id=setting.user_id, knowledge=knowledge[cluster.question]
+                )
+            else:
+                # 批量结果缺失该问题时单独请求
+                answer = deepseek_analyze(
+                    cluster.question, setting.prompt, setting.ai_mode, use_cache=False,
+                    knowledge=knowledge[cluster.question], user_id=setting.user_id
+                )
+            emit_cluster_reply(cluster, answer, setting, room)
+
+def emit_cluster_reply(cluster, answer, setting, room):
+    audio = baidu_tts(
+        answer, 
+        setting.voice_style,
+        speed=setting.speech_speed,
+        volume=setting.volume
+    )
+    emit_ai_reply(
+        setting.user_id, room, answer, audio, 
+        question=cluster.question, reply_to="、".join(cluster.askers)
+    )
+
+def submit_analysis(user_id, fn, room, key=None):
+    """提交分析任务到线程池，返回提交状态"""
+    def on_drop():
+        socketio.emit('system_msg', {
+            "msg": "评论过多，较早的评论已跳过", 
+            "type": "warning"
+        }, room=room)
+    
+    submitted = time.perf_counter()
+    
+    def task():
+        STAGE_SECONDS.observe(time.perf_counter() - submitted, 'queue_wait')
+        fn()
+    
+    status = analysis_executor.submit(user_id, task, key=key, on_drop=on_drop)
+    if status == AnalysisExecutor.REJECTED:
+        log(f"用户{user_id}的评论分析队列已满，拒绝评论", "warning")
+    return status
+
+def _on_comment_batch(user_id, clusters, context):
+    setting, room = context
+    status = submit_analysis(user_id, lambda: answer_clusters(clusters, setting, room), room)
+    if status == AnalysisExecutor.REJECTED:
+        socketio.emit('system_msg', {"msg": "评论处理繁忙，请稍后再试", "type": "warning"}, room=room)
+
+def dispatch_comment(user_id, comment, setting, room, askers=None):
+    """评论进入分析流程（微批或线程池），返回线程池提交状态"""
+    if app.config['ANALYZE_BATCH_ENABLED']:
+        comment_batcher.add(user_id, comment, context=(setting, room))
+        return AnalysisExecutor.QUEUED
+    
+    content = comment['content']
+    extra = {"reply_to": "、".join(dict.fromkeys(askers))} if askers and len(askers) > 1 else {}
+    return submit_analysis(
+        user_id, 
+        lambda: answer_comment(content, setting, room, **extra), 
+        room,
+        key=normalize_text(content)
+    )
+
+def _on_priority_dispatch(user_id, comment, askers, context):
+    setting, room = context
+    status = dispatch_comment(user_id, comment, setting, room, askers=askers)
+    if status == AnalysisExecutor.REJECTED:
+        socketio.emit('system_msg', {"msg": "评论处理繁忙，请稍后再试", "type": "warning"}, room=room)
+
+def prewarm_faq_audio(user_id, answer):
+    """后台按当前语音设置预先合成答案，直播中命中时直接使用语音缓存"""
+    setting = setting_cache.get(user_id)
+    if audio_store is None or setting is None:
+        return
+    
+    def task():
+        with app.app_context():
+            g.usage_user = user_id
+            baidu_tts(answer, setting.voice_style, speed=setting.speech_speed, volume=setting.volume)
+    
+    analysis_executor.submit(user_id, task)
+
+# ------------------------------
+# 请求钩子
+# ------------------------------
+def limit_http_rate():
+    """HTTP请求令牌桶限流，超出时返回429和Retry-After"""
+    if not HTTP_RATE or request.endpoint in RATE_LIMIT_EXEMPT:
+        return None
+    identity = session.get('user_id') or request.remote_addr
+    allowed, retry_after = rate_limiter.allow(f"http:{identity}", HTTP_RATE)
+    if allowed:
+        return None
+    RATE_LIMITED_TOTAL.inc('http')
+    response = jsonify({"status": "error", "msg": "请求过于频繁，请稍后再试"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def record_sql_counters(response):
+    """记录本次请求的SQL条数与耗时；条数过多时告警（通常是循环内逐条查询）"""
+    counters = g.get('sql_counters')
+    if not counters:
+        return response
+    count, seconds = counters
+    endpoint = request.endpoint or 'unknown'
+    SQL_QUERIES.observe(count, endpoint)
+    SQL_SECONDS.observe(seconds, endpoint)
+    if count >= app.config['SQL_QUERY_WARN_COUNT']:
+        log(f"请求{request.method} {request.path}执行了{count}条SQL（{seconds * 1000:.0f}ms），请检查是否存在N+1查询", "warning")
+    if app.config['SQL_TIMING_HEADER']:
+        response.headers['Server-Timing'] = f'db;desc="{count} queries";dur={seconds * 1000:.1f}'
+    return response
+
+# ------------------------------
+# 初始化
+# ------------------------------
+def init_app(flask_app):
+    """按应用配置创建各组件并注册请求钩子"""
+    global app, logger, log_listener, live_rooms, cache_bus, setting_cache, user_cache
+    global faq_index, reply_cache, audio_store, analysis_executor, comment_history
+    global emit_batcher, query_timer, rate_limiter, COMMENT_RATE, HTTP_RATE, LOGIN_FAIL_RATE, LOGIN_FAIL_IP_RATE
+    global password_hasher, usage_cache, usage_meter
+    global comment_scheduler, room_lease_scheduler, http_client, prompt_compiler, comment_prioritizer, comment_batcher
+    app = flask_app
+    
+    # 日志由后台线程写入文件，调用方不阻塞、不依赖应用上下文
+    logger, log_listener = setup_logging(
+        'douyin_ai',
+        app.config['LOG_FILE'],
+        level=app.config['LOG_LEVEL'],
+        json_format=app.config['LOG_JSON'],
+        console=app.config['DEBUG'],
+        rotate=app.config['LOG_ROTATE'],
+        max_bytes=app.config['LOG_MAX_MB'] * 1024 * 1024,
+        backup_count=app.config['LOG_BACKUP_COUNT'],
+        when=app.config['LOG_ROTATE_WHEN'],
+        queue_size=app.config['LOG_QUEUE_SIZE']
+    )
+
+    # 直播间状态可跨worker共享：{user_id: {active: bool, room: str, interval: int, owner: str}}
+    live_rooms = create_room_store(app.config['ROOM_STATE_URL'])
+
+    cache_bus = RedisInvalidationBus(app.config['CACHE_INVALIDATION_URL']) if app.config['CACHE_INVALIDATION_URL'] else None
+    setting_cache = EntityCache('setting', load_setting, ttl=app.config['SETTINGS_CACHE_TTL'], bus=cache_bus)
+    user_cache = EntityCache('user', load_user, ttl=app.config['SETTINGS_CACHE_TTL'], bus=cache_bus)
+
+    # 主播问题库按用户建立n-gram倒排索引，编辑时增量更新
+    faq_index = FaqIndex(
+        load_faqs,
+        threshold=app.config['FAQ_MATCH_THRESHOLD'],
+        ngram=app.config['FAQ_NGRAM'],
+        ttl=app.config['FAQ_INDEX_TTL'],
+        bus=cache_bus
+    ) if app.config['FAQ_ENABLED'] else None
+
+    # 相同问题在直播间内高频重复，缓存AI回复以减少DeepSeek调用
+    reply_cache = ReplyCache(
+        max_size=app.config['REPLY_CACHE_SIZE'],
+        ttl=app.config['REPLY_CACHE_TTL'],
+        similarity=app.config['REPLY_CACHE_SIMILARITY'],
+        ngram=app.config['REPLY_CACHE_NGRAM']
+    )
+
+    # 合成过的语音按参数哈希落盘，回复只携带短URL
+    audio_store = AudioStore(
+        app.config['AUDIO_CACHE_DIR'],
+        max_bytes=app.config['AUDIO_CACHE_MAX_MB'] * 1024 * 1024
+    ) if app.config['AUDIO_CACHE_ENABLED'] else None
+
+    # 评论分析统一进入有界线程池，避免突发评论创建无限线程
+    analysis_executor = AnalysisExecutor(
+        workers=app.config['ANALYZE_WORKERS'],
+        queue_size=app.config['ANALYZE_QUEUE_SIZE'],
+        per_user_limit=app.config['ANALYZE_USER_INFLIGHT'],
+        overflow=app.config['ANALYZE_OVERFLOW'],
+        on_error=_analysis_error
+    )
+
+    # 最近的评论与回复保存在内存环形缓冲中，后台批量落库
+    comment_history = CommentHistory(
+        max_size=app.config['MAX_COMMENT_HISTORY'],
+        writer=write_history if app.config['HISTORY_PERSIST'] else None,
+        flush_interval=app.config['HISTORY_FLUSH_INTERVAL'],
+        flush_size=app.config['HISTORY_FLUSH_SIZE'],
+        on_error=_history_error
+    )
+    atexit.register(comment_history.flush)
+
+    # 评论与AI回复按房间合并为batch事件，高频直播间每个合并窗口只推送一帧
+    emit_batcher = EmitBatcher(
+        lambda event, data, room: socketio.emit(event, data, room=room),
+        interval=app.config['EMIT_BATCH_INTERVAL_MS'] / 1000,
+        max_size=app.config['EMIT_BATCH_MAX'],
+        events=[event.strip() for event in app.config['EMIT_BATCH_EVENTS'].split(',') if event.strip()],
+        on_flush=EMIT_BATCH_SIZE.observe,
+        on_error=_emit_error
+    )
+    atexit.register(emit_batcher.flush)
+
+    with app.app_context():
+        apply_sqlite_pragmas(
+            db.engine,
+            journal_mode=app.config['SQLITE_JOURNAL_MODE'],
+            busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+            synchronous=app.config['SQLITE_SYNCHRONOUS'],
+            foreign_keys=app.config['SQLITE_FOREIGN_KEYS']
+        )
+        query_timer = QueryTimer(
+            db.engine, 
+            request_sql_counters, 
+            slow_threshold=app.config['SQL_SLOW_QUERY_MS'] / 1000,
+            on_slow=_slow_query
+        )
+
+    # 令牌桶按用户（未登录按IP）计数，多worker部署时配置Redis共享
+    rate_limiter = create_rate_limiter(app.config['RATE_LIMIT_URL'])
+    COMMENT_RATE = parse_rule(app.config['RATE_LIMIT_COMMENT'])
+    HTTP_RATE = parse_rule(app.config['RATE_LIMIT_HTTP'])
+    LOGIN_FAIL_RATE = parse_rule(app.config['LOGIN_FAIL_LIMIT'])
+    LOGIN_FAIL_IP_RATE = parse_rule(app.config['LOGIN_FAIL_IP_LIMIT'])
+
+    # 密码哈希在有界的线程池/进程池中计算，登录高峰时不阻塞同一worker上的WebSocket
+    password_hasher = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        pool=app.config['PASSWORD_HASH_POOL'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        queue_size=app.config['PASSWORD_HASH_QUEUE']
+    )
+
+    # 已落库的当日用量短时缓存，配额检查时再加上本进程未写入的增量
+    usage_cache = EntityCache('usage', load_usage, ttl=app.config['USAGE_FLUSH_INTERVAL'] * 2)
+    usage_meter = UsageMeter(
+        write_usage,
+        flush_interval=app.config['USAGE_FLUSH_INTERVAL'],
+        on_flush=_usage_flushed,
+        on_error=_usage_error
+    )
+    atexit.register(usage_meter.flush)
+
+    # 所有直播间共用一个调度线程，按下次采集时间排序
+    comment_scheduler = CommentScheduler(comment_tick, on_error=_comment_tick_error)
+    # 共享房间状态时定期检查失联worker的直播间并接管
+    room_lease_scheduler = CommentScheduler(claim_orphan_rooms, on_error=_claim_error, name='room_lease')
+    if live_rooms.shared:
+        room_lease_scheduler.schedule('rooms', app.config['ROOM_LEASE_TTL'] / 2, delay=app.config['ROOM_LEASE_TTL'] / 2)
+
+    # DeepSeek与百度共用连接池，保持长连接避免每次请求重新握手
+    http_client = HttpClient(
+        pool_size=app.config['HTTP_POOL_SIZE'],
+        max_retries=app.config['HTTP_MAX_RETRIES'],
+        backoff=app.config['HTTP_BACKOFF'],
+        backoff_max=app.config['HTTP_BACKOFF_MAX'],
+        on_retry=_http_retry
+    )
+
+    # 系统消息按 (提示词, 模式) 预编译缓存，请求内容按token预算截断
+    prompt_compiler = PromptCompiler(
+        MODE_PROMPTS,
+        max_tokens=parse_max_tokens(app.config['AI_MAX_TOKENS']),
+        prompt_budget=app.config['AI_PROMPT_TOKEN_BUDGET'],
+        comment_budget=app.config['AI_COMMENT_TOKEN_BUDGET'],
+        context_budget=app.config['AI_CONTEXT_TOKEN_BUDGET'],
+        knowledge_budget=app.config['FAQ_CONTEXT_TOKEN_BUDGET']
+    )
+
+    # 按购买意向等规则排序评论，去重并按每分钟回复预算放行
+    comment_prioritizer = CommentPrioritizer(
+        _on_priority_dispatch,
+        rules=parse_rules(app.config['COMMENT_PRIORITY_RULES']),
+        dedup_window=app.config['COMMENT_DEDUP_WINDOW'],
+        similarity=app.config['COMMENT_DEDUP_SIMILARITY'],
+        max_wait=app.config['COMMENT_PRIORITY_MAX_WAIT'],
+        burst=app.config['COMMENT_PRIORITY_BURST']
+    )
+
+    # 短窗口内的相似评论合并为一次LLM请求
+    comment_batcher = CommentBatcher(
+        _on_comment_batch,
+        window=app.config['ANALYZE_BATCH_WINDOW_MS'] / 1000,
+        max_size=app.config['ANALYZE_BATCH_MAX'],
+        similarity=app.config['ANALYZE_BATCH_SIMILARITY']
+    )
+    
+    app.before_request(limit_http_rate)
+    app.after_request(record_sql_counters)
@@ -213,7 +213,7 @@ main() {
     
     apt install -y \
         python3 python3-pip python3-venv \
-        git nginx curl wget ufw \
+        git nginx curl wget ufw redis-server \
         build-essential libssl-dev \
         nodejs npm >/dev/null 2>&1 || {
         handle_error "依赖安装失败" "apt --fix-broken install -y && apt install -y python3 python3-pip git nginx nodejs npm" "系统依赖安装"
@@ -228,6 +228,7 @@ main() {
     rm -rf $PROJECT_DIR
     rm -f /etc/nginx/sites-enabled/$PROJECT_NAME
     rm -f /etc/nginx/sites-available/$PROJECT_NAME
+    rm -f /etc/logrotate.d/$PROJECT_NAME
     echo -e "${GREEN}✅ 旧部署清理完成${NC}"
 
     # 4. 克隆代码（支持重试）
@@ -258,7 +259,7 @@ main() {
     pip install -r requirements.txt >/dev/null 2>&1 || {
         handle_error "Python依赖安装失败" "pip install --upgrade setuptools && pip install -r requirements.txt" "Python依赖安装"
     }
-    pip install gunicorn gevent-websocket >/dev/null 2>&1
+    pip install gunicorn gevent gevent-websocket >/dev/null 2>&1
     echo -e "${GREEN}✅ Python环境配置完成${NC}"
 
     # 6. 构建前端资源
@@ -278,8 +279,10 @@ main() {
     # 7. 生成环境变量（智能配置）
     echo -e "${BLUE}🔑 配置环境变量...${NC}"
     SECRET_KEY=$(python3 -c "import uuid; print(uuid.uuid4().hex)")  # 自动生成安全密钥
+    METRICS_TOKEN=$(python3 -c "import uuid; print(uuid.uuid4().hex)")  # Prometheus抓取令牌
     cat > $ENV_FILE <<EOL
 SECRET_KEY=$SECRET_KEY
+METRICS_TOKEN=$METRICS_TOKEN
 FLASK_ENV=production
 DATABASE_URI=sqlite:///$PROJECT_DIR/site.db
 DEEPSEEK_API_KEY=your_deepseek_key  # 请替换为实际密钥
@@ -287,6 +290,18 @@ BAIDU_APP_ID=your_baidu_appid      # 请替换为实际密钥
 BAIDU_API_KEY=your_baidu_apikey    # 请替换为实际密钥
 BAIDU_SECRET_KEY=your_baidu_secret  # 请替换为实际密钥
 LOG_FILE=$PROJECT_DIR/app.log
+# 4个worker进程写同一日志文件，进程内不轮转，由logrotate统一处理
+LOG_ROTATE=none
+# 并发模式（gevent协作式IO，与gunicorn的GeventWebSocket worker一致）
+ASYNC_MODE=gevent
+# 多worker共享直播间状态与Socket.IO消息队列
+ROOM_STATE_URL=redis://127.0.0.1:6379/0
+SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6379/0
+RATE_LIMIT_URL=redis://127.0.0.1:6379/0
+# 用户/设置缓存与问题库索引的跨worker失效广播
+CACHE_INVALIDATION_URL=redis://127.0.0.1:6379/0
+# 位于Nginx之后，按X-Forwarded-For识别客户端IP
+PROXY_FIX=1
 ADMIN_PASSWORD=$ADMIN_PWD
 EOL
     chmod 644 $ENV_FILE
@@ -295,6 +310,8 @@ EOL
     # 8. 数据库初始化
     echo -e "${BLUE}🗄️ 初始化数据库...${NC}"
     export FLASK_APP=app.py
+    # 迁移在SQLite上以重建表方式执行，重建时关闭外键约束，避免删除旧表触发级联删除
+    export SQLITE_FOREIGN_KEYS=false
     source $VENV_DIR/bin/activate
     
     if [ ! -d "$PROJECT_DIR/migrations" ]; then
@@ -303,24 +320,34 @@ EOL
         }
     fi
     
+    # 唯一约束要求每个用户只有一份设置，迁移前清理历史遗留的重复记录
+    flask dedupe-settings >/dev/null 2>&1 || {
+        handle_error "清理重复用户设置失败" "flask dedupe-settings" "数据库迁移"
+    }
     flask db migrate -m "auto-deploy" >/dev/null 2>&1 || {
         handle_error "数据库迁移创建失败" "flask db migrate --empty -m 'fix' && flask db upgrade" "数据库迁移"
     }
     flask db upgrade >/dev/null 2>&1 || {
         handle_error "数据库迁移应用失败" "rm -rf migrations && flask db init && flask db migrate -m 'fresh' && flask db upgrade" "数据库升级"
     }
+    unset SQLITE_FOREIGN_KEYS
     echo -e "${GREEN}✅ 数据库初始化完成${NC}"
 
     # 9. 创建管理员账户
     echo -e "${BLUE}👤 创建管理员账户...${NC}"
     cat > init_admin.py <<EOL
-from app import app, db, User, Setting
+from config import monkey_patch
+monkey_patch()
+from app import create_app
+from extensions import db
+from models import User, Setting
 from werkzeug.security import generate_password_hash
+app = create_app()
 with app.app_context():
     if not User.query.filter_by(username='admin').first():
         admin = User(
             username='admin',
-            password_hash=generate_password_hash('$ADMIN_PWD'),
+            password_hash=generate_password_hash('$ADMIN_PWD', app.config['PASSWORD_HASH_METHOD']),
             is_admin=True
         )
         db.session.add(admin)
@@ -356,6 +383,11 @@ server {
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
     }
 
+    # 运行指标只供本机Prometheus直接抓取 127.0.0.1:5000/metrics，不经Nginx对外开放
+    location /metrics {
+        deny all;
+    }
+
     location /socket.io {
         proxy_pass http://127.0.0.1:5000/socket.io;
         proxy_http_version 1.1;
@@ -390,7 +422,7 @@ EOL
     cat > /etc/systemd/system/$SERVICE_NAME.service <<EOL
 [Unit]
 Description=Douyin Live AI Assistant
-After=network.target nginx.service
+After=network.target nginx.service redis-server.service
 
 [Service]
 User=root
@@ -398,12 +430,25 @@ Group=root
 WorkingDirectory=$PROJECT_DIR
 Environment="PATH=$VENV_DIR/bin"
 EnvironmentFile=$ENV_FILE
-ExecStart=$VENV_DIR/bin/gunicorn -w 4 -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker -b 127.0.0.1:5000 app:app
+ExecStart=$VENV_DIR/bin/gunicorn -w 4 -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker --worker-connections 2000 -b 127.0.0.1:5000 wsgi:app
 Restart=always
 RestartSec=3
 
 [Install]
 WantedBy=multi-user.target
+EOL
+
+    # 日志按天轮转；各worker以追加方式写入，copytruncate无需重启服务
+    cat > /etc/logrotate.d/$PROJECT_NAME <<EOL
+$PROJECT_DIR/app.log {
+    daily
+    rotate 14
+    compress
+    delaycompress
+    missingok
+    notifempty
+    copytruncate
+}
 EOL
 
     systemctl daemon-reload
@@ -433,6 +478,7 @@ EOL
     echo -e "  管理员账号: admin"
     echo -e "  管理员密码: $ADMIN_PWD（请立即修改）"
     echo -e "  部署日志: $(pwd)/$DEPLOY_LOG"
+    echo -e "  指标令牌: $METRICS_TOKEN（抓取 http://127.0.0.1:5000/metrics 时携带 Authorization: Bearer <令牌>）"
     echo -e "\n${YELLOW}⚠️ 重要提示:${NC}"
     echo -e "  1. 登录后请在【系统设置】中填写DeepSeek和百度API密钥"
     echo -e "  2. 生产环境建议配置HTTPS（可通过Let's Encrypt免费获取证书）"
@@ -0,0 +1,131 @@
+"""启动耗时测量：每轮在新的子进程中导入应用、调用create_app并处理首个请求
+
+统计导入、创建应用、首个请求（模板编译、数据库连接等延迟初始化）各阶段耗时的中位数，
+并记录子进程加载的模块数与较重的可选依赖是否被加载，结果写入JSON便于对比不同版本。
+
+用法:
+    python startup_benchmark.py --runs 10
+    python startup_benchmark.py --runs 5 --async-mode threading --env AUDIO_CACHE_ENABLED=false
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+# 只在特定功能或命令行中才需要的依赖，Web进程启动时不应加载
+HEAVY_MODULES = ('alembic', 'flask_migrate', 'mako', 'pygments', 'requests', 'redis', 'gevent')
+PHASES = ('import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms', 'total_ms')
+
+
+def measure():
+    """子进程：依次计时，结果以JSON输出到stdout"""
+    started = time.perf_counter()
+    from config import monkey_patch
+    monkey_patch()  # 与wsgi.py一致，计入导入耗时
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    client = app.test_client()
+    status = client.get('/login').status_code
+    first = time.perf_counter()
+    client.get('/login')
+    second = time.perf_counter()
+    print(json.dumps({
+        "import_ms": round((imported - started) * 1000, 1),
+        "create_app_ms": round((created - imported) * 1000, 1),
+        "first_request_ms": round((first - created) * 1000, 1),
+        "second_request_ms": round((second - first) * 1000, 1),
+        "total_ms": round((first - started) * 1000, 1),
+        "status": status,
+        "modules": len(sys.modules),
+        "loaded": [name for name in HEAVY_MODULES if name in sys.modules]
+    }))
+
+
+def prepare_env(args, workdir):
+    env = dict(os.environ)
+    env.update({
+        "FLASK_ENV": "production",
+        "SECRET_KEY": os.getenv('SECRET_KEY') or "benchmark",
+        "DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        "LOG_FILE": os.path.join(workdir, 'startup.log'),
+        "AUDIO_CACHE_DIR": os.path.join(workdir, 'audio'),
+        "ASYNC_MODE": args.async_mode
+    })
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='douyin_startup_')
+    env = prepare_env(args, workdir)
+    root = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child'],
+            cwd=root, env=env, capture_output=True, text=True, timeout=args.timeout
+        )
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0:
+            raise RuntimeError(f"子进程启动失败:\n{proc.stderr[-2000:]}")
+        sample = json.loads(proc.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = round(elapsed * 1000, 1)
+        samples.append(sample)
+
+    return {
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {"runs": args.runs, "async_mode": args.async_mode, "env": args.env},
+        "results": {
+            "median": {
+                phase: round(statistics.median(sample[phase] for sample in samples), 1)
+                for phase in PHASES + ('process_ms',)
+            },
+            "min": {phase: min(sample[phase] for sample in samples) for phase in PHASES},
+            "modules": samples[-1]["modules"],
+            "loaded": samples[-1]["loaded"],
+            "status": samples[-1]["status"]
+        },
+        "samples": samples
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="应用启动与首个请求耗时")
+    parser.add_argument('--runs', type=int, default=5, help="测量轮数（每轮一个新进程）")
+    parser.add_argument('--async-mode', choices=('gevent', 'threading'), default='gevent', help="并发模式（ASYNC_MODE）")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE', help="覆盖应用配置，可重复")
+    parser.add_argument('--timeout', type=float, default=60, help="单轮超时（秒）")
+    parser.add_argument('--output', help="结果JSON路径，默认 benchmark_results/startup_<时间>.json")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure()
+        return
+
+    result = run(args)
+    output = args.output or os.path.join('benchmark_results', 'startup_' + time.strftime("%Y%m%d_%H%M%S") + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    r = result["results"]
+    m = r["median"]
+    print(f"{args.runs}轮中位数：导入 {m['import_ms']}ms，create_app {m['create_app_ms']}ms，"
+          f"首个请求 {m['first_request_ms']}ms（第二个 {m['second_request_ms']}ms），合计 {m['total_ms']}ms")
+    print(f"进程总耗时 {m['process_ms']}ms，已加载模块 {r['modules']} 个，"
+          f"较重依赖: {', '.join(r['loaded']) or '无'}")
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -121,7 +121,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     headers: {
                         'Content-Type': 'application/json',
                     },
-                    body: JSON.stringify({ user_id: userId })
+                    body: JSON.stringify({ user_id: Number(userId) })
                 })
                 .then(res => res.json())
                 .then(data => {
@@ -213,6 +213,76 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // 设置页面 - 常见问题库
+    if (document.getElementById('faq-list')) {
+        const faqList = document.getElementById('faq-list');
+        
+        document.getElementById('add-faq').addEventListener('click', function() {
+            const template = document.getElementById('faq-template');
+            faqList.appendChild(template.content.cloneNode(true));
+            faqList.lastElementChild.querySelector('.faq-question').focus();
+        });
+        
+        faqList.addEventListener('click', function(event) {
+            const btn = event.target.closest('button');
+            if (!btn) return;
+            const item = btn.closest('.faq-item');
+            const faqId = item.getAttribute('data-id');
+            
+            if (btn.classList.contains('save-faq')) {
+                const formData = new FormData();
+                if (faqId) formData.append('faq_id', faqId);
+                formData.append('question', item.querySelector('.faq-question').value);
+                formData.append('answer', item.querySelector('.faq-answer').value);
+                
+                fetch('/faq', {
+                    method: 'POST',
+                    body: formData
+                })
+                .then(res => res.json())
+                .then(data => {
+                    if (data.status === 'success') {
+                        item.setAttribute('data-id', data.faq.id);
+                        showToast('问题已保存');
+                    } else {
+                        showToast(data.msg, 'error');
+                    }
+                })
+                .catch(err => {
+                    showToast('保存问题失败', 'error');
+                    console.error(err);
+                });
+            } else if (btn.classList.contains('delete-faq')) {
+                if (!faqId) {
+                    item.remove();
+                    return;
+                }
+                if (confirm('确定要删除这个问题吗？')) {
+                    fetch('/faq', {
+                        method: 'DELETE',
+                        headers: {
+                            'Content-Type': 'application/json',
+                        },
+                        body: JSON.stringify({ faq_id: Number(faqId) })
+                    })
+                    .then(res => res.json())
+                    .then(data => {
+                        if (data.status === 'success') {
+                            showToast('问题已删除');
+                            item.remove();
+                        } else {
+                            showToast(data.msg, 'error');
+                        }
+                    })
+                    .catch(err => {
+                        showToast('删除问题失败', 'error');
+                        console.error(err);
+                    });
+                }
+            }
+        });
+    }
+    
     // 设置页面 - 音量和语速滑块实时显示
     if (document.getElementById('voice-speed')) {
         const speedSlider = document.getElementById('voice-speed');
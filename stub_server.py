@@ -0,0 +1,194 @@
+"""DeepSeek / 百度语音本地模拟服务，用于离线调试流式回复与压测
+
+用法:
+    python stub_server.py --port 8765 --latency 0.3 --token-delay 0.02
+
+然后设置环境变量:
+    DEEPSEEK_API_URL=http://127.0.0.1:8765/v1/chat/completions
+    BAIDU_TOKEN_URL=http://127.0.0.1:8765/oauth/2.0/token
+    BAIDU_TTS_URL=http://127.0.0.1:8765/text2audio
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "您好，感谢关注！这款产品今天下单有专属优惠。全国包邮，一般48小时内发货。有任何问题欢迎随时提问~"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.record_connection()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        path = urlparse(self.path).path
+        body = self._read_body()
+        self.server.record(path)
+        if path.endswith('/oauth/2.0/token'):
+            return self._send_json({"access_token": "stub-token", "expires_in": 2592000})
+        time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            headers = {}
+            if self.server.retry_after is not None:
+                headers['Retry-After'] = str(self.server.retry_after)
+            return self._send_json({"error": "stub injected failure"}, status=self.server.error_status, headers=headers)
+        if path.endswith('/chat/completions'):
+            return self._chat(json.loads(body or b'{}'))
+        if path.endswith('/text2audio'):
+            return self._tts(parse_qs(body.decode('utf-8')))
+        self._send_json({"error": "not found"}, status=404)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _chat(self, data):
+        reply = self.server.reply
+        if self.server.echo:
+            # 回复末尾附上用户消息，便于压测按内容匹配评论与回复
+            messages = data.get('messages') or [{}]
+            reply = f"{reply}（{messages[-1].get('content', '')}）"
+        # 按字符数模拟token用量
+        prompt_tokens = sum(len(m.get('content') or '') for m in data.get('messages') or [])
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply),
+                 "total_tokens": prompt_tokens + len(reply)}
+        if not data.get('stream'):
+            return self._send_json({
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}],
+                "usage": usage
+            })
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        step = self.server.chunk_chars
+        for i in range(0, len(reply), step):
+            chunk = {"choices": [{"index": 0, "delta": {"content": reply[i:i + step]}}]}
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            time.sleep(self.server.token_delay)
+        if (data.get('stream_options') or {}).get('include_usage'):
+            self._write_chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _tts(self, form):
+        text = form.get('tex', [''])[0]
+        # 伪造的MP3数据：ID3头 + 文本，长度与文本成正比
+        audio = b'ID3' + text.encode('utf-8') * 64
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp3')
+        self.send_header('Content-Length', str(len(audio)))
+        self.end_headers()
+        self.wfile.write(audio)
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, token_delay=0.02, error_rate=0.0,
+                 reply=DEFAULT_REPLY, chunk_chars=2, verbose=False,
+                 error_status=503, retry_after=None, echo=False):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.echo = echo
+        self.reply = reply
+        self.chunk_chars = max(1, chunk_chars)
+        self.verbose = verbose
+        self.calls = {}
+        self.connections = 0  # 建立的TCP连接数，用于验证keep-alive复用
+        self._calls_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """指向本服务的环境变量"""
+        return {
+            "DEEPSEEK_API_URL": f"{self.base_url}/v1/chat/completions",
+            "BAIDU_TOKEN_URL": f"{self.base_url}/oauth/2.0/token",
+            "BAIDU_TTS_URL": f"{self.base_url}/text2audio"
+        }
+
+    def record(self, path):
+        with self._calls_lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    def handle_error(self, request, client_address):
+        # 客户端读到[DONE]后提前关闭流式连接属正常情况
+        if self.verbose:
+            super().handle_error(request, client_address)
+
+    def record_connection(self):
+        with self._calls_lock:
+            self.connections += 1
+
+
+def start_stub_server(host='127.0.0.1', port=0, **options):
+    """后台线程启动模拟服务（port=0时随机端口），返回StubServer实例"""
+    server = StubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name='stub_server', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="DeepSeek/百度语音模拟服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="每次请求的首包延迟（秒）")
+    parser.add_argument('--token-delay', type=float, default=0.02, help="流式输出每段间隔（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument('--error-status', type=int, default=503, help="注入错误的状态码（如429）")
+    parser.add_argument('--retry-after', type=int, help="注入错误时返回的Retry-After秒数")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = StubServer(
+        (args.host, args.port),
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        verbose=args.verbose
+    )
+    print(f"模拟服务已启动: {server.base_url}")
+    for name, value in server.env().items():
+        print(f"  {name}={value}")
+    server.serve_forever()
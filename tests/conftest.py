@@ -0,0 +1,39 @@
+"""测试夹具：按TestingConfig（内存SQLite、线程模式、低成本密码哈希）创建应用
+
+组件在services.init_app中绑定到模块全局变量，每个进程只创建一次应用，整个测试会话共用。
+"""
+import os
+import tempfile
+
+import pytest
+
+# 日志与语音缓存写入临时目录；须在导入config之前设置（.env不覆盖已有的环境变量）
+_workdir = tempfile.mkdtemp(prefix='douyin_test_')
+os.environ['LOG_FILE'] = os.path.join(_workdir, 'test.log')
+os.environ['AUDIO_CACHE_DIR'] = os.path.join(_workdir, 'audio')
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import User, Setting  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def make_user(app):
+    """创建带默认设置的用户"""
+    def make(username, **setting):
+        with app.app_context():
+            user = User(username=username, password_hash='-')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Setting(user_id=user.id, **setting))
+            db.session.commit()
+            return user.id
+    return make
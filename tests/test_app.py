@@ -0,0 +1,11 @@
+import socket
+
+
+def test_testing_app_is_not_monkey_patched(app):
+    # 导入app不打gevent补丁，测试进程使用原生线程
+    assert app.config['ASYNC_MODE'] == 'threading'
+    assert socket.socket.__module__ == 'socket'
+
+
+def test_login_page(app):
+    assert app.test_client().get('/login').status_code == 200
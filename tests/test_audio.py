@@ -0,0 +1,40 @@
+import base64
+
+import pytest
+
+import services
+
+
+@pytest.fixture
+def tts(app, monkeypatch):
+    """替换百度合成接口，记录合成次数"""
+    calls = []
+
+    def synthesis(text, options):
+        calls.append(text)
+        return b'mp3:' + text.encode('utf-8')
+
+    monkeypatch.setattr(services, 'baidu_synthesis', synthesis)
+    monkeypatch.setitem(app.config, 'AUDIO_TRANSPORT', 'datauri')
+    return calls
+
+
+def synthesize(app, text):
+    with app.app_context():
+        return services.baidu_tts(text, "知性女声")
+
+
+def test_cached_audio_inlined(app, tts):
+    first = synthesize(app, "欢迎来到直播间")
+    assert synthesize(app, "欢迎来到直播间") == first
+    assert first == "data:audio/mp3;base64," + base64.b64encode("mp3:欢迎来到直播间".encode('utf-8')).decode()
+    assert len(tts) == 1
+
+
+def test_audio_evicted_by_other_worker_is_resynthesized(app, tts, monkeypatch):
+    synthesize(app, "今天全场包邮")
+    # 索引仍记录该文件，但文件已被其他worker淘汰
+    monkeypatch.setattr(services.audio_store, 'read', lambda key: None)
+    audio = synthesize(app, "今天全场包邮")
+    assert audio.startswith("data:audio/mp3;base64,")
+    assert len(tts) == 2
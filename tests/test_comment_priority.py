@@ -0,0 +1,41 @@
+import time
+
+from comment_priority import CommentPrioritizer
+
+
+def wait_for(predicate, timeout=3):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_similar_question_is_duplicate_after_release():
+    released = []
+    prioritizer = CommentPrioritizer(lambda key, comment, askers, context: released.append(comment))
+    assert prioritizer.push(1, {"user": "a", "content": "包邮吗？"}) == 'queued'
+    assert wait_for(lambda: released)
+    assert prioritizer.push(1, {"user": "b", "content": "包邮吗"}) == 'duplicate'
+
+
+def test_empty_room_removed_when_dedup_window_expires():
+    released = []
+    prioritizer = CommentPrioritizer(lambda key, comment, askers, context: released.append(comment), dedup_window=0.3)
+    prioritizer.push(1, {"user": "a", "content": "包邮吗？"})
+    assert wait_for(lambda: released)
+    assert prioritizer.stats()["rooms"] == 1
+    assert wait_for(lambda: prioritizer.stats()["rooms"] == 0)
+    # 删除后新的评论重新建队并放行
+    prioritizer.push(1, {"user": "b", "content": "包邮吗"})
+    assert wait_for(lambda: len(released) == 2)
+
+
+def test_new_comment_not_delayed_by_pending_cleanup():
+    released = []
+    prioritizer = CommentPrioritizer(lambda key, comment, askers, context: released.append(comment), dedup_window=30)
+    prioritizer.push(1, {"user": "a", "content": "包邮吗？"})
+    assert wait_for(lambda: released)
+    prioritizer.push(1, {"user": "b", "content": "什么时候发货"})
+    assert wait_for(lambda: len(released) == 2, timeout=1)
@@ -0,0 +1,62 @@
+import threading
+
+from entity_cache import EntityCache
+
+
+class SlowLoader:
+    """加载时阻塞，直到测试放行，模拟读取数据库期间发生的写入"""
+
+    def __init__(self, value):
+        self.value = value
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def __call__(self, key):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(3)
+        return self.value
+
+
+def load_in_background(cache, key):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', cache.get(key)))
+    thread.start()
+    return thread, result
+
+
+def test_get_caches_loaded_value():
+    loader = SlowLoader('db')
+    loader.release.set()
+    cache = EntityCache('test', loader)
+    assert cache.get(1) == 'db'
+    assert cache.get(1) == 'db'
+    assert loader.calls == 1
+
+
+def test_set_during_load_wins_over_loaded_value():
+    loader = SlowLoader('old')
+    cache = EntityCache('test', loader)
+    thread, result = load_in_background(cache, 1)
+    assert loader.started.wait(3)
+    cache.set(1, 'new')
+    loader.release.set()
+    thread.join(3)
+    assert result['value'] == 'new'
+    assert cache.get(1) == 'new'
+    assert cache.stats()["stale_loads"] == 1
+
+
+def test_invalidate_during_load_is_not_cached():
+    loader = SlowLoader('old')
+    cache = EntityCache('test', loader)
+    thread, result = load_in_background(cache, 1)
+    assert loader.started.wait(3)
+    cache.invalidate(1)
+    loader.release.set()
+    thread.join(3)
+    assert result['value'] == 'old'
+    loader.value = 'fresh'
+    assert cache.get(1) == 'fresh'
+    assert loader.calls == 2
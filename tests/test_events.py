@@ -0,0 +1,36 @@
+import time
+
+import services
+from extensions import socketio
+
+
+def connect(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    socket = socketio.test_client(app, flask_test_client=client)
+    socket.get_received()
+    return socket
+
+
+def system_messages(socket):
+    return [message['args'][0]['msg'] for message in socket.get_received() if message['name'] == 'system_msg']
+
+
+def test_duplicate_question_reported_to_client(app, make_user, monkeypatch):
+    dispatched = []
+    monkeypatch.setattr(services, 'dispatch_comment', lambda user_id, comment, *args, **kwargs: dispatched.append(comment))
+    user_id = make_user('duplicate_user')
+    socket = connect(app, user_id)
+
+    socket.emit('analyze_comment', {"user": "观众A", "content": "这个多少钱？"})
+    deadline = time.time() + 3
+    while not dispatched and time.time() < deadline:
+        time.sleep(0.05)
+    assert [comment['content'] for comment in dispatched] == ["这个多少钱？"]
+    assert system_messages(socket) == []
+
+    socket.emit('analyze_comment', {"user": "观众B", "content": "这个多少钱"})
+    assert system_messages(socket) == ["相同的问题刚刚已回答，已跳过: 这个多少钱"]
+    assert len(dispatched) == 1
+    socket.disconnect()
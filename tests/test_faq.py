@@ -0,0 +1,31 @@
+import services
+from extensions import db
+from models import Faq
+
+
+def login(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+
+def test_delete_with_string_id_updates_index(app, make_user):
+    user_id = make_user('faq_user')
+    with app.app_context():
+        item = Faq(user_id=user_id, question="包邮吗", answer="全国包邮")
+        db.session.add(item)
+        db.session.commit()
+        faq_id = item.id
+    assert services.faq_index.match(user_id, "包邮吗").answer == "全国包邮"
+
+    client = login(app, user_id)
+    response = client.delete('/faq', json={"faq_id": str(faq_id)})
+    assert response.get_json()["status"] == "success"
+    assert services.faq_index.match(user_id, "包邮吗") is None
+
+
+def test_delete_with_invalid_id(app, make_user):
+    client = login(app, make_user('faq_invalid'))
+    assert client.delete('/faq', json={"faq_id": "abc"}).status_code == 400
+    assert client.delete('/faq', json={}).status_code == 400
@@ -0,0 +1,41 @@
+from rate_limit import MemoryRateLimiter, parse_rule
+
+
+def test_rule_parsing():
+    rule = parse_rule('20/10s')
+    assert rule.burst == 20
+    assert rule.rate == 2
+
+
+def test_bucket_refuses_after_burst():
+    limiter = MemoryRateLimiter()
+    rule = parse_rule('2/m')
+    assert limiter.allow('a', rule)[0]
+    assert limiter.allow('a', rule)[0]
+    allowed, wait = limiter.allow('a', rule)
+    assert not allowed
+    assert 0 < wait <= 30
+
+
+def test_full_limiter_evicts_least_recently_used():
+    limiter = MemoryRateLimiter(max_keys=3)
+    rule = parse_rule('2/m')
+    limiter.allow('hot', rule)
+    limiter.allow('hot', rule)
+    for key in 'abcde':
+        limiter.allow(key, rule)
+        limiter.allow('hot', rule, consume=False)
+    # 新key不断涌入时只淘汰最旧的桶，活跃key的配额保持耗尽状态
+    assert list(limiter._buckets) == ['d', 'e', 'hot']
+    assert not limiter.allow('hot', rule)[0]
+
+
+def test_idle_buckets_pruned_first():
+    limiter = MemoryRateLimiter(max_keys=3)
+    rule = parse_rule('2/m')
+    for key in 'abc':
+        limiter.allow(key, rule)
+    limiter._buckets['a'][1] -= 7200
+    limiter._buckets['b'][1] -= 7200
+    limiter.allow('d', rule)
+    assert list(limiter._buckets) == ['c', 'd']
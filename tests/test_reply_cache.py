@@ -0,0 +1,95 @@
+import pytest
+
+import services
+from extensions import db
+from models import Faq
+from reply_cache import ReplyCache
+
+QUESTION = "你们从哪个城市发货呢"
+
+
+def test_near_match_within_namespace():
+    cache = ReplyCache(similarity=0.6)
+    cache.put("包邮吗？", "提示词", "normal", "全国包邮")
+    assert cache.get("包邮吗", "提示词", "normal") == "全国包邮"
+    assert cache.get("请问包邮吗", "提示词", "normal") == "全国包邮"
+    assert cache.get("包邮吗", "提示词", "friendly") is None
+
+
+def test_knowledge_partitions_by_user_and_content():
+    cache = ReplyCache()
+    knowledge = [("你们从哪里发货", "我们从广州发货")]
+    cache.put(QUESTION, "提示词", "normal", "我们从广州发货", user_id=1, knowledge=knowledge)
+    assert cache.get(QUESTION, "提示词", "normal", 1, knowledge) == "我们从广州发货"
+    assert cache.get(QUESTION, "提示词", "normal", 2, knowledge) is None
+    assert cache.get(QUESTION, "提示词", "normal", 2) is None
+    assert cache.get(QUESTION, "提示词", "normal", 1, [("你们从哪里发货", "我们从杭州发货")]) is None
+
+
+@pytest.fixture
+def llm(app, monkeypatch):
+    """替换DeepSeek与TTS：回复取决于请求中是否带有问题库参考资料，记录每个直播间收到的回复"""
+    calls = []
+    replies = []
+
+    def complete(data):
+        calls.append(data)
+        text = "".join(message["content"] for message in data["messages"])
+        return "我们从广州发货" if "广州" in text else "请咨询客服"
+
+    monkeypatch.setattr(services, 'deepseek_complete', complete)
+    monkeypatch.setattr(services, 'baidu_tts', lambda text, *args, **kwargs: {"type": "text", "content": text})
+    monkeypatch.setattr(
+        services, 'emit_ai_reply',
+        lambda user_id, room, content, audio=None, **extra: replies.append((user_id, content))
+    )
+    services.reply_cache.clear()
+    yield calls, replies
+    services.reply_cache.clear()
+
+
+def ask(app, user_id):
+    with app.app_context():
+        setting = services.setting_cache.get(user_id)
+    services.answer_comment(QUESTION, setting, f"room_{user_id}")
+
+
+def test_faq_answer_not_shared_between_streamers(app, make_user, llm):
+    calls, replies = llm
+    user_a = make_user('tenant_a')
+    user_b = make_user('tenant_b')
+    with app.app_context():
+        db.session.add(Faq(user_id=user_a, question="你们从哪里发货", answer="我们从广州发货"))
+        db.session.commit()
+    services.faq_index.invalidate(user_a)
+
+    ask(app, user_a)
+    ask(app, user_b)
+    assert replies == [(user_a, "我们从广州发货"), (user_b, "请咨询客服")]
+    assert len(calls) == 2
+
+    # 同一主播的相同问题命中缓存
+    ask(app, user_a)
+    assert replies[-1] == (user_a, "我们从广州发货")
+    assert len(calls) == 2
+
+    # 编辑问题库后不再返回旧回复
+    with app.app_context():
+        db.session.execute(db.update(Faq).where(Faq.user_id == user_a).values(answer="我们从杭州发货"))
+        db.session.commit()
+    services.faq_index.invalidate(user_a)
+    ask(app, user_a)
+    assert len(calls) == 3
+
+
+def test_reply_with_room_context_bypasses_cache(app, make_user, llm, monkeypatch):
+    calls, replies = llm
+    user_id = make_user('context_user')
+    monkeypatch.setitem(app.config, 'AI_CONTEXT_TURNS', 2)
+    services.comment_history.record(user_id, 'reply', {"content": "今天下单明天发"}, question="什么时候发货")
+
+    ask(app, user_id)
+    ask(app, user_id)
+    assert len(calls) == 2
+    assert services.reply_cache.stats()["size"] == 0
+    services.comment_history.discard(user_id)
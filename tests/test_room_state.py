@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+import services
+from room_state import MemoryRoomStore, SQLiteRoomStore, worker_id
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryRoomStore()
+    return SQLiteRoomStore(str(tmp_path / 'rooms.db'))
+
+
+def test_conditional_update(store):
+    store.save(1, {"active": True, "owner": "a"})
+    assert store.update(1, when=lambda state: state["owner"] == "b", owner="c") is None
+    assert store.get(1)["owner"] == "a"
+    assert store.update(1, when=lambda state: state["owner"] == "a", owner="c")["owner"] == "c"
+    assert store.update(2, owner="c") is None
+
+
+def test_orphan_room_taken_over(app, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(services, 'live_rooms', SQLiteRoomStore(str(tmp_path / 'rooms.db')))
+    orphan = make_user('orphan_room')
+    alive = make_user('alive_room')
+    now = time.time()
+    services.live_rooms.save(orphan, {"active": True, "room": f"room_{orphan}", "interval": 5,
+                                      "owner": "gone:1", "lease_until": now - 1})
+    services.live_rooms.save(alive, {"active": True, "room": f"room_{alive}", "interval": 5,
+                                     "owner": "other:2", "lease_until": now + 30})
+    try:
+        assert services.claim_orphan_rooms(None) == app.config['ROOM_LEASE_TTL'] / 2
+        state = services.live_rooms.get(orphan)
+        assert state["owner"] == worker_id()
+        assert state["lease_until"] > now
+        assert services.comment_scheduler.is_scheduled(orphan)
+        assert services.live_rooms.get(alive)["owner"] == "other:2"
+        assert not services.comment_scheduler.is_scheduled(alive)
+    finally:
+        services.comment_scheduler.cancel(orphan)
+        services.close_comment_source(orphan)
+
+
+def test_owner_renews_lease(app, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr(services, 'live_rooms', SQLiteRoomStore(str(tmp_path / 'rooms.db')))
+    user_id = make_user('lease_owner')
+    with app.app_context():
+        services.start_comment_collection(user_id)
+    try:
+        services.comment_scheduler.cancel(user_id)
+        services.live_rooms.update(user_id, lease_until=time.time() + 1)
+        assert services.comment_tick(user_id) is not None
+        assert services.live_rooms.get(user_id)["lease_until"] > time.time() + app.config['ROOM_LEASE_TTL'] / 2
+    finally:
+        services.close_comment_source(user_id)
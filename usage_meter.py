@@ -0,0 +1,93 @@
+"""按用户、按天累计AI用量（LLM token数、TTS字符数、回复次数），后台线程批量落库
+
+热路径上只在内存中累加，flush时每个(用户, 日期)合并为一行增量写入，
+配额检查使用 数据库已有用量 + 本进程未写入的增量。
+"""
+import time
+import threading
+from datetime import date
+
+FIELDS = ('llm_tokens', 'tts_chars', 'requests')
+
+
+class UsageMeter:
+    """用量计数器
+
+    - writer(deltas): 批量写入回调，deltas为 {(user_id, day): {字段: 增量}}；抛出异常时增量合并回待写入
+    - on_flush(user_ids): 写入成功后回调，用于让已缓存的用量失效
+    """
+
+    def __init__(self, writer, flush_interval=5.0, on_flush=None, on_error=None, name='usage_meter'):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.name = name
+        self._pending = {}  # {(user_id, day): [llm_tokens, tts_chars, requests]}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stats = {"flushes": 0, "errors": 0}
+
+    def record(self, user_id, llm_tokens=0, tts_chars=0, requests=0):
+        if not user_id:
+            return
+        key = (user_id, date.today())
+        with self._lock:
+            counters = self._pending.get(key)
+            if counters is None:
+                counters = self._pending[key] = [0, 0, 0]
+            counters[0] += llm_tokens
+            counters[1] += tts_chars
+            counters[2] += requests
+            self._ensure_thread()
+
+    def pending(self, user_id, day=None):
+        """本进程尚未写入的当日增量"""
+        with self._lock:
+            counters = self._pending.get((user_id, day or date.today()))
+            return dict(zip(FIELDS, counters)) if counters else dict.fromkeys(FIELDS, 0)
+
+    def flush(self):
+        """立即写入积压增量，返回写入的行数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            deltas = {key: dict(zip(FIELDS, counters)) for key, counters in batch.items()}
+            try:
+                self.writer(deltas)
+            except Exception as e:
+                # 合并回待写入，下次重试（计数只增不减，重试不会重复计入）
+                with self._lock:
+                    for key, counters in batch.items():
+                        current = self._pending.setdefault(key, [0, 0, 0])
+                        for i, value in enumerate(counters):
+                            current[i] += value
+                    self._stats["errors"] += 1
+                if self.on_error:
+                    self.on_error(e)
+                return 0
+            with self._lock:
+                self._stats["flushes"] += 1
+            if self.on_flush:
+                self.on_flush({user_id for user_id, _ in batch})
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["pending_rows"] = len(self._pending)
+        return data
+
+    def _ensure_thread(self):
+        # 首次记录时启动（需持有锁），避免在gunicorn fork之前创建线程
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
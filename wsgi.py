@@ -0,0 +1,15 @@
+"""gunicorn入口
+
+    gunicorn -w 4 -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker \\
+        --worker-connections 2000 -b 127.0.0.1:5000 wsgi:app
+
+导入app之前按ASYNC_MODE完成gevent猴子补丁；gevent worker在加载应用前已打过补丁时直接复用。
+应用在每个worker中由create_app创建（未使用--preload时，后台线程不会在fork前启动）。
+"""
+from config import monkey_patch
+
+monkey_patch()
+
+from app import create_app  # noqa: E402
+
+app = create_app()